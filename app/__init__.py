@@ -1,18 +1,42 @@
 from flask import Flask
 from flask_caching import Cache
+from app import metrics
+from app.config import Config
+from app.serialization import FastJSONProvider
 
-cache = Cache(config={
-    'CACHE_TYPE': 'SimpleCache',
-    'CACHE_DEFAULT_TIMEOUT': 300
-})
+cache = Cache()
 
 def create_app():
     app = Flask(__name__)
+    app.config.from_object(Config)
+    app.json = FastJSONProvider(app)
     cache.init_app(app)
+    metrics.init_app(app)
     
     from app.routes import main
     app.register_blueprint(main)
+
+    if not Config.FAST_START:
+        preload_services()
+
+    if Config.ENABLE_SCHEDULER:
+        from app.scheduler import start_scheduler
+        app.extensions['refresh_scheduler'] = start_scheduler()
     
     return app
 
+def preload_services():
+    """Do the imports and construction app.lazy defers, e.g. before gunicorn forks."""
+    from app.lazy import preload
+    from app import timeseries
+    from app.services import history, http_client
+    preload(
+        timeseries.np,
+        timeseries.pd,
+        http_client.requests,
+        http_client.http.session,
+        history.history,
+        history.rollups
+    )
+
 app = create_app() 
\ No newline at end of file
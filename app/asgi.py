@@ -0,0 +1,193 @@
+"""ASGI entry point: ``uvicorn app.asgi:app``.
+
+The upstream-bound JSON endpoints are served on the event loop by the async
+service variants, so one process can hold hundreds of requests while they
+wait on upstream I/O instead of tying up a sync worker each, and
+/api/stream keeps Server-Sent Events connections open indefinitely at the
+cost of one suspended coroutine per viewer. Only this entry point streams:
+the page is told so through the STREAM_ENABLED setting, and under gunicorn
+it polls /api/dashboard instead. Every other path (pages, static files,
+historical data, /metrics) goes to the Flask app through a2wsgi, which
+runs it on a pool of ASGI_WSGI_WORKERS threads. Cache entries, metrics and
+the background scheduler are shared with the sync code, so both serving
+modes stay interchangeable.
+"""
+import asyncio
+import logging
+import time
+from urllib.parse import parse_qsl
+from a2wsgi import WSGIMiddleware
+from app import app as flask_app, metrics
+from app.config import Config
+from werkzeug.datastructures import Headers
+from app.conditional import Representation
+from app.routes import (
+    categories_representation, compute_gdp_async, dashboard_fields, dashboard_representation,
+    compute_gdp, dashboard_snapshots, dashboard_sources, gdp_representation,
+    protocols_representation, yield_filters, yield_protocols_representation, yield_query,
+    yields_representation
+)
+from app.serialization import JSON_MIMETYPE, dumps
+from app.stream import EVENT_STREAM_MIMETYPE, STREAM_HEADERS, Broadcaster
+from app.services.defillama import DefiLlamaService
+from app.services.http_client import async_http
+
+logger = logging.getLogger(__name__)
+
+# One producer per process pushes GDP changes to every /api/stream client
+gdp_stream = Broadcaster(compute_gdp, Config.STREAM_INTERVAL, keepalive=Config.STREAM_KEEPALIVE)
+flask_app.config['STREAM_ENABLED'] = True
+
+async def get_gdp(args):
+    try:
+        return gdp_representation(*await compute_gdp_async.snapshot())
+    except Exception as e:
+        logger.error(f"Error calculating GDP: {str(e)}")
+        return 500, {'error': 'Failed to calculate GDP'}, {}
+
+async def get_protocols(args):
+    return protocols_representation(*await DefiLlamaService.get_protocol_index_async.snapshot())
+
+async def get_categories(args):
+    return categories_representation(*await DefiLlamaService.get_protocol_index_async.snapshot())
+
+async def get_yields(args):
+    try:
+        query = yield_query(args)
+    except ValueError as e:
+        return 400, {'error': str(e)}, {}
+
+    return yields_representation(*await DefiLlamaService.get_yield_index_async.snapshot(), query)
+
+async def get_yield_protocols(args):
+    try:
+        filters = yield_filters(args)
+    except ValueError as e:
+        return 400, {'error': str(e)}, {}
+
+    return yield_protocols_representation(
+        *await DefiLlamaService.get_yield_index_async.snapshot(), filters
+    )
+
+async def get_dashboard(args):
+    try:
+        fields = dashboard_fields(args)
+    except ValueError as e:
+        return 400, {'error': str(e)}, {}
+
+    results = await dashboard_snapshots.fetch_async(names=dashboard_sources(fields))
+    return dashboard_representation(fields, results)
+
+def stream_gdp(args, headers):
+    return gdp_stream.aevents(headers.get('last-event-id'))
+
+ROUTES = {
+    '/api/gdp': get_gdp,
+    '/api/protocols': get_protocols,
+    '/api/categories': get_categories,
+    '/api/yields': get_yields,
+    '/api/yields/protocols': get_yield_protocols,
+    '/api/dashboard': get_dashboard
+}
+
+STREAMS = {
+    '/api/stream': stream_gdp
+}
+
+
+class AsyncApp:
+    """Serve `routes` and `streams` natively and everything else through `fallback`.
+
+    A route handler takes the query arguments and returns either a
+    Representation (answered with 304 or a compressed body as the request
+    headers allow) or (status, JSON-serializable payload, extra headers).
+    A stream handler
+    takes the query arguments and request headers and returns an async
+    iterator of Server-Sent Events chunks, consumed until the client leaves.
+    """
+
+    def __init__(self, routes, fallback, streams=None):
+        self.routes = routes
+        self.fallback = fallback
+        self.streams = streams or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+
+        handler = None
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            handler = self.routes.get(scope['path'])
+            stream = self.streams.get(scope['path'])
+            if stream is not None and scope['method'] == 'GET':
+                return await self._stream(scope, receive, send, stream)
+        if handler is None:
+            return await self.fallback(scope, receive, send)
+
+        started = time.perf_counter()
+        args = dict(parse_qsl(scope['query_string'].decode('latin-1')))
+        result = await handler(args)
+        if isinstance(result, Representation):
+            request_headers = Headers([
+                (name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']
+            ])
+            status, body, extra_headers = result.respond(request_headers)
+        else:
+            status, payload, extra_headers = result
+            body = dumps(payload)
+            extra_headers = {'Content-Type': JSON_MIMETYPE, **extra_headers}
+        headers = [(name.lower().encode(), value.encode()) for name, value in extra_headers.items()]
+        if status != 304:
+            headers.append((b'content-length', str(len(body)).encode()))
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else body})
+        metrics.route_seconds.observe(
+            time.perf_counter() - started,
+            endpoint=scope['path'],
+            method=scope['method'],
+            status=status
+        )
+
+    async def _stream(self, scope, receive, send, handler):
+        args = dict(parse_qsl(scope['query_string'].decode('latin-1')))
+        request_headers = {
+            name.decode('latin-1').lower(): value.decode('latin-1')
+            for name, value in scope['headers']
+        }
+        headers = [(b'content-type', EVENT_STREAM_MIMETYPE.encode())] + [
+            (name.lower().encode(), value.encode()) for name, value in STREAM_HEADERS.items()
+        ]
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+
+        async def pump():
+            async for chunk in handler(args, request_headers):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        async def disconnected():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        # Stop the stream (and unsubscribe) as soon as the client goes away
+        tasks = {asyncio.ensure_future(pump()), asyncio.ensure_future(disconnected())}
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task in done:
+            if task.exception() is not None:
+                logger.warning(f"Stream {scope['path']} ended: {task.exception()!r}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await async_http.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+app = AsyncApp(ROUTES, WSGIMiddleware(flask_app, workers=Config.ASGI_WSGI_WORKERS), STREAMS)
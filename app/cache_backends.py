@@ -0,0 +1,210 @@
+"""Cache backends shared by every worker process.
+
+Select one with ``CACHE_TYPE`` in ``Config``:
+
+- ``app.cache_backends.SQLiteCache``: a single SQLite file on local disk,
+  shared by all gunicorn workers on the box.
+- ``app.cache_backends.SharedRedisCache``: any Redis server, or any object
+  with the redis-py client API passed as ``CACHE_REDIS_CLIENT``.
+
+Both keep hit/miss/eviction counters for the current process.
+"""
+import pickle
+import sqlite3
+import threading
+import time
+from flask_caching.backends.base import BaseCache
+
+class CacheStatsMixin:
+    """Per-process hit/miss/eviction counters."""
+
+    def _init_stats(self):
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+
+class SQLiteCache(CacheStatsMixin, BaseCache):
+    """Cache stored in a SQLite file so all local workers see the same entries.
+
+    When more than ``threshold`` entries are stored, expired rows are removed
+    first and then the rows closest to expiry until the table is back under
+    the threshold.
+    """
+
+    supports_locks = True
+
+    def __init__(self, path, default_timeout=300, threshold=2000):
+        super().__init__(default_timeout)
+        self._init_stats()
+        self.path = path
+        self.threshold = threshold
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache '
+                '(key TEXT PRIMARY KEY, value BLOB, expires REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            path=config['CACHE_SQLITE_PATH'],
+            threshold=config.get('CACHE_THRESHOLD', 2000)
+        )
+        return cls(*args, **kwargs)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _expiry(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout > 0 else float('inf')
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT value, expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or row[1] <= time.time():
+            self._count('misses')
+            return None
+        self._count('hits')
+        return pickle.loads(row[0])
+
+    def has(self, key):
+        row = self._connect().execute(
+            'SELECT 1 FROM cache WHERE key = ? AND expires > ?', (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def set(self, key, value, timeout=None):
+        self._connect().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expiry(timeout))
+        )
+        self._writes += 1
+        if self._writes % 50 == 0:
+            self._prune()
+        return True
+
+    def add(self, key, value, timeout=None):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM cache WHERE key = ? AND expires <= ?', (key, time.time()))
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expiry(timeout))
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        cursor = self._connect().execute('DELETE FROM cache WHERE key = ?', (key,))
+        return cursor.rowcount == 1
+
+    def clear(self):
+        self._connect().execute('DELETE FROM cache')
+        return True
+
+    def _prune(self):
+        conn = self._connect()
+        expired = conn.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),)).rowcount
+        count = conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        evicted = 0
+        if count > self.threshold:
+            evicted = conn.execute(
+                'DELETE FROM cache WHERE key IN '
+                '(SELECT key FROM cache ORDER BY expires LIMIT ?)',
+                (count - self.threshold,)
+            ).rowcount
+        if expired or evicted:
+            self._count('evictions', expired + evicted)
+
+
+class SharedRedisCache(CacheStatsMixin, BaseCache):
+    """Cache on a Redis server shared by every worker and every box.
+
+    ``client`` is anything with the redis-py API (``get``, ``set`` with
+    ``ex``/``nx``, ``delete``, ``exists``, ``scan_iter``), so tests can pass
+    a local stand-in instead of a real server.
+    """
+
+    supports_locks = True
+
+    def __init__(self, client, default_timeout=300, key_prefix=''):
+        super().__init__(default_timeout)
+        self._init_stats()
+        self.client = client
+        self.key_prefix = key_prefix
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        client = config.get('CACHE_REDIS_CLIENT')
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("no redis module found") from e
+            client = redis.from_url(config['CACHE_REDIS_URL'])
+        kwargs.update(client=client, key_prefix=config.get('CACHE_KEY_PREFIX') or '')
+        return cls(*args, **kwargs)
+
+    def _ex(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return timeout if timeout > 0 else None
+
+    def get(self, key):
+        value = self.client.get(self.key_prefix + key)
+        if value is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return pickle.loads(value)
+
+    def has(self, key):
+        return bool(self.client.exists(self.key_prefix + key))
+
+    def set(self, key, value, timeout=None):
+        dump = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return bool(self.client.set(self.key_prefix + key, dump, ex=self._ex(timeout)))
+
+    def add(self, key, value, timeout=None):
+        dump = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return bool(self.client.set(self.key_prefix + key, dump, ex=self._ex(timeout), nx=True))
+
+    def delete(self, key):
+        return bool(self.client.delete(self.key_prefix + key))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.key_prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+        return True
+
+    def stats(self):
+        stats = super().stats()
+        # Redis evicts on its own; report the server's counter when available
+        try:
+            stats['evictions'] = int(self.client.info('stats').get('evicted_keys', 0))
+        except Exception:
+            pass
+        return stats
@@ -0,0 +1,185 @@
+"""Conditional GET and precompressed bodies for API responses.
+
+A Representation is an encoded response body with a content-hash ETag,
+the Last-Modified time of the snapshot it was rendered from and that
+snapshot's freshness window. It answers If-None-Match/If-Modified-Since
+with 304 and serves gzip or brotli bodies, each compressed once. The
+RepresentationCache keeps representations per (route, query, snapshot
+time), so an unchanged snapshot is serialized and compressed only once
+per process, however often it is polled.
+"""
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from app.serialization import JSON_MIMETYPE
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+ENCODING_SUFFIXES = {'identity': '', 'gzip': '-gz', 'br': '-br'}
+
+def _accepted_encodings(header):
+    """Content codings the client accepts (q > 0) from an Accept-Encoding header."""
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+def _compress(body, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    return brotli.compress(body, quality=5)
+
+
+class Representation:
+    """An encoded body plus the validators and cache headers that go with it.
+
+    `expires_at` and `stale_while_revalidate` come from the snapshot's
+    cache entry; without `expires_at` (an uncached, partial snapshot) the
+    response may be stored but must be revalidated every time.
+    """
+
+    def __init__(self, body, mimetype=JSON_MIMETYPE, last_modified=None,
+                 expires_at=None, stale_while_revalidate=0, headers=None):
+        self.body = body
+        self.headers = headers or {}
+        self.mimetype = mimetype
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+        self.stale_while_revalidate = stale_while_revalidate
+        self.tag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self._encoded = {'identity': body}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding):
+        """The body in `encoding` ('identity', 'gzip' or 'br'), compressed once."""
+        body = self._encoded.get(encoding)
+        if body is None:
+            with self._lock:
+                body = self._encoded.get(encoding)
+                if body is None:
+                    body = self._encoded[encoding] = _compress(self.body, encoding)
+        return body
+
+    def negotiate(self, accept_encoding):
+        if len(self.body) < MIN_COMPRESS_SIZE:
+            return 'identity'
+        accepted = _accepted_encodings(accept_encoding)
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted or '*' in accepted:
+            return 'gzip'
+        return 'identity'
+
+    def cache_control(self):
+        if self.expires_at is None:
+            return 'no-cache'
+        max_age = max(0, int(self.expires_at - time.time()))
+        return f"public, max-age={max_age}, stale-while-revalidate={int(self.stale_while_revalidate)}"
+
+    def not_modified(self, if_none_match, if_modified_since):
+        if if_none_match:
+            for candidate in if_none_match.split(','):
+                candidate = candidate.strip()
+                if candidate == '*':
+                    return True
+                if candidate.startswith('W/'):
+                    candidate = candidate[2:]
+                # Every encoding of the same content matches
+                if candidate.strip('"').split('-')[0] == self.tag:
+                    return True
+            return False
+        if if_modified_since and self.last_modified is not None:
+            try:
+                return int(self.last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def respond(self, headers):
+        """(status, body, response headers) for a request with `headers`."""
+        encoding = self.negotiate(headers.get('Accept-Encoding'))
+        response_headers = {
+            **self.headers,
+            'ETag': f'"{self.tag}{ENCODING_SUFFIXES[encoding]}"',
+            'Cache-Control': self.cache_control(),
+            'Vary': ', '.join(filter(None, [self.headers.get('Vary'), 'Accept-Encoding']))
+        }
+        if self.last_modified is not None:
+            response_headers['Last-Modified'] = formatdate(self.last_modified, usegmt=True)
+
+        if self.not_modified(headers.get('If-None-Match'), headers.get('If-Modified-Since')):
+            return 304, b'', response_headers
+
+        response_headers['Content-Type'] = self.mimetype
+        if encoding != 'identity':
+            response_headers['Content-Encoding'] = encoding
+        return 200, self.encoded(encoding), response_headers
+
+
+class RepresentationCache:
+    """Bounded LRU of Representations by (key, snapshot version)."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version, build):
+        """The representation of `key` at `version`, from `build()` on a miss.
+
+        A None `version` (the snapshot was not cached) is never stored.
+        """
+        if version is None:
+            return build()
+        with self._lock:
+            representation = self._entries.get((key, version))
+            if representation is not None:
+                self._entries.move_to_end((key, version))
+                return representation
+
+        representation = build()
+        with self._lock:
+            self._entries[(key, version)] = representation
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return representation
+
+
+representations = RepresentationCache()
+
+def snapshot_representation(key, memoized, computed_at, render, mimetype=JSON_MIMETYPE):
+    """Representation of a singleflight snapshot, rendered once per snapshot.
+
+    `memoized` is the singleflight function the snapshot came from and
+    `render` returns the encoded body, or the body and extra headers.
+    """
+    def build():
+        rendered = render()
+        body, headers = rendered if isinstance(rendered, tuple) else (rendered, None)
+        return Representation(
+            body,
+            mimetype,
+            headers=headers,
+            last_modified=computed_at,
+            expires_at=None if computed_at is None else computed_at + memoized.cache_timeout,
+            stale_while_revalidate=memoized.stale_timeout
+        )
+    return representations.get(key, computed_at, build)
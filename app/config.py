@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,11 +9,108 @@ class Config:
     COINGECKO_API_KEY = os.getenv('COINGECKO_API_KEY')
     OPENSEA_API_KEY = os.getenv('OPENSEA_API_KEY')
     
-    # Cache config
-    CACHE_TYPE = "SimpleCache"
+    # Cache config (shared by all workers, see app/cache_backends.py)
+    CACHE_TYPE = os.getenv('CACHE_TYPE', 'app.cache_backends.SQLiteCache')
     CACHE_DEFAULT_TIMEOUT = 300
+    CACHE_THRESHOLD = 2000
+    CACHE_SQLITE_PATH = os.getenv(
+        'CACHE_SQLITE_PATH',
+        os.path.join(tempfile.gettempdir(), 'eth_gdp_cache.sqlite3')
+    )
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_KEY_PREFIX = 'eth_gdp:'
     
     # Other configs
     ETHEREUM_ADDRESS = "0x0000000000000000000000000000000000000000"
     UPDATE_INTERVAL = 300  # 5 minutes 
-    ENABLE_TIMELINE = False  # Feature flag for timeline
\ No newline at end of file
+    ENABLE_TIMELINE = False  # Feature flag for timeline
+
+    # Upstream HTTP client
+    HTTP_CONNECT_TIMEOUT = 3.05
+    HTTP_READ_TIMEOUT = 20  # yields.llama.fi/pools is tens of MB
+    HTTP_RETRIES = 2
+    HTTP_POOL_SIZE = 10  # connections kept alive per upstream host
+    # Base URL of a stub server that receives every upstream call as
+    # <override>/<host>/<path> (used by the benchmark suite in bench/)
+    UPSTREAM_OVERRIDE = os.getenv('UPSTREAM_OVERRIDE')
+    # Token buckets per upstream host: (requests per second, burst). Calls
+    # beyond the rate queue up, live requests ahead of background refreshes
+    # and history backfills; hosts not listed are only paused by Retry-After.
+    # The buckets are per worker process, so the limits are split evenly
+    # between the WEB_CONCURRENCY workers (as gunicorn and uvicorn read it)
+    WEB_CONCURRENCY = max(1, int(os.getenv('WEB_CONCURRENCY', '1')))
+    UPSTREAM_RATE_LIMITS = {
+        # The public CoinGecko API allows roughly 30 calls a minute
+        'api.coingecko.com': (
+            float(os.getenv('COINGECKO_CALLS_PER_MINUTE', '25')) / 60 / WEB_CONCURRENCY,
+            max(1, 5 // WEB_CONCURRENCY)
+        )
+    }
+    UPSTREAM_LIVE_MAX_WAIT = 5  # seconds a live request may queue before giving up
+    UPSTREAM_MAX_PAUSE = 120  # longest Retry-After honored, in seconds
+    # Circuit breakers: after this many failed calls in a row (connection
+    # errors, timeouts, 5xx) calls to the host fail fast for
+    # CIRCUIT_RESET_TIMEOUT seconds, then CIRCUIT_HALF_OPEN_PROBES probe it
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+    CIRCUIT_RESET_TIMEOUT = int(os.getenv('CIRCUIT_RESET_TIMEOUT', '60'))
+    CIRCUIT_HALF_OPEN_PROBES = 1
+    CIRCUIT_BREAKERS = {
+        # Often down for long stretches, and DeFiLlama covers for it
+        'api.cryptostats.community': {'failure_threshold': 3, 'reset_timeout': 300}
+    }
+
+    # GDP component aggregation
+    COMPONENT_TIMEOUT = 8  # seconds a single component may take
+    COMPONENT_TIMEOUTS = {
+        'fees': 10  # CryptoStats plus the DeFiLlama fallback
+    }
+    GDP_REQUEST_BUDGET = 10  # seconds for the whole /api/gdp fan-out
+    # Values with several sources (protocol revenue) launch the next source
+    # once the running one is slower than this percentile of its recent calls
+    HEDGE_PERCENTILE = 0.9
+    HEDGE_DEFAULT_DELAY = 1.0  # seconds, before a source has any samples
+    HEDGE_MAX_DELAY = 5.0
+    HEDGE_STATS_MAX_AGE = 600  # seconds of latency/error history per source
+    # Last good value of every component, served on cold starts and upstream errors
+    SNAPSHOT_PATH = os.getenv(
+        'SNAPSHOT_PATH',
+        os.path.join(tempfile.gettempdir(), 'eth_gdp_snapshots.json')
+    )
+    SNAPSHOT_WARM_WAIT = 0.25  # seconds a snapshot-seeded component waits for a live value
+
+    # /api/stream (Server-Sent Events), served by app/asgi.py only; sync
+    # workers and Vercel would hold a worker or buffer the response, so
+    # there the page polls instead
+    STREAM_ENABLED = False  # set by app/asgi.py
+    STREAM_INTERVAL = 15  # seconds between checks of the cached GDP payload
+    STREAM_KEEPALIVE = 15  # seconds between keepalive comments on idle streams
+    # Under app/asgi.py, threads running the Flask app for the non-async routes
+    ASGI_WSGI_WORKERS = int(os.getenv('ASGI_WSGI_WORKERS', '10'))
+
+    # /api/yields pagination
+    YIELDS_DEFAULT_LIMIT = 10
+    YIELDS_MAX_LIMIT = 100
+
+    # Historical GDP components
+    HISTORY_DB_PATH = os.getenv(
+        'HISTORY_DB_PATH',
+        os.path.join(tempfile.gettempdir(), 'eth_gdp_history.sqlite3')
+    )
+    HISTORY_BACKFILL_DAYS = 365  # CoinGecko's public API serves one year
+    COIN_HISTORY_REFRESH = 300  # seconds before a coin's newest points are re-fetched
+    HISTORY_SYNC_WORKERS = 4  # series synced in parallel (still paced by the rate limiter)
+
+    # Observability: /metrics is always on; Server-Timing headers are opt-in
+    SERVER_TIMING = os.getenv('SERVER_TIMING', '0') == '1'
+
+    # Serverless cold starts: import pandas, requests and the history stack
+    # only when a route needs them; long-running servers load them at startup
+    FAST_START = os.getenv('FAST_START', '1' if os.getenv('VERCEL') else '0') == '1'
+
+    # Background refresh
+    ENABLE_SCHEDULER = os.getenv('ENABLE_SCHEDULER', '0' if FAST_START else '1') == '1'
+    REFRESH_FRACTION = 0.8  # refresh entries at 80% of their TTL
+    SCHEDULER_LOCK_FILE = os.getenv(
+        'SCHEDULER_LOCK_FILE',
+        os.path.join(tempfile.gettempdir(), 'eth_gdp_scheduler.lock')
+    )
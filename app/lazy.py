@@ -0,0 +1,61 @@
+"""Deferred imports and construction, for fast cold starts.
+
+pandas and numpy take most of the app's import time but only the history
+and yield routes need them. Modules bind them with ``lazy_import`` and use
+them as usual (``pd.Series(...)``); the real import happens on the first
+attribute access, so a serverless function answering ``/api/gdp`` never
+pays for it. ``Deferred`` does the same for module-level objects that are
+costly to build, such as stores that open files on construction.
+"""
+import importlib
+import importlib.util
+import threading
+
+
+class Deferred:
+    """Stand-in for `factory()`, which is called on first attribute access."""
+
+    def __init__(self, factory, name=None):
+        self._factory = factory
+        self._name = name or getattr(factory, '__qualname__', repr(factory))
+        self._target = None
+        self._lock = threading.Lock()
+
+    def resolve(self):
+        """The underlying object, built now if it has not been yet."""
+        target = self._target
+        if target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = self._factory()
+                target = self._target
+        return target
+
+    @property
+    def resolved(self):
+        return self._target is not None
+
+    def __getattr__(self, attr):
+        # Only reached for attributes the proxy itself does not have
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self):
+        state = 'resolved' if self.resolved else 'deferred'
+        return f"<{state} {self._name}>"
+
+
+def lazy_import(name, optional=False):
+    """A module proxy for `name`, imported on first use.
+
+    With `optional`, returns None when the module is not installed, so
+    ``if module is None`` checks keep working.
+    """
+    if optional and importlib.util.find_spec(name) is None:
+        return None
+    return Deferred(lambda: importlib.import_module(name), name)
+
+def preload(*targets):
+    """Resolve `targets` now, e.g. before gunicorn forks its workers."""
+    for target in targets:
+        if isinstance(target, Deferred):
+            target.resolve()
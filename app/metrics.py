@@ -0,0 +1,270 @@
+"""In-process metrics rendered in the Prometheus text format.
+
+Counters and histograms live in one module-level registry and are served at
+``/metrics``. ``timer`` records the duration of a block into a histogram
+and, while a request is being handled, adds it to that request's
+``Server-Timing`` header (when ``SERVER_TIMING`` is enabled). Counters kept
+by other objects, such as the cache backend's hit/miss/eviction stats, are
+read when rendered. Values are per worker process.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from flask import g, has_app_context, request
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = defaultdict(float)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name + _format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # key: [per-bucket counts..., +Inf count, sum]
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    def count(self, **labels):
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[-2] if state else 0
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in values:
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+                yield f"{self.name}_bucket{labels}", count
+            yield self.name + '_sum' + _format_labels(self.labelnames, key), state[-1]
+            yield self.name + '_count' + _format_labels(self.labelnames, key), state[-2]
+
+
+class CallbackCounter:
+    """A counter kept by another object: `collect()` returns {label values: count} when rendered."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def samples(self):
+        if self.collect is None:
+            return
+        for key, value in self.collect().items():
+            yield self.name + _format_labels(self.labelnames, key), value
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def callback_counter(self, name, documentation, labelnames=(), collect=None):
+        return self._register(CallbackCounter, name, documentation, labelnames, collect)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample, value in metric.samples():
+                lines.append(f"{sample} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+upstream_seconds = registry.histogram(
+    'eth_gdp_upstream_request_seconds', 'Latency of upstream HTTP calls.', ['host']
+)
+upstream_bytes = registry.counter(
+    'eth_gdp_upstream_bytes_total', 'Response bytes downloaded from upstream hosts.', ['host']
+)
+upstream_errors = registry.counter(
+    'eth_gdp_upstream_errors_total', 'Upstream calls that failed or returned an error status.', ['host']
+)
+upstream_retries = registry.counter(
+    'eth_gdp_upstream_retries_total', 'Upstream calls retried after an error.', ['host']
+)
+upstream_queue_seconds = registry.histogram(
+    'eth_gdp_upstream_queue_seconds', 'Time upstream calls waited for the rate limiter.',
+    ['host', 'priority']
+)
+upstream_rate_limited = registry.counter(
+    'eth_gdp_upstream_rate_limited_total', 'Upstream calls given up after waiting too long in the queue.',
+    ['host', 'priority']
+)
+json_parse_seconds = registry.histogram(
+    'eth_gdp_json_parse_seconds', 'Time spent parsing upstream JSON responses.', ['host']
+)
+transform_seconds = registry.histogram(
+    'eth_gdp_transform_seconds', 'Time spent in pandas/numpy transforms.', ['step']
+)
+component_seconds = registry.histogram(
+    'eth_gdp_component_seconds', 'Time to fetch each GDP component.', ['component']
+)
+source_seconds = registry.histogram(
+    'eth_gdp_source_seconds', 'Latency of each source of a multi-source value.', ['name', 'source', 'outcome']
+)
+source_hedges = registry.counter(
+    'eth_gdp_source_hedges_total', 'Backup sources launched, by reason (slow or failed).',
+    ['name', 'source', 'reason']
+)
+source_wins = registry.counter(
+    'eth_gdp_source_wins_total', 'Multi-source fetches answered by each source.', ['name', 'source']
+)
+circuit_transitions = registry.counter(
+    'eth_gdp_circuit_transitions_total', 'Upstream circuit breaker state changes, by new state.',
+    ['host', 'state']
+)
+cache_lookups = registry.counter(
+    'eth_gdp_cache_lookups_total', 'Memoized function lookups by result (hit, stale or miss).',
+    ['function', 'result']
+)
+cache_backend_events = registry.callback_counter(
+    'eth_gdp_cache_backend_events_total', 'Shared cache backend hits, misses and evictions.',
+    ['event']
+)
+route_seconds = registry.histogram(
+    'eth_gdp_http_request_seconds', 'Latency of requests served by the app.',
+    ['endpoint', 'method', 'status']
+)
+
+def record_timing(name, seconds):
+    """Add `seconds` to the current request's Server-Timing entry `name`."""
+    if not has_app_context():
+        return
+    timings = g.setdefault('server_timing', defaultdict(float))
+    timings[name] += seconds
+
+@contextmanager
+def timer(histogram, timing=None, **labels):
+    """Observe the duration of the block, and add it to Server-Timing as `timing`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram.observe(elapsed, **labels)
+        if timing:
+            record_timing(timing, elapsed)
+
+def init_app(app):
+    """Time every request, optionally send a Server-Timing header and export cache stats."""
+
+    def cache_stats():
+        events = defaultdict(int)
+        for backend in app.extensions.get('cache', {}).values():
+            if hasattr(backend, 'stats'):
+                for event, count in backend.stats().items():
+                    events[(event,)] += count
+        return events
+
+    cache_backend_events.collect = cache_stats
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route_seconds.observe(
+            elapsed,
+            endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method,
+            status=response.status_code
+        )
+        if app.config.get('SERVER_TIMING'):
+            timings = dict(g.get('server_timing') or {}, total=elapsed)
+            response.headers['Server-Timing'] = ', '.join(
+                f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()
+            )
+        return response
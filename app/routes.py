@@ -1,13 +1,17 @@
-from flask import Blueprint, jsonify, render_template
-from app.services.coingecko import CoinGeckoService
+from flask import Blueprint, current_app, jsonify, render_template, request
+from app import metrics
+from app.config import Config
 from app.services.defillama import DefiLlamaService
-from app.services.fees import FeesService
-from app.services.nft import NFTService
-from app import cache
+from app.services.aggregator import ComponentAggregator, gdp_components
+from app.services.fees import revenue_sources
+from app.services.http_client import breakers
+from app.services.history import history, rollups
+from app.services.rollups import PERIODS
+from app.services.yields import PoolIndex
+from app.singleflight import StillComputing, singleflight
+from app.conditional import Representation, representations, snapshot_representation
+from app.serialization import JSON_MIMETYPE, MSGPACK_MIMETYPE, dumps, negotiate
 import logging
-from datetime import datetime, timedelta
-import pandas as pd
-import random
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,82 +22,133 @@ main = Blueprint('main', __name__)
 def index():
     return render_template('index.html')
 
+@main.app_errorhandler(StillComputing)
+def still_computing(e):
+    # The value is being computed for another request and nothing older is cached
+    response = jsonify({'error': 'Data is still being fetched, retry shortly'})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+def conditional(representation):
+    """A 200 or 304 response for `representation` under this request's headers."""
+    status, body, headers = representation.respond(request.headers)
+    return current_app.response_class(body, status=status, headers=headers)
+
 @main.route('/api/gdp')
-@cache.cached(timeout=60)
 def get_gdp():
     try:
-        # Get all component data with proper error handling
-        eth_market_data = CoinGeckoService.get_eth_market_data()
-        if not eth_market_data['market_cap']:
-            raise Exception("Failed to fetch ETH market data")
-        logger.info("Successfully fetched ETH market data")
-        
-        # Monetary Base (M)
-        M = eth_market_data['market_cap']
-        
-        # TVL (K)
-        tvl_data = DefiLlamaService.get_eth_tvl()
-        K = tvl_data['current']
-        if not K:
-            logger.warning("TVL data returned 0")
-        logger.info("Successfully fetched TVL data")
-        tvl_change = tvl_data['change_24h']
-        
-        # Fees (F)
-        fees_data = FeesService.get_eth_protocol_revenue()
-        F = fees_data['current']
-        if not F:
-            logger.warning("Protocol revenue data returned 0")
-        logger.info("Successfully fetched protocol revenue data")
-        fees_change = fees_data['change_24h']
-        
-        # Stablecoins and Bridged Assets (S)
-        stablecoins_data = DefiLlamaService.get_stablecoin_supply()
-        S = stablecoins_data['total']
-        if not S:
-            logger.warning("Stablecoin data returned 0")
-        logger.info("Successfully fetched stablecoin data")
-        stablecoins_change = stablecoins_data['change_24h']
-        
-        # Protocol Market Caps (P)
-        P = CoinGeckoService.get_protocol_market_caps()
-        if not P:
-            logger.warning("Protocol market caps returned 0")
-        logger.info("Successfully fetched protocol market caps")
-        
-        gdp = M + K + F + S + P
-        
-        # Calculate 24h change
-        gdp_change = (
-            eth_market_data.get('price_change_percentage_24h', 0) * (M / gdp) +
-            tvl_change * (K / gdp) +
-            fees_change * (F / gdp)
-        )
-        
-        return jsonify({
-            'gdp': gdp,
-            'change_24h': gdp_change,
-            'components': {
-                'monetary_base': M,
-                'tvl': K,
-                'fees': F,
-                'stablecoins': S,
-                'protocols': P
-            },
-            'metadata': {
-                'eth_price': eth_market_data['current_price'],
-                'eth_24h_change': eth_market_data['price_change_24h'],
-                'eth_24h_volume': eth_market_data['volume_24h'],
-                'tvl_24h_change': tvl_change,
-                'fees_24h_change': fees_change,
-                'stablecoins_24h_change': stablecoins_change,
-                'stablecoins_distribution': stablecoins_data['distribution']
-            }
-        })
+        return conditional(gdp_representation(*compute_gdp.snapshot()))
+    except StillComputing:
+        raise
     except Exception as e:
         logger.error(f"Error calculating GDP: {str(e)}")
         return jsonify({'error': 'Failed to calculate GDP'}), 500
 
+def _is_complete(payload):
+    """Only cache GDP payloads built from fresh components."""
+    status = payload['metadata']['component_status']
+    return all(value == 'ok' for value in status.values())
+
+@singleflight(timeout=60, should_cache=_is_complete)
+def compute_gdp():
+    # Fetch all components concurrently; late ones come back stale or missing
+    return build_gdp(gdp_components.fetch())
+
+@singleflight(timeout=60, should_cache=_is_complete, shares=compute_gdp)
+async def compute_gdp_async():
+    return build_gdp(await gdp_components.fetch_async())
+
+def gdp_representation(payload, computed_at):
+    return snapshot_representation(('gdp',), compute_gdp, computed_at, lambda: dumps(payload))
+
+def build_gdp(results):
+    """The /api/gdp payload from ComponentAggregator results."""
+    status = {name: result['status'] for name, result in results.items()}
+
+    eth_market_data = results['eth_market_data']['value']
+    if not eth_market_data or not eth_market_data['market_cap']:
+        raise Exception("Failed to fetch ETH market data")
+    logger.info("Successfully fetched ETH market data")
+    
+    # Monetary Base (M)
+    M = eth_market_data['market_cap']
+    
+    # TVL (K)
+    tvl_data = results['tvl']['value'] or {'current': 0, 'change_24h': 0}
+    K = tvl_data['current']
+    if not K:
+        logger.warning(f"TVL data returned 0 ({status['tvl']})")
+    tvl_change = tvl_data['change_24h']
+    
+    # Fees (F)
+    fees_data = results['fees']['value'] or {'current': 0, 'change_24h': 0}
+    F = fees_data['current']
+    if not F:
+        logger.warning(f"Protocol revenue data returned 0 ({status['fees']})")
+    fees_change = fees_data['change_24h']
+    
+    # Stablecoins and Bridged Assets (S)
+    stablecoins_data = results['stablecoins']['value'] or {
+        'total': 0,
+        'change_24h': 0,
+        'distribution': {'USDT': 0, 'USDC': 0, 'DAI': 0, 'Others': 0}
+    }
+    S = stablecoins_data['total']
+    if not S:
+        logger.warning(f"Stablecoin data returned 0 ({status['stablecoins']})")
+    stablecoins_change = stablecoins_data['change_24h']
+    
+    # Protocol Market Caps (P)
+    P = results['protocols']['value'] or 0
+    if not P:
+        logger.warning(f"Protocol market caps returned 0 ({status['protocols']})")
+    
+    gdp = M + K + F + S + P
+    
+    # Calculate 24h change
+    gdp_change = (
+        eth_market_data.get('price_change_percentage_24h', 0) * (M / gdp) +
+        tvl_change * (K / gdp) +
+        fees_change * (F / gdp)
+    )
+    
+    return {
+        'gdp': gdp,
+        'change_24h': gdp_change,
+        'components': {
+            'monetary_base': M,
+            'tvl': K,
+            'fees': F,
+            'stablecoins': S,
+            'protocols': P
+        },
+        'metadata': {
+            'eth_price': eth_market_data['current_price'],
+            'eth_24h_change': eth_market_data['price_change_24h'],
+            'eth_24h_volume': eth_market_data['volume_24h'],
+            'tvl_24h_change': tvl_change,
+            'fees_24h_change': fees_change,
+            'stablecoins_24h_change': stablecoins_change,
+            'stablecoins_distribution': stablecoins_data['distribution'],
+            'component_status': {
+                'monetary_base': status['eth_market_data'],
+                'tvl': status['tvl'],
+                'fees': status['fees'],
+                'stablecoins': status['stablecoins'],
+                'protocols': status['protocols']
+            },
+            # When each component's value was fetched; older than the
+            # response for 'stale' components served from the last good value
+            'component_updated_at': {
+                'monetary_base': results['eth_market_data']['updated_at'],
+                'tvl': results['tvl']['updated_at'],
+                'fees': results['fees']['updated_at'],
+                'stablecoins': results['stablecoins']['updated_at'],
+                'protocols': results['protocols']['updated_at']
+            }
+        }
+    }
+
 @main.route('/methodology')
 def methodology():
     components = [
@@ -191,84 +246,236 @@ def methodology():
                          projections=projections)
 
 @main.route('/api/gdp/historical/<period>')
-@cache.cached(timeout=300)
 def get_historical_gdp(period):
+    if period not in PERIODS:
+        return jsonify({'error': 'Invalid period'}), 400
+
     try:
-        end_date = datetime.now()
-        
-        # Define timeframes
-        if period == '24h':
-            start_date = end_date - timedelta(days=1)
-            interval = '1h'
-        elif period == '1w':
-            start_date = end_date - timedelta(weeks=1)
-            interval = '4h'
-        elif period == '1m':
-            start_date = end_date - timedelta(days=30)
-            interval = '1d'
-        elif period == '1y':
-            start_date = end_date - timedelta(days=365)
-            interval = '1d'
-        else:
-            return jsonify({'error': 'Invalid period'}), 400
-
-        # Get historical data from each service
-        eth_data = CoinGeckoService.get_historical_market_data(start_date, end_date, interval)
-        tvl_data = DefiLlamaService.get_historical_tvl(start_date, end_date)
-        fees_data = FeesService.get_historical_fees(start_date, end_date)
-        stables_data = DefiLlamaService.get_historical_stables(start_date, end_date)
-        protocols_data = CoinGeckoService.get_historical_protocol_mcaps(start_date, end_date)
-        nft_data = NFTService.get_historical_nft_data(start_date, end_date)
-
-        # Combine all data into a pandas DataFrame for easy manipulation
-        df = pd.DataFrame(index=pd.date_range(start=start_date, end=end_date, freq=interval))
-        
-        df['monetary_base'] = eth_data
-        df['tvl'] = tvl_data
-        df['fees'] = fees_data
-        df['stablecoins'] = stables_data
-        df['protocols'] = protocols_data
-        df['cultural'] = nft_data
-        
-        # Calculate total GDP for each timestamp
-        df['gdp'] = df.sum(axis=1)
-        
-        # Format dates for chart labels
-        if period == '24h':
-            labels = [d.strftime('%H:%M') for d in df.index]
-        elif period == '1w':
-            labels = [d.strftime('%a %H:%M') for d in df.index]
-        elif period in ['1m', '1y']:
-            labels = [d.strftime('%Y-%m-%d') for d in df.index]
-
-        return jsonify({
-            'labels': labels,
-            'values': df['gdp'].tolist(),
-            'components': {
-                'monetary_base': df['monetary_base'].tolist(),
-                'tvl': df['tvl'].tolist(),
-                'fees': df['fees'].tolist(),
-                'stablecoins': df['stablecoins'].tolist(),
-                'protocols': df['protocols'].tolist(),
-                'cultural': df['cultural'].tolist()
-            }
-        })
+        # The scheduler extends the store. Without one (FAST_START) a
+        # background thread does, except on a cold store (a new serverless
+        # instance), which nothing else would fill before answering
+        if not Config.ENABLE_SCHEDULER:
+            if history.missing():
+                history.sync()
+            else:
+                history.sync_in_background()
+        fmt = negotiate(request)
+        body, rendered_at = rollups.get(period, fmt)
+        response = conditional(representations.get(
+            ('historical', period, fmt),
+            rendered_at,
+            lambda: Representation(
+                body,
+                MSGPACK_MIMETYPE if fmt == 'msgpack' else JSON_MIMETYPE,
+                last_modified=rendered_at,
+                # New points arrive with the next history sync
+                expires_at=rendered_at + Config.UPDATE_INTERVAL,
+                stale_while_revalidate=Config.UPDATE_INTERVAL,
+                headers={'Vary': 'Accept'}
+            )
+        ))
+        if history.missing():
+            # Still backfilling: keep browsers and CDNs from holding on to gaps
+            response.headers['Cache-Control'] = 'no-store'
+        return response
 
     except Exception as e:
         logger.error(f"Error fetching historical GDP data: {str(e)}")
         return jsonify({'error': 'Failed to fetch historical data'}), 500 
 
+@main.route('/metrics')
+def get_metrics():
+    return current_app.response_class(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@main.route('/api/status')
+def get_status():
+    """Upstream health: circuit breaker states and the raced revenue sources."""
+    return jsonify({
+        'circuits': breakers.status(),
+        'sources': {revenue_sources.name: revenue_sources.status()}
+    })
+
 @main.route('/api/protocols')
 def get_protocols():
-    protocols = DefiLlamaService.get_top_protocols()
-    return jsonify(protocols)
+    return conditional(protocols_representation(*DefiLlamaService.get_protocol_index.snapshot()))
 
 @main.route('/api/categories')
 def get_categories():
-    categories = DefiLlamaService.get_category_distribution()
-    return jsonify(categories)
+    return conditional(categories_representation(*DefiLlamaService.get_protocol_index.snapshot()))
+
+def protocols_representation(index, computed_at):
+    return snapshot_representation(
+        ('protocols',), DefiLlamaService.get_protocol_index, computed_at,
+        lambda: dumps([] if index is None else index.top(10))
+    )
+
+def categories_representation(index, computed_at):
+    return snapshot_representation(
+        ('categories',), DefiLlamaService.get_protocol_index, computed_at,
+        lambda: dumps({} if index is None else dict(index.category_totals))
+    )
 
 @main.route('/api/yields')
 def get_yields():
-    yields = DefiLlamaService.get_top_yields()
-    return jsonify(yields) 
\ No newline at end of file
+    """Ethereum yield pools; see yield_query for the query parameters.
+
+    Returns one page of pools and the number matching in X-Total-Count.
+    """
+    try:
+        query = yield_query(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return conditional(yields_representation(*DefiLlamaService.get_yield_index.snapshot(), query))
+
+@main.route('/api/yields/protocols')
+def get_yield_protocols():
+    """Per-protocol pool count, TVL and APY, largest TVL first."""
+    try:
+        filters = yield_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return conditional(
+        yield_protocols_representation(*DefiLlamaService.get_yield_index.snapshot(), filters)
+    )
+
+def yields_representation(index, computed_at, query):
+    def render():
+        if index is None:
+            return dumps([])
+        total, pools = index.query(**query)
+        return dumps(pools), {'X-Total-Count': str(total)}
+
+    return snapshot_representation(
+        ('yields', tuple(sorted(query.items()))), DefiLlamaService.get_yield_index, computed_at, render
+    )
+
+def yield_protocols_representation(index, computed_at, filters):
+    return snapshot_representation(
+        ('yield-protocols', tuple(sorted(filters.items()))), DefiLlamaService.get_yield_index, computed_at,
+        lambda: dumps([] if index is None else index.aggregates(**filters))
+    )
+
+def query_number(args, name, parse, default=None):
+    """?name= parsed with `parse` (int or float), or `default` when absent."""
+    value = args.get(name)
+    if not value:
+        return default
+    try:
+        return parse(value)
+    except ValueError:
+        kind = 'an integer' if parse is int else 'a number'
+        raise ValueError(f"{name} must be {kind}, got {value!r}") from None
+
+def yield_filters(args):
+    """?stablecoin=1 keeps stablecoin pools only, ?min_tvl= drops smaller pools."""
+    return {
+        'stablecoin': args.get('stablecoin', '').lower() in ('1', 'true', 'yes'),
+        'min_tvl': query_number(args, 'min_tvl', float)
+    }
+
+def yield_query(args):
+    """PoolIndex.query arguments from ?project=, ?sort=, ?limit=, ?offset= and the filters."""
+    sort = args.get('sort', 'apy')
+    if sort not in PoolIndex.SORT_KEYS:
+        raise ValueError(f"sort must be one of: {', '.join(PoolIndex.SORT_KEYS)}")
+    limit = query_number(args, 'limit', int, Config.YIELDS_DEFAULT_LIMIT)
+    offset = query_number(args, 'offset', int, 0)
+    if not 0 < limit <= Config.YIELDS_MAX_LIMIT or offset < 0:
+        raise ValueError(f"limit must be 1-{Config.YIELDS_MAX_LIMIT} and offset non-negative")
+    return dict(
+        yield_filters(args),
+        sort=sort,
+        project=args.get('project'),
+        offset=offset,
+        limit=limit
+    )
+
+@main.route('/api/dashboard')
+def get_dashboard():
+    """Everything the dashboard shows in one response; see dashboard_fields."""
+    try:
+        fields = dashboard_fields(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    results = dashboard_snapshots.fetch(names=dashboard_sources(fields))
+    return conditional(dashboard_representation(fields, results))
+
+# Memoized functions whose snapshots make up the dashboard
+DASHBOARD_SOURCES = {
+    'gdp': compute_gdp,
+    'protocol_index': DefiLlamaService.get_protocol_index,
+    'yield_index': DefiLlamaService.get_yield_index
+}
+
+# Dashboard sections: (source snapshot, render from its value)
+DASHBOARD_SECTIONS = {
+    'gdp': ('gdp', lambda payload: payload),
+    'protocols': ('protocol_index', lambda index: [] if index is None else index.top(10)),
+    'categories': ('protocol_index', lambda index: {} if index is None else dict(index.category_totals)),
+    'yields': ('yield_index', lambda index: [] if index is None else index.query(**yield_query({}))[1])
+}
+
+# Sources are fetched concurrently; one that misses its deadline or fails
+# is served from its last good snapshot, like a GDP component. Uncached
+# values (a partial GDP) are served too, and leave the response uncached
+dashboard_snapshots = ComponentAggregator(
+    DASHBOARD_SOURCES,
+    timeouts={'gdp': Config.GDP_REQUEST_BUDGET},
+    validate=False,
+    async_components={
+        'gdp': compute_gdp_async,
+        'protocol_index': DefiLlamaService.get_protocol_index_async,
+        'yield_index': DefiLlamaService.get_yield_index_async
+    }
+)
+
+def dashboard_fields(args):
+    """The sections picked with ?fields=gdp,yields (all of them by default)."""
+    requested = {name.strip() for name in args.get('fields', '').split(',') if name.strip()}
+    if not requested:
+        return tuple(DASHBOARD_SECTIONS)
+    if not requested.issubset(DASHBOARD_SECTIONS):
+        raise ValueError(f"fields must be a comma-separated subset of: {', '.join(DASHBOARD_SECTIONS)}")
+    return tuple(name for name in DASHBOARD_SECTIONS if name in requested)
+
+def dashboard_sources(fields):
+    return sorted({DASHBOARD_SECTIONS[field][0] for field in fields})
+
+def dashboard_representation(fields, results):
+    """The dashboard body for `fields`, from ComponentAggregator results of its sources.
+
+    The version is the computation time of every snapshot involved, so all
+    callers share one serialization (per field selection) until any of them
+    is refreshed; a snapshot that was not cached, such as a partial GDP,
+    leaves the response uncached as well.
+    """
+    snapshots = {name: (result['value'], result['updated_at']) for name, result in results.items()}
+    stamps = tuple(computed_at for _, computed_at in snapshots.values())
+    version = None if None in stamps else stamps
+
+    def build():
+        body = {
+            'version': None if version is None else '.'.join(str(int(stamp * 1000)) for stamp in stamps),
+            'computed_at': {name: computed_at for name, (_, computed_at) in snapshots.items()}
+        }
+        for field in fields:
+            source, render = DASHBOARD_SECTIONS[field]
+            body[field] = render(snapshots[source][0])
+
+        expires_at = None
+        if version is not None:
+            expires_at = min(
+                computed_at + DASHBOARD_SOURCES[name].cache_timeout
+                for name, (_, computed_at) in snapshots.items()
+            )
+        return Representation(
+            dumps(body),
+            last_modified=None if version is None else max(stamps),
+            expires_at=expires_at,
+            stale_while_revalidate=min(DASHBOARD_SOURCES[name].stale_timeout for name in snapshots)
+        )
+
+    return representations.get(('dashboard', fields), version, build)
@@ -0,0 +1,136 @@
+import logging
+import os
+from datetime import datetime
+from apscheduler.schedulers.background import BackgroundScheduler
+from app.config import Config
+from app.services.rate_limit import REFRESH, priority
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+class LeaderLock:
+    """Non-blocking exclusive lock on a local file.
+
+    Only one process on the box can hold it; the OS releases it when the
+    holder exits, so another worker can take over on its next attempt.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def acquire(self):
+        if self._file is not None:
+            return True
+        lock_file = open(self.path, 'a+')
+        try:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._file = lock_file
+        return True
+
+
+class RefreshScheduler:
+    """Re-fetch memoized service methods before their cache entries expire.
+
+    Every worker runs the scheduler, but only the one holding the leader
+    lock schedules refresh jobs; the others just retry the lock periodically
+    in case the leader goes away.
+    """
+
+    def __init__(self, lock_path, election_interval=30):
+        self.lock = LeaderLock(lock_path)
+        self.election_interval = election_interval
+        self.scheduler = BackgroundScheduler(daemon=True)
+        self.jobs = []
+
+    def add(self, fn, *args, interval=None):
+        """Register a function to refresh every `interval` seconds.
+
+        Single-flight memoized functions default to a fraction of their TTL
+        and have their cache entry replaced; plain callables are just called.
+        """
+        if interval is None:
+            interval = min(
+                Config.UPDATE_INTERVAL,
+                fn.cache_timeout * Config.REFRESH_FRACTION
+            )
+        self.jobs.append((fn, args, interval))
+
+    def start(self):
+        self.scheduler.add_job(
+            self._elect,
+            'interval',
+            seconds=self.election_interval,
+            id='leader-election',
+            next_run_time=datetime.now()
+        )
+        self.scheduler.start()
+
+    def shutdown(self):
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+
+    def _elect(self):
+        if self.lock.held or not self.lock.acquire():
+            return
+        logger.info(f"Process {os.getpid()} is the refresh leader")
+        self.scheduler.remove_job('leader-election')
+        for fn, args, interval in self.jobs:
+            self.scheduler.add_job(
+                refresh,
+                'interval',
+                args=(fn, *args),
+                seconds=interval,
+                id=f"refresh:{fn.__qualname__}",
+                next_run_time=datetime.now(),
+                max_instances=1,
+                coalesce=True
+            )
+
+
+def refresh(fn, *args):
+    """Recompute a single-flight memoized function and overwrite its cache entry."""
+    try:
+        with priority(REFRESH):
+            getattr(fn, 'refresh', fn)(*args)
+    except Exception as e:
+        logger.error(f"Error refreshing {fn.__qualname__}: {e}")
+
+
+def start_scheduler():
+    from app.services.coingecko import CoinGeckoService
+    from app.services.defillama import DefiLlamaService
+    from app.services.fees import FeesService
+    from app.services.history import history
+
+    refresher = RefreshScheduler(Config.SCHEDULER_LOCK_FILE)
+    refresher.add(CoinGeckoService.get_eth_market_data)
+    refresher.add(CoinGeckoService.get_protocol_market_caps)
+    refresher.add(DefiLlamaService.get_eth_tvl)
+    refresher.add(DefiLlamaService.get_stablecoin_supply)
+    refresher.add(DefiLlamaService.get_protocol_index)
+    refresher.add(DefiLlamaService.get_yield_index)
+    refresher.add(FeesService.get_eth_protocol_revenue)
+    refresher.add(history.sync, interval=Config.UPDATE_INTERVAL)
+    refresher.start()
+    return refresher
@@ -0,0 +1,100 @@
+"""Fast response encoding.
+
+JSON goes through orjson when it is installed: it is several times faster
+than the stdlib encoder, writes NaN as null, and encodes numpy arrays
+directly without a ``.tolist()`` round trip. Chart series can also be
+sent as MessagePack with each column packed as raw little-endian float64
+bytes (readable with ``new Float64Array(buffer)``).
+"""
+import json
+from flask.json.provider import DefaultJSONProvider
+from app.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+
+def dumps(obj):
+    """Encode `obj` as compact JSON bytes, sorting keys like jsonify does."""
+    if orjson is not None:
+        return orjson.dumps(
+            obj,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+        )
+    return json.dumps(obj, separators=(',', ':'), sort_keys=True, default=_default).encode()
+
+def loads(data):
+    """Decode JSON from bytes or a buffer such as a memoryview."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(bytes(data))
+
+def _default(obj):
+    if isinstance(obj, np.ndarray):
+        return [None if v != v else v for v in obj.tolist()]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def encode_columns(labels, columns, fmt='json'):
+    """Encode a chart payload: labels, GDP `values` and component columns.
+
+    `columns` maps 'values' and each component name to a float64 array.
+    """
+    if fmt == 'msgpack':
+        if msgpack is None:
+            raise RuntimeError("no msgpack module found")
+        return msgpack.packb({
+            'labels': list(labels),
+            'dtype': '<f8',
+            'values': _float_bytes(columns['values']),
+            'components': {
+                name: _float_bytes(values)
+                for name, values in columns.items() if name != 'values'
+            }
+        })
+    return dumps({
+        'labels': list(labels),
+        'values': columns['values'],
+        'components': {name: values for name, values in columns.items() if name != 'values'}
+    })
+
+def _float_bytes(values):
+    return np.ascontiguousarray(values, dtype='<f8').tobytes()
+
+def negotiate(request):
+    """Pick 'msgpack' or 'json' from ?format= or the Accept header."""
+    fmt = request.args.get('format')
+    if fmt in ('json', 'msgpack'):
+        return fmt
+    if msgpack is not None and request.accept_mimetypes.best_match(
+        [JSON_MIMETYPE, MSGPACK_MIMETYPE]
+    ) == MSGPACK_MIMETYPE:
+        return 'msgpack'
+    return 'json'
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that makes jsonify use orjson when available."""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode()
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from threading import Lock
+from app import metrics
+from app.config import Config
+from app.snapshots import SnapshotStore
+from app.services.coingecko import CoinGeckoService
+from app.services.defillama import DefiLlamaService
+from app.services.fees import FeesService
+
+logger = logging.getLogger(__name__)
+
+class ComponentAggregator:
+    """Fetch GDP components concurrently under a per-component deadline.
+
+    Every component runs on its own worker thread. A component that is not
+    back before its deadline (or before the overall request budget runs out)
+    is reported as 'stale' with the last value this process saw, or as
+    'missing' if there is none. The slow fetch keeps running in the
+    background and later callers pick up its result instead of starting a
+    second upstream call. `fetch_async` does the same on the event loop,
+    running the `async_components` variants as tasks.
+
+    Components are read through their singleflight `snapshot`, so a value
+    is reported with the time it was computed, and as 'stale' once its
+    cache entry has expired (while it is revalidated in the background).
+
+    A value the component's own cache would reject (its singleflight
+    `should_cache`, e.g. the zeros services return on upstream errors)
+    counts as a failure, unless `validate` is off. Successful values are
+    persisted to `snapshots`, which also seed the last good values of a new
+    process; until such a component has been fetched live it only waits
+    `warm_wait` seconds before its snapshot is served, so a cold start
+    answers immediately.
+    """
+
+    def __init__(self, components, timeouts=None, max_workers=None, async_components=None,
+                 snapshots=None, warm_wait=0, validate=True):
+        self.components = components
+        self.async_components = async_components or {}
+        self.timeouts = timeouts or {}
+        self.snapshots = snapshots
+        self.warm_wait = warm_wait
+        self.validate = validate
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or len(components),
+            thread_name_prefix='gdp-component'
+        )
+        self._lock = Lock()
+        self._pending = {}
+        self._pending_async = {}
+        self._last_good = {}
+        self._from_snapshot = set()
+        if snapshots is not None:
+            for name in snapshots.names():
+                if name in components:
+                    snapshot = snapshots.get(name)
+                    self._last_good[name] = (snapshot['value'], snapshot['updated_at'])
+                    self._from_snapshot.add(name)
+
+    def _submit(self, name):
+        with self._lock:
+            future = self._pending.get(name)
+            if future is None:
+                future = self._executor.submit(self._run, name)
+                self._pending[name] = future
+            return future
+
+    def _check(self, fn, name, value):
+        should_cache = getattr(fn, 'should_cache', None)
+        if self.validate and should_cache is not None and not should_cache(value):
+            raise ValueError(f"{name} returned no data")
+
+    @staticmethod
+    def _result(fn, value, updated_at):
+        # None: computed just now but not cached. Past the entry's expiry the
+        # cache served it stale while it is revalidated
+        fresh = updated_at is None or updated_at + fn.cache_timeout > time.time()
+        return {'value': value, 'status': 'ok' if fresh else 'stale', 'updated_at': updated_at}
+
+    def _succeeded(self, name, value, updated_at):
+        with self._lock:
+            self._last_good[name] = (value, updated_at)
+            self._from_snapshot.discard(name)
+
+    def _run(self, name):
+        started = time.monotonic()
+        try:
+            value, updated_at = self.components[name].snapshot()
+            self._check(self.components[name], name, value)
+            self._succeeded(name, value, updated_at)
+            if self.snapshots is not None and updated_at is not None:
+                self.snapshots.record(name, value, updated_at)
+            return value, updated_at
+        finally:
+            with self._lock:
+                self._pending.pop(name, None)
+            elapsed = time.monotonic() - started
+            metrics.component_seconds.observe(elapsed, component=name)
+            logger.info(f"Fetched component {name} in {elapsed:.3f}s")
+
+    def fetch(self, budget=None, names=None):
+        """Return {name: {'value', 'status', 'updated_at'}} for `names` (default all)."""
+        budget = budget if budget is not None else Config.GDP_REQUEST_BUDGET
+        started = time.monotonic()
+        futures = {name: self._submit(name) for name in names or self.components}
+
+        results = {}
+        for name, future in futures.items():
+            timeout = self._timeout(name, budget)
+            remaining = max(0, started + timeout - time.monotonic())
+            try:
+                value, updated_at = future.result(timeout=remaining)
+                results[name] = self._result(self.components[name], value, updated_at)
+            except TimeoutError:
+                self._missed(name, timeout)
+                results[name] = self._fallback(name)
+            except Exception as e:
+                logger.error(f"Component {name} failed: {e}")
+                results[name] = self._fallback(name)
+        metrics.record_timing('components', time.monotonic() - started)
+        return results
+
+    def _submit_async(self, name):
+        task = self._pending_async.get(name)
+        if task is None:
+            task = self._pending_async[name] = asyncio.ensure_future(self._run_async(name))
+        return task
+
+    async def _run_async(self, name):
+        started = time.monotonic()
+        try:
+            value, updated_at = await self.async_components[name].snapshot()
+            self._check(self.async_components[name], name, value)
+            self._succeeded(name, value, updated_at)
+            if self.snapshots is not None and updated_at is not None:
+                await asyncio.to_thread(self.snapshots.record, name, value, updated_at)
+            return value, updated_at
+        finally:
+            self._pending_async.pop(name, None)
+            elapsed = time.monotonic() - started
+            metrics.component_seconds.observe(elapsed, component=name)
+            logger.info(f"Fetched component {name} in {elapsed:.3f}s")
+
+    async def fetch_async(self, budget=None, names=None):
+        """`fetch` for the event loop, awaiting the `async_components` variants."""
+        budget = budget if budget is not None else Config.GDP_REQUEST_BUDGET
+        started = time.monotonic()
+        tasks = {name: self._submit_async(name) for name in names or self.async_components}
+
+        results = {}
+        for name, task in tasks.items():
+            timeout = self._timeout(name, budget)
+            remaining = max(0, started + timeout - time.monotonic())
+            try:
+                # Shielded so a late component keeps running for later callers
+                value, updated_at = await asyncio.wait_for(asyncio.shield(task), remaining)
+                results[name] = self._result(self.async_components[name], value, updated_at)
+            except asyncio.TimeoutError:
+                self._missed(name, timeout)
+                results[name] = self._fallback(name)
+            except Exception as e:
+                logger.error(f"Component {name} failed: {e}")
+                results[name] = self._fallback(name)
+        return results
+
+    def _timeout(self, name, budget):
+        timeout = min(self.timeouts.get(name, Config.COMPONENT_TIMEOUT), budget)
+        with self._lock:
+            if name in self._from_snapshot:
+                # Serve the persisted value rather than wait on a cold upstream
+                return min(timeout, self.warm_wait)
+        return timeout
+
+    def _missed(self, name, timeout):
+        with self._lock:
+            warm = name in self._from_snapshot
+        if warm:
+            logger.info(f"Serving the snapshot of {name} while it is fetched")
+        else:
+            logger.warning(f"Component {name} missed its {timeout}s deadline")
+
+    def _fallback(self, name):
+        with self._lock:
+            last_good = self._last_good.get(name)
+        if last_good is None:
+            return {'value': None, 'status': 'missing', 'updated_at': None}
+        value, updated_at = last_good
+        return {'value': value, 'status': 'stale', 'updated_at': updated_at}
+
+
+gdp_components = ComponentAggregator(
+    {
+        'eth_market_data': CoinGeckoService.get_eth_market_data,
+        'tvl': DefiLlamaService.get_eth_tvl,
+        'fees': FeesService.get_eth_protocol_revenue,
+        'stablecoins': DefiLlamaService.get_stablecoin_supply,
+        'protocols': CoinGeckoService.get_protocol_market_caps
+    },
+    timeouts=Config.COMPONENT_TIMEOUTS,
+    snapshots=SnapshotStore(Config.SNAPSHOT_PATH),
+    warm_wait=Config.SNAPSHOT_WARM_WAIT,
+    async_components={
+        'eth_market_data': CoinGeckoService.get_eth_market_data_async,
+        'tvl': DefiLlamaService.get_eth_tvl_async,
+        'fees': FeesService.get_eth_protocol_revenue_async,
+        'stablecoins': DefiLlamaService.get_stablecoin_supply_async,
+        'protocols': CoinGeckoService.get_protocol_market_caps_async
+    }
+)
@@ -0,0 +1,73 @@
+"""Put component series with different sampling onto one time grid.
+
+CoinGecko series arrive hourly (or every few minutes at the tail) at
+arbitrary seconds, DeFiLlama series arrive daily at midnight. Assigning
+them onto a grid by index equality leaves most cells empty, so instead
+every grid point takes the value *as of* its target time under a
+per-series policy:
+
+- ``ffill``: the last observation at or before the target
+- ``linear``: linear interpolation between the surrounding observations,
+  falling back to ``ffill`` after the last one
+
+Either way a value older than ``max_staleness`` seconds is treated as
+missing (NaN) rather than carried forward indefinitely.
+"""
+from collections import namedtuple
+from app.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+Policy = namedtuple('Policy', ['method', 'max_staleness'])
+
+FFILL = 'ffill'
+LINEAR = 'linear'
+
+DEFAULT_POLICY = Policy(FFILL, 2 * 24 * 3600)
+
+def as_of(ts, values, targets, max_staleness):
+    """Last value at or before each target, NaN where none is fresh enough.
+
+    `ts` must be sorted and non-empty.
+    """
+    idx = np.searchsorted(ts, targets, side='right') - 1
+    found = idx >= 0
+    safe_idx = np.where(found, idx, 0)
+    result = np.where(found, values[safe_idx], np.nan)
+    if max_staleness is not None:
+        result[found & (targets - ts[safe_idx] > max_staleness)] = np.nan
+    return result
+
+def interpolate(ts, values, targets, max_staleness):
+    """Linear interpolation between observations no more than max_staleness apart."""
+    result = as_of(ts, values, targets, max_staleness)
+    if len(ts) < 2:
+        return result
+
+    inside = (targets >= ts[0]) & (targets <= ts[-1])
+    if max_staleness is not None:
+        right = np.clip(np.searchsorted(ts, targets, side='left'), 1, len(ts) - 1)
+        inside &= (ts[right] - ts[right - 1]) <= max_staleness
+    return np.where(inside, np.interp(targets, ts, values), result)
+
+def align(series, targets, policies=None, default_policy=DEFAULT_POLICY):
+    """Align raw series onto the target timestamps.
+
+    `series` maps names to (ts, values) numpy arrays sorted by ts (unix
+    seconds); `targets` is an array of unix seconds. Returns the names and
+    a (len(targets), len(series)) float array with one column per series.
+    """
+    policies = policies or {}
+    targets = np.asarray(targets, dtype='int64')
+    names = list(series)
+    matrix = np.full((len(targets), len(names)), np.nan)
+    for column, name in enumerate(names):
+        ts, values = series[name]
+        if not len(ts):
+            continue
+        policy = policies.get(name, default_policy)
+        if policy.method == LINEAR:
+            matrix[:, column] = interpolate(ts, values, targets, policy.max_staleness)
+        else:
+            matrix[:, column] = as_of(ts, values, targets, policy.max_staleness)
+    return names, matrix
@@ -0,0 +1,141 @@
+"""Per-host circuit breakers for upstream calls.
+
+A host's breaker opens after `failure_threshold` consecutive failed calls
+(connection errors, timeouts or 5xx after retries). While open, calls to the
+host fail at once with CircuitOpen instead of paying for another timeout.
+After `reset_timeout` seconds the breaker is half-open: up to
+`half_open_probes` calls go through as probes, and the first outcome
+closes the breaker again or re-opens it for another `reset_timeout`.
+
+Memoized service methods whose computation ran into an open breaker answer
+with their last known value (see app/singleflight.py); `rejections()`
+tells them which hosts turned a call away.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from app import metrics
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+_rejections = contextvars.ContextVar('circuit_rejections', default=None)
+
+
+@contextmanager
+def rejections():
+    """Collect the hosts whose open breaker rejected a call made inside the block."""
+    hosts = set()
+    token = _rejections.set(hosts)
+    try:
+        yield hosts
+    finally:
+        _rejections.reset(token)
+
+
+class CircuitOpen(Exception):
+    """The upstream host's breaker is open; the call was not made."""
+
+
+class CircuitBreaker:
+    def __init__(self, host, failure_threshold=5, reset_timeout=60, half_open_probes=1):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = None  # monotonic
+        self._changed_at = time.time()
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        self.state = state
+        self._changed_at = time.time()
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        metrics.circuit_transitions.inc(host=self.host, state=state)
+
+    def _reject(self):
+        self.rejected += 1
+        hosts = _rejections.get()
+        if hosts is not None:
+            hosts.add(self.host)
+        raise CircuitOpen(f"circuit for {self.host} is open")
+
+    def allow(self):
+        """Admit a call or raise CircuitOpen; returns whether the call is a probe."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self._reject()
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    self._reject()
+                self._probes += 1
+                return True
+            return False
+
+    def record(self, ok, probe=False):
+        """Report the outcome of an admitted call."""
+        with self._lock:
+            if probe:
+                self._probes -= 1
+            if ok:
+                self.failures = 0
+                if self.state != CLOSED:
+                    self._transition(CLOSED)
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self._transition(OPEN)
+
+    def release(self, probe=False):
+        """Give back an admitted call that ended without a verdict on the host."""
+        if probe:
+            with self._lock:
+                self._probes -= 1
+
+    def status(self):
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'rejected_calls': self.rejected,
+                'since': self._changed_at,
+                'probe_in': retry_in
+            }
+
+
+class CircuitBreakers:
+    """Circuit breakers by upstream host.
+
+    `defaults` holds the CircuitBreaker settings for every host and
+    `overrides` maps hosts to the settings that differ for them.
+    """
+
+    def __init__(self, defaults=None, overrides=None):
+        self.defaults = defaults or {}
+        self.overrides = overrides or {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, host):
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                settings = {**self.defaults, **self.overrides.get(host, {})}
+                breaker = self._breakers[host] = CircuitBreaker(host, **settings)
+            return breaker
+
+    def status(self):
+        """{host: breaker status} for every host called so far."""
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {host: breaker.status() for host, breaker in sorted(breakers.items())}
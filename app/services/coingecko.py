@@ -1,222 +1,127 @@
-import requests
-from app.config import Config
-from app import cache
-import pandas as pd
+from app.services.http_client import Get, http, run, run_async
+from app.singleflight import singleflight
 
 class CoinGeckoService:
     BASE_URL = "https://api.coingecko.com/api/v3"
+
+    # Protocol tokens tracked in the historical protocol market cap series
+    HISTORICAL_PROTOCOL_IDS = [
+        'uniswap', 'aave', 'chainlink', 'maker',
+        'compound-governance-token', 'curve-dao-token',
+        'synthetix-network-token', 'lido-dao'
+    ]
     
+    # /simple/price query for the monetary base component
+    ETH_MARKET_PARAMS = {
+        "ids": "ethereum",
+        "vs_currencies": "usd",
+        "include_market_cap": "true",
+        "include_24hr_vol": "true",
+        "include_24hr_change": "true"
+    }
+
+    NO_MARKET_DATA = {
+        'market_cap': 0,
+        'price_change_24h': 0,
+        'volume_24h': 0,
+        'current_price': 0
+    }
+
+    # Top Ethereum DeFi protocols
+    PROTOCOL_IDS = {
+        'uniswap': 'uniswap',
+        'aave': 'aave',
+        'chainlink': 'chainlink',
+        'maker': 'maker',
+        'compound': 'compound-governance-token',
+        'curve-dao-token': 'curve-dao-token',
+        'synthetix': 'synthetix-network-token',
+        'lido-dao': 'lido-dao',
+        'arbitrum': 'arbitrum',
+        'optimism': 'optimism'
+    }
+
+    # Batch request all protocols at once
+    PROTOCOL_PARAMS = {
+        "ids": ','.join(PROTOCOL_IDS.values()),
+        "vs_currencies": "usd",
+        "include_market_cap": "true"
+    }
+
     @staticmethod
-    @cache.memoize(timeout=300)
-    def get_eth_market_data():
+    def _parse_market_data(data):
+        data = data['ethereum']
+        return {
+            'market_cap': data['usd_market_cap'],
+            'price_change_24h': data['usd_24h_change'],
+            'volume_24h': data['usd_24h_vol'],
+            'current_price': data['usd']
+        }
+
+    @staticmethod
+    def _parse_protocol_market_caps(data):
+        return sum(
+            data[protocol_id]['usd_market_cap']
+            for protocol_id in CoinGeckoService.PROTOCOL_IDS.values()
+            if protocol_id in data and 'usd_market_cap' in data[protocol_id]
+        )
+
+    @staticmethod
+    def _eth_market_data_steps():
         try:
-            response = requests.get(
-                f"{CoinGeckoService.BASE_URL}/simple/price",
-                params={
-                    "ids": "ethereum",
-                    "vs_currencies": "usd",
-                    "include_market_cap": "true",
-                    "include_24hr_vol": "true",
-                    "include_24hr_change": "true"
-                }
-            )
+            response = yield Get(f"{CoinGeckoService.BASE_URL}/simple/price", CoinGeckoService.ETH_MARKET_PARAMS)
             if response.status_code != 200:
                 raise Exception(f"CoinGecko API returned status code {response.status_code}")
-                
-            data = response.json()['ethereum']
-            return {
-                'market_cap': data['usd_market_cap'],
-                'price_change_24h': data['usd_24h_change'],
-                'volume_24h': data['usd_24h_vol'],
-                'current_price': data['usd']
-            }
+
+            return CoinGeckoService._parse_market_data(response.data)
         except Exception as e:
             print(f"Error fetching ETH market data: {e}")
-            return {
-                'market_cap': 0,
-                'price_change_24h': 0,
-                'volume_24h': 0,
-                'current_price': 0
-            }
+            return dict(CoinGeckoService.NO_MARKET_DATA)
 
     @staticmethod
-    @cache.memoize(timeout=300)
-    def get_protocol_market_caps():
-        # Top Ethereum DeFi protocols
-        protocols = {
-            'uniswap': 'uniswap',
-            'aave': 'aave',
-            'chainlink': 'chainlink',
-            'maker': 'maker',
-            'compound': 'compound-governance-token',
-            'curve-dao-token': 'curve-dao-token',
-            'synthetix': 'synthetix-network-token',
-            'lido-dao': 'lido-dao',
-            'arbitrum': 'arbitrum',
-            'optimism': 'optimism'
-        }
-        
-        try:
-            # Batch request all protocols at once
-            ids = ','.join(protocols.values())
-            response = requests.get(
-                f"{CoinGeckoService.BASE_URL}/simple/price",
-                params={
-                    "ids": ids,
-                    "vs_currencies": "usd",
-                    "include_market_cap": "true"
-                }
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"CoinGecko API returned status code {response.status_code}")
-                
-            data = response.json()
-            total_mcap = sum(
-                data[protocol_id]['usd_market_cap']
-                for protocol_id in protocols.values()
-                if protocol_id in data and 'usd_market_cap' in data[protocol_id]
-            )
-            
-            return total_mcap
-        except Exception as e:
-            print(f"Error fetching protocol market caps: {e}")
-            return 0 
+    @singleflight(timeout=300, should_cache=lambda data: data['market_cap'] > 0, local_copies=1)
+    def get_eth_market_data():
+        return run(CoinGeckoService._eth_market_data_steps())
+
+    @staticmethod
+    @singleflight(timeout=300, shares=get_eth_market_data)
+    async def get_eth_market_data_async():
+        return await run_async(CoinGeckoService._eth_market_data_steps())
 
     @staticmethod
-    @cache.memoize(timeout=3600)  # Cache for 1 hour
-    def get_historical_market_data(start_date, end_date, interval):
+    def _protocol_market_caps_steps():
         try:
-            response = requests.get(
-                f"{CoinGeckoService.BASE_URL}/coins/ethereum/market_chart/range",
-                params={
-                    "vs_currency": "usd",
-                    "from": int(start_date.timestamp()),
-                    "to": int(end_date.timestamp())
-                }
-            )
-            
+            response = yield Get(f"{CoinGeckoService.BASE_URL}/simple/price", CoinGeckoService.PROTOCOL_PARAMS)
             if response.status_code != 200:
                 raise Exception(f"CoinGecko API returned status code {response.status_code}")
-                
-            data = response.json()
-            # Convert to DataFrame and resample to desired interval
-            df = pd.DataFrame(data['market_caps'], columns=['timestamp', 'value'])
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-            df.set_index('timestamp', inplace=True)
-            
-            return df.resample(interval).last()['value']
-            
+
+            return CoinGeckoService._parse_protocol_market_caps(response.data)
         except Exception as e:
-            print(f"Error fetching historical market data: {e}")
-            return pd.Series()
+            print(f"Error fetching protocol market caps: {e}")
+            return 0
 
     @staticmethod
-    @cache.memoize(timeout=3600)
-    def get_historical_protocol_mcaps(start_date, end_date):
-        protocols = {
-            'uniswap': 'uniswap',
-            'aave': 'aave',
-            'chainlink': 'chainlink',
-            'maker': 'maker',
-            'compound': 'compound-governance-token',
-            'curve-dao-token': 'curve-dao-token',
-            'synthetix': 'synthetix-network-token',
-            'lido-dao': 'lido-dao'
-        }
-        
-        try:
-            all_data = pd.DataFrame()
-            
-            for protocol_id in protocols.values():
-                response = requests.get(
-                    f"{CoinGeckoService.BASE_URL}/coins/{protocol_id}/market_chart/range",
-                    params={
-                        "vs_currency": "usd",
-                        "from": int(start_date.timestamp()),
-                        "to": int(end_date.timestamp())
-                    }
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    df = pd.DataFrame(data['market_caps'], columns=['timestamp', protocol_id])
-                    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-                    df.set_index('timestamp', inplace=True)
-                    
-                    if all_data.empty:
-                        all_data = df
-                    else:
-                        all_data = all_data.join(df, how='outer')
-            
-            return all_data.sum(axis=1)
-            
-        except Exception as e:
-            print(f"Error fetching historical protocol market caps: {e}")
-            return pd.Series()
+    @singleflight(timeout=300, should_cache=lambda total: total > 0, local_copies=1)
+    def get_protocol_market_caps():
+        return run(CoinGeckoService._protocol_market_caps_steps())
 
     @staticmethod
-    @cache.memoize(timeout=3600)
-    def get_historical_market_cap(coin_id, start_date, end_date, interval):
-        try:
-            response = requests.get(
-                f"{CoinGeckoService.BASE_URL}/coins/{coin_id}/market_chart/range",
-                params={
-                    "vs_currency": "usd",
-                    "from": int(start_date.timestamp()),
-                    "to": int(end_date.timestamp())
-                }
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"CoinGecko API returned status code {response.status_code}")
-            
-            data = response.json()
-            df = pd.DataFrame(data['market_caps'], columns=['timestamp', 'value'])
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-            df.set_index('timestamp', inplace=True)
-            
-            return df['value'].resample(interval).last()
-            
-        except Exception as e:
-            logger.error(f"Error fetching historical market cap: {e}")
-            return pd.Series()
+    @singleflight(timeout=300, shares=get_protocol_market_caps)
+    async def get_protocol_market_caps_async():
+        return await run_async(CoinGeckoService._protocol_market_caps_steps())
 
     @staticmethod
-    @cache.memoize(timeout=3600)
-    def get_historical_defi_mcap(start_date, end_date, interval):
-        protocols = [
-            'uniswap', 'aave', 'chainlink', 'maker',
-            'compound-governance-token', 'curve-dao-token',
-            'synthetix-network-token', 'lido-dao'
-        ]
-        
-        try:
-            all_data = pd.DataFrame()
-            
-            for protocol in protocols:
-                response = requests.get(
-                    f"{CoinGeckoService.BASE_URL}/coins/{protocol}/market_chart/range",
-                    params={
-                        "vs_currency": "usd",
-                        "from": int(start_date.timestamp()),
-                        "to": int(end_date.timestamp())
-                    }
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    df = pd.DataFrame(data['market_caps'], columns=['timestamp', 'value'])
-                    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-                    df.set_index('timestamp', inplace=True)
-                    
-                    if all_data.empty:
-                        all_data = df
-                    else:
-                        all_data = all_data.add(df, fill_value=0)
-            
-            return all_data['value'].resample(interval).last()
-            
-        except Exception as e:
-            logger.error(f"Error fetching historical DeFi market caps: {e}")
-            return pd.Series()
\ No newline at end of file
+    def fetch_market_chart(coin_id, start_ts, end_ts):
+        """Raw [timestamp (s), market cap] points of a coin between two unix times."""
+        response = http.get(
+            f"{CoinGeckoService.BASE_URL}/coins/{coin_id}/market_chart/range",
+            params={
+                "vs_currency": "usd",
+                "from": int(start_ts),
+                "to": int(end_ts)
+            }
+        )
+        if response.status_code != 200:
+            raise Exception(f"CoinGecko API returned status code {response.status_code}")
+
+        return [(ts / 1000, value) for ts, value in http.json(response)['market_caps'] if value is not None]
@@ -1,6 +1,11 @@
-import requests
-from app import cache
-import pandas as pd
+import asyncio
+from app import metrics
+from app.services.http_client import Get, http, run, run_async
+from app.services.yields import PoolIndex
+from app.singleflight import singleflight
+from app.lazy import lazy_import
+
+np = lazy_import('numpy')
 
 # Category mapping dictionary
 CATEGORY_MAPPING = {
@@ -58,178 +63,230 @@ def map_category(category: str) -> tuple[str, str]:
     )
     return ccaf_category, ccaf_sub_category or ccaf_category
 
+class ProtocolIndex:
+    """Columnar snapshot of the Ethereum protocols in DeFiLlama's /protocols.
+
+    Rows are filtered to Ethereum and non-CEX protocols, sorted by TVL
+    (descending), and carry their CCAF category so top-N, per-category and
+    per-protocol queries are slices or dict lookups.
+    """
+
+    def __init__(self, protocols, etag=None, last_modified=None):
+        eth_protocols = [
+            p for p in protocols
+            if 'Ethereum' in (p.get('chains') or [])
+            and (p.get('category') or '').lower() != 'cex'
+        ]
+        eth_protocols.sort(key=lambda p: float(p.get('tvl') or 0), reverse=True)
+
+        mapped = {}
+        for p in eth_protocols:
+            category = p.get('category') or 'Unknown'
+            if category not in mapped:
+                mapped[category] = map_category(category)
+
+        self.names = [p['name'] for p in eth_protocols]
+        self.tvl = np.array([float(p.get('tvl') or 0) for p in eth_protocols])
+        self.change_1d = np.array([float(p.get('change_1d') or 0) for p in eth_protocols])
+        self.categories = [mapped[p.get('category') or 'Unknown'][0] for p in eth_protocols]
+        self.sub_categories = [mapped[p.get('category') or 'Unknown'][1] for p in eth_protocols]
+        self.etag = etag
+        self.last_modified = last_modified
+
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        self.category_rows = {}
+        for i, category in enumerate(self.categories):
+            self.category_rows.setdefault(category, []).append(i)
+        self.category_totals = {
+            category: float(self.tvl[rows].sum())
+            for category, rows in self.category_rows.items()
+        }
+
+    def __len__(self):
+        return len(self.names)
+
+    def row(self, i):
+        return {
+            'name': self.names[i],
+            'tvl': float(self.tvl[i]),
+            'change_1d': float(self.change_1d[i]),
+            'category': self.categories[i]
+        }
+
+    def top(self, n, category=None):
+        """Top `n` protocols by TVL, optionally within one CCAF category."""
+        rows = self.category_rows.get(category, []) if category else range(len(self))
+        return [self.row(i) for i in rows[:n]]
+
+    def get(self, name):
+        i = self.positions.get(name)
+        return None if i is None else self.row(i)
+
+
 class DefiLlamaService:
     BASE_URL = "https://api.llama.fi"
     
+    # Current TVL with stablecoins excluded
+    TVL_PARAMS = {
+        "excludeStablecoins": "true",
+        "includePrices": "true"
+    }
+
+    STABLECOINS_URL = "https://stablecoins.llama.fi/stablecoins?includePrices=true"
+
     @staticmethod
-    @cache.memoize(timeout=300)
-    def get_eth_tvl():
-        try:
-            # Get current TVL with stablecoins excluded
-            response = requests.get(
-                f"{DefiLlamaService.BASE_URL}/v2/historicalChainTvl/ethereum", 
-                params={
-                    "excludeStablecoins": "true",
-                    "includePrices": "true"
-                }
-            )
-            if response.status_code != 200:
-                raise Exception(f"DeFiLlama API returned status code {response.status_code}")
-            
-            data = response.json()
-            if not data:
-                return 0
-                
-            # Get latest TVL point and 24h ago point
-            latest_tvl = float(data[-1]['tvl'])
-            
-            # Find TVL from 24h ago
-            current_timestamp = data[-1]['date']
-            target_timestamp = current_timestamp - (24 * 3600)  # 24 hours ago
-            
-            # Find the closest point to 24h ago
-            for point in reversed(data[:-1]):  # Exclude latest point
-                if point['date'] <= target_timestamp:
-                    tvl_24h_ago = float(point['tvl'])
-                    # Calculate percentage change
-                    change_24h = ((latest_tvl - tvl_24h_ago) / tvl_24h_ago) * 100
-                    return {
-                        'current': latest_tvl,
-                        'change_24h': change_24h
-                    }
-            
-            return {
-                'current': latest_tvl,
-                'change_24h': 0
-            }
-            
-        except Exception as e:
-            print(f"Error fetching ETH TVL: {e}")
-            return {'current': 0, 'change_24h': 0}
-            
-    @staticmethod
-    @cache.memoize(timeout=300)
-    def get_stablecoin_supply():
-        try:
-            # Get stablecoins data
-            response = requests.get(
-                "https://stablecoins.llama.fi/stablecoins?includePrices=true"
-            )
-            if response.status_code != 200:
-                raise Exception(f"DeFiLlama Stablecoins API returned status code {response.status_code}")
-            
-            data = response.json()
-            
-            # Track individual amounts for distribution and get 24h change
-            distribution = {
+    def _no_stablecoins():
+        return {
+            'total': 0,
+            'change_24h': 0,
+            'distribution': {
                 'USDT': 0,
                 'USDC': 0,
                 'DAI': 0,
                 'Others': 0
             }
-            
-            total_supply = 0
-            total_supply_24h_ago = 0
-            
-            for asset in data['peggedAssets']:
-                symbol = asset['symbol']
-                if 'Ethereum' in asset.get('chainCirculating', {}):
-                    current = asset['chainCirculating']['Ethereum'].get('current', {})
-                    amount = float(current.get('peggedUSD', 0))
-                    amount_24h = float(asset['chainCirculating']['Ethereum'].get('circulatingPrevDay', {}).get('peggedUSD', 0))
-                    
-                    total_supply += amount
-                    total_supply_24h_ago += amount_24h
-                    
-                    if symbol in ['USDT', 'USDC', 'DAI']:
-                        distribution[symbol] = amount
-                    else:
-                        distribution['Others'] += amount
-            
-            # Calculate 24h change percentage
-            change_24h = ((total_supply - total_supply_24h_ago) / total_supply_24h_ago * 100) if total_supply_24h_ago > 0 else 0
-            
-            return {
-                'total': total_supply,
-                'change_24h': change_24h,
-                'distribution': distribution
-            }
-        except Exception as e:
-            print(f"Error fetching stablecoin supply: {e}")
-            return {
-                'total': 0,
-                'change_24h': 0,
-                'distribution': {
-                    'USDT': 0,
-                    'USDC': 0,
-                    'DAI': 0,
-                    'Others': 0
+        }
+
+    @staticmethod
+    def _parse_tvl(data):
+        if not data:
+            return 0
+
+        # Get latest TVL point and 24h ago point
+        latest_tvl = float(data[-1]['tvl'])
+
+        # Find TVL from 24h ago
+        current_timestamp = data[-1]['date']
+        target_timestamp = current_timestamp - (24 * 3600)  # 24 hours ago
+
+        # Find the closest point to 24h ago
+        for point in reversed(data[:-1]):  # Exclude latest point
+            if point['date'] <= target_timestamp:
+                tvl_24h_ago = float(point['tvl'])
+                # Calculate percentage change
+                change_24h = ((latest_tvl - tvl_24h_ago) / tvl_24h_ago) * 100
+                return {
+                    'current': latest_tvl,
+                    'change_24h': change_24h
                 }
-            }
+
+        return {
+            'current': latest_tvl,
+            'change_24h': 0
+        }
+
+    @staticmethod
+    def _parse_stablecoins(data):
+        # Track individual amounts for distribution and get 24h change
+        result = DefiLlamaService._no_stablecoins()
+        distribution = result['distribution']
+
+        total_supply = 0
+        total_supply_24h_ago = 0
+
+        for asset in data['peggedAssets']:
+            symbol = asset['symbol']
+            if 'Ethereum' in asset.get('chainCirculating', {}):
+                current = asset['chainCirculating']['Ethereum'].get('current', {})
+                amount = float(current.get('peggedUSD', 0))
+                amount_24h = float(asset['chainCirculating']['Ethereum'].get('circulatingPrevDay', {}).get('peggedUSD', 0))
+
+                total_supply += amount
+                total_supply_24h_ago += amount_24h
+
+                if symbol in ['USDT', 'USDC', 'DAI']:
+                    distribution[symbol] = amount
+                else:
+                    distribution['Others'] += amount
+
+        # Calculate 24h change percentage
+        result['total'] = total_supply
+        result['change_24h'] = ((total_supply - total_supply_24h_ago) / total_supply_24h_ago * 100) if total_supply_24h_ago > 0 else 0
+        return result
 
     @staticmethod
-    @cache.memoize(timeout=3600)
-    def get_historical_tvl(start_date, end_date):
+    def _eth_tvl_steps():
         try:
-            response = requests.get(
-                f"{DefiLlamaService.BASE_URL}/v2/historicalChainTvl/ethereum"
+            response = yield Get(
+                f"{DefiLlamaService.BASE_URL}/v2/historicalChainTvl/ethereum",
+                DefiLlamaService.TVL_PARAMS
             )
             if response.status_code != 200:
                 raise Exception(f"DeFiLlama API returned status code {response.status_code}")
-            
-            data = response.json()
-            
-            # Convert to DataFrame
-            df = pd.DataFrame(data)
-            df['date'] = pd.to_datetime(df['date'], unit='s')
-            df.set_index('date', inplace=True)
-            
-            # Filter date range and resample
-            mask = (df.index >= start_date) & (df.index <= end_date)
-            return df.loc[mask]['tvl']
-            
+
+            return DefiLlamaService._parse_tvl(response.data)
+
         except Exception as e:
-            print(f"Error fetching historical TVL: {e}")
-            return pd.Series()
+            print(f"Error fetching ETH TVL: {e}")
+            return {'current': 0, 'change_24h': 0}
+
+    @staticmethod
+    @singleflight(timeout=300, should_cache=lambda tvl: tvl['current'] > 0, local_copies=1)
+    def get_eth_tvl():
+        return run(DefiLlamaService._eth_tvl_steps())
+
+    @staticmethod
+    @singleflight(timeout=300, shares=get_eth_tvl)
+    async def get_eth_tvl_async():
+        return await run_async(DefiLlamaService._eth_tvl_steps())
 
     @staticmethod
-    @cache.memoize(timeout=3600)
-    def get_historical_stables(start_date, end_date):
+    def _stablecoin_supply_steps():
         try:
-            response = requests.get(
-                "https://stablecoins.llama.fi/stablecoincharts/Ethereum"
-            )
+            response = yield Get(DefiLlamaService.STABLECOINS_URL)
             if response.status_code != 200:
-                raise Exception(f"DeFiLlama API returned status code {response.status_code}")
-            
-            data = response.json()
-            
-            # Convert to DataFrame
-            df = pd.DataFrame(data)
-            df['date'] = pd.to_datetime(df['date'], unit='s')
-            df.set_index('date', inplace=True)
-            
-            # Extract USDT supply from totalCirculating.peggedUSD
-            df['usdt_supply'] = df['totalCirculating'].apply(lambda x: x['peggedUSD'])
-            
-            # Filter date range
-            mask = (df.index >= start_date) & (df.index <= end_date)
-            return df.loc[mask]['usdt_supply']
-            
+                raise Exception(f"DeFiLlama Stablecoins API returned status code {response.status_code}")
+
+            return DefiLlamaService._parse_stablecoins(response.data)
         except Exception as e:
-            print(f"Error fetching historical stablecoin data: {e}")
-            return pd.Series()
+            print(f"Error fetching stablecoin supply: {e}")
+            return DefiLlamaService._no_stablecoins()
+
+    @staticmethod
+    @singleflight(timeout=300, should_cache=lambda supply: supply['total'] > 0, local_copies=1)
+    def get_stablecoin_supply():
+        return run(DefiLlamaService._stablecoin_supply_steps())
+
+    @staticmethod
+    @singleflight(timeout=300, shares=get_stablecoin_supply)
+    async def get_stablecoin_supply_async():
+        return await run_async(DefiLlamaService._stablecoin_supply_steps())
+
+    @staticmethod
+    def fetch_tvl_history():
+        """Raw [timestamp (s), TVL] daily points for Ethereum."""
+        response = http.get(
+            f"{DefiLlamaService.BASE_URL}/v2/historicalChainTvl/ethereum"
+        )
+        if response.status_code != 200:
+            raise Exception(f"DeFiLlama API returned status code {response.status_code}")
+
+        return [(point['date'], point['tvl']) for point in http.json(response)]
+
+    @staticmethod
+    def fetch_stables_history():
+        """Raw [timestamp (s), stablecoin supply in USD] daily points for Ethereum."""
+        response = http.get(
+            "https://stablecoins.llama.fi/stablecoincharts/Ethereum"
+        )
+        if response.status_code != 200:
+            raise Exception(f"DeFiLlama API returned status code {response.status_code}")
+
+        return [
+            (int(point['date']), point['totalCirculating']['peggedUSD'])
+            for point in http.json(response)
+        ]
 
     @staticmethod
     def get_usdt_supply():
         try:
-            response = requests.get(
+            response = http.get(
                 "https://stablecoins.llama.fi/stablecoin/USDT?chain=Ethereum"
             )
             if response.status_code != 200:
                 raise Exception(f"DeFiLlama API returned status code {response.status_code}")
             
-            data = response.json()
+            data = http.json(response)
             return data['circulating']  # This will give you the current USDT supply on Ethereum
             
         except Exception as e:
@@ -237,86 +294,99 @@ class DefiLlamaService:
             return 0
 
     @staticmethod
-    @cache.memoize(timeout=300)
-    def get_top_protocols():
-        try:
-            response = requests.get(
-                f"{DefiLlamaService.BASE_URL}/protocols"
+    def _conditional_headers(previous):
+        headers = {}
+        if previous is not None and previous.etag:
+            headers['If-None-Match'] = previous.etag
+        if previous is not None and previous.last_modified:
+            headers['If-Modified-Since'] = previous.last_modified
+        return headers
+
+    @staticmethod
+    def _protocol_index(protocols, response):
+        with metrics.timer(metrics.transform_seconds, 'transform', step='protocol_index'):
+            return ProtocolIndex(
+                protocols,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified')
             )
-            if response.status_code != 200:
-                raise Exception(f"DeFiLlama API returned status code {response.status_code}")
-            
-            data = response.json()
-            
-            # Filter for Ethereum protocols and exclude CEX
-            eth_protocols = [p for p in data if 'Ethereum' in p['chains'] and p.get('category', '').lower() != 'cex']
-            eth_protocols.sort(key=lambda x: float(x.get('tvl', 0)), reverse=True)
-            
-            # Return top 10 protocols with relevant data
-            return [{
-                'name': p['name'],
-                'tvl': float(p.get('tvl', 0)),
-                'change_1d': float(p.get('change_1d', 0)),
-                'category': map_category(p.get('category', 'Unknown'))[0]  # Use main category
-            } for p in eth_protocols[:10]]
-            
-        except Exception as e:
-            print(f"Error fetching top protocols: {e}")
-            return []
 
     @staticmethod
-    @cache.memoize(timeout=300)
-    def get_category_distribution():
+    def _protocol_index_steps(previous):
         try:
-            response = requests.get(
-                f"{DefiLlamaService.BASE_URL}/protocols"
+            response = yield Get(
+                f"{DefiLlamaService.BASE_URL}/protocols",
+                headers=DefiLlamaService._conditional_headers(previous)
             )
+            if response.status_code == 304 and previous is not None:
+                return previous
             if response.status_code != 200:
                 raise Exception(f"DeFiLlama API returned status code {response.status_code}")
-            
-            data = response.json()
-            
-            # Filter for Ethereum protocols and exclude CEX
-            eth_protocols = [p for p in data if 'Ethereum' in p['chains'] and p.get('category', '').lower() != 'cex']
-            
-            # Calculate TVL by mapped category
-            categories = {}
-            for protocol in eth_protocols:
-                original_category = protocol.get('category', 'Unknown')
-                mapped_category = map_category(original_category)[0]  # Use main category
-                tvl = float(protocol.get('tvl', 0))
-                categories[mapped_category] = categories.get(mapped_category, 0) + tvl
-            
-            return categories
-            
+
+            return DefiLlamaService._protocol_index(response.data, response)
+
         except Exception as e:
-            print(f"Error fetching category distribution: {e}")
-            return {}
+            print(f"Error fetching protocol index: {e}")
+            # Not cached: the previous entry stays, with its own computed_at
+            return None
+
+    @staticmethod
+    @singleflight(timeout=300, should_cache=lambda index: index is not None, local_copies=1)
+    def get_protocol_index():
+        """Download /protocols once and index the Ethereum (non-CEX) rows.
+
+        The previous index is sent back as a conditional request so an
+        unchanged payload is neither downloaded nor parsed again. A failed
+        download returns None, which is not cached, so the previous entry
+        keeps being served (stale, or degraded behind an open circuit) with
+        the time it was actually computed.
+        """
+        previous = DefiLlamaService.get_protocol_index.peek()
+        return run(DefiLlamaService._protocol_index_steps(previous))
+
+    @staticmethod
+    @singleflight(timeout=300, shares=get_protocol_index)
+    async def get_protocol_index_async():
+        previous = await asyncio.to_thread(DefiLlamaService.get_protocol_index.peek)
+        return await run_async(DefiLlamaService._protocol_index_steps(previous))
+
+    @staticmethod
+    def _ethereum_pool(pool):
+        """The indexed fields of an Ethereum pool; None for pools on other chains."""
+        if pool.get('chain') != 'Ethereum':
+            return None
+        return {field: pool.get(field) for field in PoolIndex.FIELDS}
 
     @staticmethod
-    @cache.memoize(timeout=300)
-    def get_top_yields():
+    def _yield_index_steps():
         try:
-            response = requests.get(
-                "https://yields.llama.fi/pools"
+            # Streamed: only the indexed fields of the Ethereum pools are kept
+            response = yield Get(
+                "https://yields.llama.fi/pools",
+                items='data',
+                select=DefiLlamaService._ethereum_pool
             )
             if response.status_code != 200:
                 raise Exception(f"DeFiLlama API returned status code {response.status_code}")
-            
-            data = response.json()
-            
-            # Filter for Ethereum pools and sort by APY
-            eth_pools = [p for p in data['data'] if p['chain'] == 'Ethereum']
-            eth_pools.sort(key=lambda x: float(x.get('apy', 0)), reverse=True)
-            
-            # Return top 10 yield opportunities
-            return [{
-                'pool': p['symbol'],
-                'protocol': p['project'],
-                'apy': float(p.get('apy', 0)),
-                'tvl': float(p.get('tvlUsd', 0))
-            } for p in eth_pools[:10]]
-            
+
+            with metrics.timer(metrics.transform_seconds, 'transform', step='yield_index'):
+                return PoolIndex(response.data)
+
         except Exception as e:
             print(f"Error fetching yield data: {e}")
-            return []
\ No newline at end of file
+            return None
+
+    @staticmethod
+    @singleflight(timeout=300, should_cache=lambda index: index is not None, local_copies=1)
+    def get_yield_index():
+        """Stream yields.llama.fi/pools into a PoolIndex of the Ethereum pools.
+
+        A failed download returns None, which is not cached, so the previous
+        index keeps being served with the time it was computed.
+        """
+        return run(DefiLlamaService._yield_index_steps())
+
+    @staticmethod
+    @singleflight(timeout=300, shares=get_yield_index)
+    async def get_yield_index_async():
+        return await run_async(DefiLlamaService._yield_index_steps())
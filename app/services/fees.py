@@ -1,110 +1,129 @@
-import requests
-from app import cache
+from app.config import Config
+from app.services.hedging import HedgedSources
+from app.services.http_client import Get, Reply, http, run, run_async
+from app.singleflight import singleflight
 from datetime import datetime, timedelta
-import pandas as pd
 
 class FeesService:
+    FALLBACK_URL = "https://api.llama.fi/overview/fees/ethereum"
+
+    @staticmethod
+    def _cryptostats_url(day):
+        return f'https://api.cryptostats.community/api/v1/fees/oneDayTotalFees/{day:%Y-%m-%d}'
+
+    @staticmethod
+    def _ethereum_fees(data):
+        """Ethereum's daily fees in a CryptoStats oneDayTotalFees response."""
+        return float(next(
+            (item['value'] for item in data
+             if item.get('metadata', {}).get('name', '').lower() == 'ethereum'),
+            0
+        ))
+
+    @staticmethod
+    def _revenue(daily_fees, previous_daily_fees):
+        """Annualized fees and their 24h change (%)."""
+        if previous_daily_fees > 0:
+            change_24h = ((daily_fees - previous_daily_fees) / previous_daily_fees) * 100
+        else:
+            change_24h = 0
+        return {
+            'current': daily_fees * 365,
+            'change_24h': change_24h
+        }
+
+    @staticmethod
+    def _parse_fallback(data):
+        return FeesService._revenue(float(data.get('total24h', 0)), float(data.get('total48to24', 0)))
+
+    @staticmethod
+    def _cryptostats_revenue_steps():
+        # Yesterday's fees are fetched for the 24h change
+        response, yesterday_response = yield [
+            Get(FeesService._cryptostats_url(datetime.now())),
+            Get(FeesService._cryptostats_url(datetime.now() - timedelta(days=1)))
+        ]
+        if isinstance(response, Exception):
+            raise response
+        if response.status_code != 200:
+            raise Exception(f"CryptoStats API returned status code {response.status_code}")
+
+        eth_fees = FeesService._ethereum_fees(response.data)
+        if isinstance(yesterday_response, Reply) and yesterday_response.status_code == 200:
+            return FeesService._revenue(eth_fees, FeesService._ethereum_fees(yesterday_response.data))
+
+        # Without yesterday's fees there is no 24h change, not no revenue
+        return FeesService._revenue(eth_fees, 0)
+
+    @staticmethod
+    def fetch_cryptostats_revenue():
+        return run(FeesService._cryptostats_revenue_steps())
+
     @staticmethod
-    @cache.memoize(timeout=300)
+    async def fetch_cryptostats_revenue_async():
+        return await run_async(FeesService._cryptostats_revenue_steps())
+
+    @staticmethod
+    def _defillama_revenue_steps():
+        response = yield Get(FeesService.FALLBACK_URL)
+        if response.status_code != 200:
+            raise Exception(f"DeFiLlama API returned status code {response.status_code}")
+        return FeesService._parse_fallback(response.data)
+
+    @staticmethod
+    def fetch_defillama_revenue():
+        return run(FeesService._defillama_revenue_steps())
+
+    @staticmethod
+    async def fetch_defillama_revenue_async():
+        return await run_async(FeesService._defillama_revenue_steps())
+
+    @staticmethod
+    @singleflight(timeout=300, should_cache=lambda revenue: revenue['current'] > 0, local_copies=1)
     def get_eth_protocol_revenue():
         try:
-            # Using CryptoStats API for protocol fees
-            today = datetime.now().strftime('%Y-%m-%d')
-            url = f'https://api.cryptostats.community/api/v1/fees/oneDayTotalFees/{today}'
-            
-            response = requests.get(url)
-            if response.status_code != 200:
-                raise Exception(f"CryptoStats API returned status code {response.status_code}")
-                
-            data = response.json()
-            
-            # Find Ethereum's fees
-            eth_fees = next(
-                (item['value'] for item in data 
-                 if item.get('metadata', {}).get('name', '').lower() == 'ethereum'),
-                0
-            )
-            
-            # Convert to annual fees
-            annual_fees = float(eth_fees) * 365
-            
-            # Get yesterday's fees for 24h change calculation
-            yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-            yesterday_url = f'https://api.cryptostats.community/api/v1/fees/oneDayTotalFees/{yesterday}'
-            yesterday_response = requests.get(yesterday_url)
-            
-            if yesterday_response.status_code == 200:
-                yesterday_data = yesterday_response.json()
-                yesterday_fees = next(
-                    (item['value'] for item in yesterday_data 
-                     if item.get('metadata', {}).get('name', '').lower() == 'ethereum'),
-                    0
-                )
-                
-                # Calculate 24h change
-                if yesterday_fees > 0:
-                    change_24h = ((float(eth_fees) - float(yesterday_fees)) / float(yesterday_fees)) * 100
-                else:
-                    change_24h = 0
-                    
-                return {
-                    'current': annual_fees,
-                    'change_24h': change_24h
-                }
-            
-            return {
-                'current': annual_fees,
-                'change_24h': 0
-            }
-
+            # CryptoStats and DeFiLlama raced, see revenue_sources
+            return revenue_sources.fetch()
         except Exception as e:
             print(f"Error fetching protocol revenue: {e}")
-            
-            # Fallback to DeFiLlama fees API
-            try:
-                response = requests.get("https://api.llama.fi/overview/fees/ethereum")
-                if response.status_code == 200:
-                    data = response.json()
-                    daily_fees = float(data.get('total24h', 0))
-                    yesterday_fees = float(data.get('total48to24', 0))
-                    
-                    # Calculate 24h change using DeFiLlama data
-                    if yesterday_fees > 0:
-                        change_24h = ((daily_fees - yesterday_fees) / yesterday_fees) * 100
-                    else:
-                        change_24h = 0
-                        
-                    return {
-                        'current': daily_fees * 365,
-                        'change_24h': change_24h
-                    }
-            except Exception as e:
-                print(f"Error fetching backup fee data: {e}")
-                
             return {'current': 0, 'change_24h': 0}
 
     @staticmethod
-    @cache.memoize(timeout=3600)
-    def get_historical_fees(start_date, end_date):
+    @singleflight(timeout=300, shares=get_eth_protocol_revenue)
+    async def get_eth_protocol_revenue_async():
         try:
-            response = requests.get(
-                "https://api.llama.fi/summary/fees/ethereum"
-            )
-            if response.status_code != 200:
-                raise Exception(f"DeFiLlama API returned status code {response.status_code}")
-            
-            data = response.json()
-            
-            # Convert to DataFrame
-            df = pd.DataFrame(data['totalDataChart'])
-            df.columns = ['date', 'fees']
-            df['date'] = pd.to_datetime(df['date'], unit='s')
-            df.set_index('date', inplace=True)
-            
-            # Filter date range and annualize fees
-            mask = (df.index >= start_date) & (df.index <= end_date)
-            return df.loc[mask]['fees'] * 365
-            
+            return await revenue_sources.fetch_async()
         except Exception as e:
-            print(f"Error fetching historical fee data: {e}")
-            return pd.Series() 
\ No newline at end of file
+            print(f"Error fetching protocol revenue: {e}")
+            return {'current': 0, 'change_24h': 0}
+
+    @staticmethod
+    def fetch_fees_history():
+        """Raw [timestamp (s), annualized fees] daily points for Ethereum."""
+        response = http.get(
+            "https://api.llama.fi/summary/fees/ethereum"
+        )
+        if response.status_code != 200:
+            raise Exception(f"DeFiLlama API returned status code {response.status_code}")
+
+        return [(ts, fees * 365) for ts, fees in http.json(response)['totalDataChart']]
+
+
+# CryptoStats first; DeFiLlama is raced against it once CryptoStats is
+# slower than usual, and leads instead when it has been faster or more reliable
+revenue_sources = HedgedSources(
+    'protocol_revenue',
+    {
+        'cryptostats': FeesService.fetch_cryptostats_revenue,
+        'defillama': FeesService.fetch_defillama_revenue
+    },
+    async_sources={
+        'cryptostats': FeesService.fetch_cryptostats_revenue_async,
+        'defillama': FeesService.fetch_defillama_revenue_async
+    },
+    is_valid=lambda revenue: revenue['current'] > 0,
+    percentile=Config.HEDGE_PERCENTILE,
+    default_delay=Config.HEDGE_DEFAULT_DELAY,
+    max_delay=Config.HEDGE_MAX_DELAY,
+    max_age=Config.HEDGE_STATS_MAX_AGE
+)
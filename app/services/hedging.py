@@ -0,0 +1,233 @@
+"""Race alternative upstream sources for the same value.
+
+A HedgedSources tries its sources one at a time, fastest-and-most-reliable
+first. When the running source is slower than its usual latency (a
+percentile of its recent successful calls) or fails, the next one is
+launched alongside it, and the first valid answer wins. Losers keep
+running in the background so their latency and errors are still recorded.
+Stats only cover the last few minutes, so a source that was demoted gets
+tried first again once its bad samples have aged out.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from app import metrics
+
+
+class SourcesFailed(Exception):
+    """Every source failed or returned an invalid value."""
+
+
+class SourceStats:
+    """Recent (time, latency, ok) outcomes of one source."""
+
+    def __init__(self, window=100, max_age=600):
+        self.max_age = max_age
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self._samples.append((time.monotonic(), latency, ok))
+
+    def _recent(self):
+        cutoff = time.monotonic() - self.max_age
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            return list(self._samples)
+
+    def summary(self, percentile):
+        """{'calls', 'error_rate', 'p50', 'hedge_after'} over the recent samples."""
+        samples = self._recent()
+        latencies = sorted(latency for _, latency, ok in samples if ok)
+
+        def pick(q):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+        errors = sum(1 for _, _, ok in samples if not ok)
+        return {
+            'calls': len(samples),
+            'error_rate': errors / len(samples) if samples else 0.0,
+            'p50': pick(0.5),
+            'hedge_after': pick(percentile)
+        }
+
+
+class HedgedSources:
+    """The value of `name` from the first of several interchangeable sources to answer.
+
+    `sources` maps source names to functions returning the value, in the
+    preferred order, and `async_sources` to their coroutine variants. A
+    result `is_valid` rejects counts as a failure. The next source is
+    launched once the running one passes the `percentile` of its recent
+    latencies (clamped to `min_delay`..`max_delay`, `default_delay` before
+    it has any), or as soon as it fails.
+    """
+
+    def __init__(self, name, sources, async_sources=None, is_valid=None, percentile=0.9,
+                 default_delay=1.0, min_delay=0.05, max_delay=5.0, window=100, max_age=600):
+        self.name = name
+        self.sources = sources
+        self.async_sources = async_sources or {}
+        self.is_valid = is_valid
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.stats = {source: SourceStats(window, max_age) for source in sources}
+        self._executor = ThreadPoolExecutor(
+            max_workers=2 * len(sources),
+            thread_name_prefix=f"{name}-source"
+        )
+
+    def order(self):
+        """Source names, best first.
+
+        Sources are ranked by median latency divided by their success rate,
+        roughly the expected time to a valid answer. One without recent
+        calls is assumed to take `default_delay`, one without recent
+        successes goes last, and ties keep the configured order.
+        """
+        def score(item):
+            position, source = item
+            summary = self.stats[source].summary(self.percentile)
+            if summary['calls'] == 0:
+                return (0, self.default_delay, position)
+            if summary['p50'] is None:
+                return (1, 0, position)
+            return (0, summary['p50'] / max(1 - summary['error_rate'], 0.05), position)
+
+        return [source for _, source in sorted(enumerate(self.sources), key=score)]
+
+    def hedge_delay(self, source):
+        """Seconds to give `source` before launching the next one."""
+        hedge_after = self.stats[source].summary(self.percentile)['hedge_after']
+        if hedge_after is None:
+            return self.default_delay
+        return min(self.max_delay, max(self.min_delay, hedge_after))
+
+    def status(self):
+        """Per-source stats, in the order sources are tried."""
+        return {source: self.stats[source].summary(self.percentile) for source in self.order()}
+
+    def _check(self, value):
+        if self.is_valid is not None and not self.is_valid(value):
+            raise ValueError("invalid response")
+        return value
+
+    def _record(self, source, started, ok):
+        latency = time.monotonic() - started
+        self.stats[source].record(latency, ok)
+        metrics.source_seconds.observe(
+            latency, name=self.name, source=source, outcome='ok' if ok else 'error'
+        )
+
+    def _call(self, source):
+        started = time.monotonic()
+        try:
+            value = self._check(self.sources[source]())
+        except Exception:
+            self._record(source, started, ok=False)
+            raise
+        self._record(source, started, ok=True)
+        return value
+
+    async def _call_async(self, source):
+        started = time.monotonic()
+        try:
+            value = self._check(await self.async_sources[source]())
+        except Exception:
+            self._record(source, started, ok=False)
+            raise
+        self._record(source, started, ok=True)
+        return value
+
+    def _hedged(self, source, reason):
+        metrics.source_hedges.inc(name=self.name, source=source, reason=reason)
+
+    def _won(self, source):
+        metrics.source_wins.inc(name=self.name, source=source)
+
+    def fetch(self):
+        """The first valid value; SourcesFailed if every source fails."""
+        queue = self.order()
+        context = contextvars.copy_context()
+        pending, errors = {}, []
+        launched = [None, None]  # latest source and when it started
+
+        def launch():
+            source = queue.pop(0)
+            # Each source runs in a copy of the caller's context (upstream priority)
+            pending[self._executor.submit(context.copy().run, self._call, source)] = source
+            launched[:] = [source, time.monotonic()]
+
+        launch()
+        while pending:
+            timeout = None
+            if queue:
+                source, started = launched
+                timeout = max(0, started + self.hedge_delay(source) - time.monotonic())
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Slower than usual: race the next source against it
+                self._hedged(queue[0], 'slow')
+                launch()
+                continue
+            for future in done:
+                source = pending.pop(future)
+                try:
+                    value = future.result()
+                except Exception as e:
+                    errors.append(f"{source}: {e}")
+                    continue
+                self._won(source)
+                return value
+            if queue:
+                self._hedged(queue[0], 'failed')
+                launch()
+        raise SourcesFailed(f"{self.name}: every source failed ({'; '.join(errors)})")
+
+    async def fetch_async(self):
+        """`fetch` on the event loop, racing the `async_sources` as tasks."""
+        queue = [source for source in self.order() if source in self.async_sources]
+        pending, errors = {}, []
+        launched = [None, None]
+
+        def launch():
+            source = queue.pop(0)
+            task = asyncio.ensure_future(self._call_async(source))
+            # Losers finish in the background; their errors are already recorded
+            task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            pending[task] = source
+            launched[:] = [source, time.monotonic()]
+
+        launch()
+        while pending:
+            timeout = None
+            if queue:
+                source, started = launched
+                timeout = max(0, started + self.hedge_delay(source) - time.monotonic())
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                self._hedged(queue[0], 'slow')
+                launch()
+                continue
+            for task in done:
+                source = pending.pop(task)
+                try:
+                    value = task.result()
+                except Exception as e:
+                    errors.append(f"{source}: {e}")
+                    continue
+                self._won(source)
+                return value
+            if queue:
+                self._hedged(queue[0], 'failed')
+                launch()
+        raise SourcesFailed(f"{self.name}: every source failed ({'; '.join(errors)})")
@@ -0,0 +1,168 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app import cache
+from app.config import Config
+from app.lazy import Deferred
+from app.timeseries import TimeSeriesStore
+from app.services.alignment import FFILL, LINEAR, Policy
+from app.services.rate_limit import BACKFILL, priority
+from app.services.rollups import RollupLayer
+from app.services.coingecko import CoinGeckoService
+from app.services.defillama import DefiLlamaService
+from app.services.fees import FeesService
+from app.services.nft import NFTService
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 3600
+
+class CoinSource:
+    """Market cap history of one CoinGecko coin, fetched by time range."""
+
+    refresh_interval = Config.COIN_HISTORY_REFRESH
+
+    def __init__(self, coin_id):
+        self.coin_id = coin_id
+
+    def fetch(self, since):
+        now = time.time()
+        if since is None:
+            # CoinGecko serves daily points for ranges over 90 days and hourly
+            # points below that, so backfill the two parts separately
+            hourly_from = now - 90 * DAY
+            return (
+                CoinGeckoService.fetch_market_chart(
+                    self.coin_id, now - Config.HISTORY_BACKFILL_DAYS * DAY, hourly_from
+                )
+                + CoinGeckoService.fetch_market_chart(self.coin_id, hourly_from, now)
+            )
+        return CoinGeckoService.fetch_market_chart(self.coin_id, since + 1, now)
+
+
+class FullHistorySource:
+    """Daily series that the upstream only serves as one full download.
+
+    The download is skipped until `refresh_interval` has passed; after that
+    only points at or after the last stored one are written, so today's
+    still-moving daily point gets overwritten.
+    """
+
+    refresh_interval = 3600
+
+    def __init__(self, fetch):
+        self._fetch = fetch
+
+    def fetch(self, since):
+        points = self._fetch()
+        if since is None:
+            return points
+        return [(ts, value) for ts, value in points if ts >= since]
+
+
+class HistoryService:
+    """Keep every GDP component's history in a local TimeSeriesStore.
+
+    `sync` backfills empty series once and then extends them with newer
+    points only, up to `workers` series in parallel (the rate limiter still
+    paces calls per host); it runs from the scheduler, or without one from
+    `sync_in_background` (and inline while `missing` series leave the
+    store incomplete). `load` answers window queries with local range scans.
+    `components` lists the stored series summed into each GDP component and
+    `policies` how each series is aligned onto a time grid.
+    """
+
+    def __init__(self, store, sources, components, policies=None, workers=4):
+        self.store = store
+        self.sources = sources
+        self.components = components
+        self.policies = policies or {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='history-sync')
+        self._syncing = None
+        self._lock = threading.Lock()
+
+    def sync_in_background(self):
+        """Start `sync` on a daemon thread unless one is already running in this process."""
+        with self._lock:
+            if self._syncing is not None and self._syncing.is_alive():
+                return False
+            self._syncing = threading.Thread(target=self.sync, name='history-sync', daemon=True)
+            self._syncing.start()
+            return True
+
+    def missing(self):
+        """Series that have never been synced, so the charts would have gaps."""
+        synced = self.store.synced()
+        return [name for name in self.sources if name not in synced]
+
+    def sync(self, force=False):
+        """Extend every series due for a refresh (all of them with `force`)."""
+        synced = self.store.synced()
+        due = []
+        for name, source in self.sources.items():
+            synced_at = synced.get(name)
+            if force or not synced_at or time.time() - synced_at >= source.refresh_interval:
+                due.append(name)
+        futures = [
+            self._executor.submit(contextvars.copy_context().run, self._sync_series, name)
+            for name in due
+        ]
+        for future in futures:
+            future.result()
+
+    def _sync_series(self, name):
+        # Only one worker syncs a series at a time
+        lock_key = f"history-sync:{name}"
+        if not cache.add(lock_key, 1, timeout=300):
+            return
+        try:
+            # Backfills queue behind live requests for the same upstream
+            with priority(BACKFILL):
+                points = self.sources[name].fetch(self.store.last_timestamp(name))
+            self.store.append(name, points)
+        except Exception as e:
+            logger.error(f"Error syncing history for {name}: {e}")
+        finally:
+            cache.delete(lock_key)
+
+    def load(self, start, end):
+        """Raw (ts, values) arrays of every stored series between two unix timestamps."""
+        return {name: self.store.arrays(name, start, end) for name in self.sources}
+
+
+# Built on first use: opening the store touches disk, and most requests
+# (and serverless invocations) never read history
+history = Deferred(lambda: HistoryService(
+    TimeSeriesStore(Config.HISTORY_DB_PATH),
+    {
+        'coin:ethereum': CoinSource('ethereum'),
+        **{
+            f"coin:{coin_id}": CoinSource(coin_id)
+            for coin_id in CoinGeckoService.HISTORICAL_PROTOCOL_IDS
+        },
+        'tvl': FullHistorySource(DefiLlamaService.fetch_tvl_history),
+        'fees': FullHistorySource(FeesService.fetch_fees_history),
+        'stablecoins': FullHistorySource(DefiLlamaService.fetch_stables_history),
+        'cultural': FullHistorySource(NFTService.fetch_nft_history)
+    },
+    {
+        'monetary_base': ['coin:ethereum'],
+        'tvl': ['tvl'],
+        'fees': ['fees'],
+        'stablecoins': ['stablecoins'],
+        'protocols': [f"coin:{coin_id}" for coin_id in CoinGeckoService.HISTORICAL_PROTOCOL_IDS],
+        'cultural': ['cultural']
+    },
+    # Daily stocks are interpolated between snapshots; fees are a daily flow
+    # and the token market caps are dense enough to step
+    {
+        'tvl': Policy(LINEAR, 2 * DAY),
+        'stablecoins': Policy(LINEAR, 2 * DAY),
+        'cultural': Policy(LINEAR, 2 * DAY),
+        'fees': Policy(FFILL, 2 * DAY)
+    },
+    workers=Config.HISTORY_SYNC_WORKERS
+), 'history')
+rollups = Deferred(lambda: RollupLayer(history.resolve()), 'rollups')
@@ -0,0 +1,400 @@
+import asyncio
+import logging
+import random
+import time
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from app import metrics
+from app.config import Config
+from app.lazy import Deferred, lazy_import
+from app.services.circuit_breaker import CircuitBreakers
+from app.services.rate_limit import LIVE, RateLimiter
+from app.services.json_stream import aiter_json_array, iter_json_array
+
+# Imported with the first upstream call; only the ASGI app needs httpx
+requests = lazy_import('requests')
+httpx = lazy_import('httpx', optional=True)
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+DEFAULT_HEADERS = {
+    'Accept-Encoding': 'gzip, deflate',
+    'Accept': 'application/json'
+}
+
+# A GET described by a service, for `run` and `run_async`. With `items` the
+# body is streamed and only the array under that key of the JSON object is
+# decoded, keeping select(item) for each item (None drops it)
+Get = namedtuple('Get', ['url', 'params', 'headers', 'items', 'select'], defaults=(None, None, None, None))
+# What the service is sent back: the parsed body (or kept items) of a 200
+Reply = namedtuple('Reply', ['status_code', 'headers', 'data'])
+
+def _kept(items, select):
+    if select is None:
+        return list(items)
+    return [item for item in map(select, items) if item is not None]
+
+class _UpstreamClient:
+    """Retry policy, URL rewriting, rate limiting, circuit breaking and metrics shared by both clients."""
+
+    def __init__(self, connect_timeout, read_timeout, retries=2, backoff=0.5,
+                 max_backoff=8, pool_maxsize=10, upstream_override=None, limiter=None,
+                 breakers=None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.upstream_override = upstream_override.rstrip('/') if upstream_override else None
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_maxsize = pool_maxsize
+        self.limiter = limiter or RateLimiter({})
+        # Without settings a breaker opens after 5 failed calls in a row
+        self.breakers = breakers or CircuitBreakers()
+
+    def _target(self, url):
+        """The URL to request and the upstream host it stands for."""
+        parsed = urlparse(url)
+        host = parsed.netloc
+        if self.upstream_override:
+            # Send everything to one stub server, e.g. for offline benchmarks
+            url = f"{self.upstream_override}/{host}{parsed.path}"
+            if parsed.query:
+                url += f"?{parsed.query}"
+        return url, host
+
+    def _healthy(self, response):
+        """Whether a final response counts as a success for the host's breaker."""
+        return response.status_code < 500
+
+    def _received(self, response, host, seconds, stream, attempt):
+        """Record a response; return the delay before retrying it, or None to return it."""
+        response.upstream_host = host
+        self._record(
+            host,
+            seconds,
+            size=0 if stream else len(response.content),
+            error=response.status_code >= 400
+        )
+        delay = self._retry_after(response) if response.status_code in RETRY_STATUSES else None
+        if delay is not None:
+            # Hold back every call to the host, not just this retry
+            self.limiter.pause(host, delay)
+        if response.status_code in RETRY_STATUSES and attempt < self.retries:
+            logger.warning(f"Retrying {host} after status {response.status_code}")
+            # The rate limiter waits out a Retry-After pause before the retry
+            return self._backoff(attempt) if delay is None else 0
+        return None
+
+    def json(self, response):
+        """Parse a response body as JSON, timing the parse."""
+        with metrics.timer(metrics.json_parse_seconds, 'json', host=response.upstream_host):
+            return response.json()
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _retry_after(self, response):
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return min(Config.UPSTREAM_MAX_PAUSE, max(0, float(value)))
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time.time()
+                return min(Config.UPSTREAM_MAX_PAUSE, max(0, delay))
+            except (TypeError, ValueError):
+                return None
+
+    def _record(self, host, seconds, size=0, error=False):
+        metrics.upstream_seconds.observe(seconds, host=host)
+        metrics.record_timing('upstream', seconds)
+        metrics.upstream_bytes.inc(size, host=host)
+        if error:
+            metrics.upstream_errors.inc(host=host)
+
+
+class HttpClient(_UpstreamClient):
+    """Keep-alive HTTP client shared by every upstream service.
+
+    One session holds a connection pool per upstream host, every call has
+    explicit connect/read timeouts, and 429/5xx responses or connection
+    errors are retried with jittered exponential backoff. Calls are paced
+    per host by the rate limiter, which also honors Retry-After. Latency,
+    bytes, errors, retries and JSON parse time are recorded per host in
+    app.metrics. The session is created on first use.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeout = (self.connect_timeout, self.read_timeout)
+        self.session = Deferred(self._new_session, 'requests.Session')
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=0
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update(DEFAULT_HEADERS)
+        return session
+
+    def get(self, url, params=None, headers=None, timeout=None, stream=False):
+        """GET `url` with retries; with `stream=True` read the body via `iter_content`.
+
+        Raises CircuitOpen without calling the host while its breaker is open.
+        """
+        url, host = self._target(url)
+        breaker = self.breakers.breaker(host)
+        probe = breaker.allow()
+        try:
+            response = self._get(url, host, params, headers, timeout, stream)
+        except (requests.ConnectionError, requests.Timeout):
+            breaker.record(False, probe)
+            raise
+        except BaseException:
+            # e.g. RateLimited: the host was not reached
+            breaker.release(probe)
+            raise
+        breaker.record(self._healthy(response), probe)
+        return response
+
+    def _get(self, url, host, params, headers, timeout, stream):
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire(host)
+            started = time.perf_counter()
+            try:
+                response = self.session.get(
+                    url,
+                    params=params,
+                    headers=headers,
+                    timeout=timeout or self.timeout,
+                    stream=stream
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(host, time.perf_counter() - started, error=True)
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Retrying {host} after {type(e).__name__}")
+                self._sleep(host, self._backoff(attempt))
+                continue
+
+            delay = self._received(response, host, time.perf_counter() - started, stream, attempt)
+            if delay is None:
+                return response
+            response.close()
+            self._sleep(host, delay)
+
+    def fetch(self, request):
+        """Perform a Get and return its Reply."""
+        stream = request.items is not None
+        with self.get(request.url, params=request.params, headers=request.headers, stream=stream) as response:
+            if response.status_code != 200:
+                data = None
+            elif stream:
+                data = _kept(iter_json_array(self.iter_content(response), request.items), request.select)
+            else:
+                data = self.json(response)
+            return Reply(response.status_code, response.headers, data)
+
+    def iter_content(self, response, chunk_size=64 * 1024):
+        """Iterate over the body of a streamed response, counting its bytes."""
+        for chunk in response.iter_content(chunk_size):
+            metrics.upstream_bytes.inc(len(chunk), host=response.upstream_host)
+            yield chunk
+
+    def _sleep(self, host, seconds):
+        metrics.upstream_retries.inc(host=host)
+        time.sleep(seconds)
+
+
+class AsyncHttpClient(_UpstreamClient):
+    """asyncio twin of HttpClient on one shared httpx.AsyncClient.
+
+    Used by the async service variants behind app/asgi.py; timeouts,
+    retries, rate limiting, URL rewriting and metrics behave as in
+    HttpClient (both clients share the per-host token buckets). The
+    httpx client is created on first use, inside the serving event loop.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._client = None
+
+    @property
+    def client(self):
+        if httpx is None:
+            raise RuntimeError("no httpx module found")
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                # One event loop serves every request, so allow far more
+                # keep-alive connections than a sync worker's pool
+                limits=httpx.Limits(max_keepalive_connections=self.pool_maxsize * 10),
+                headers=DEFAULT_HEADERS,
+                follow_redirects=True
+            )
+        return self._client
+
+    async def get(self, url, params=None, headers=None, timeout=None, stream=False):
+        """GET `url` with retries; with `stream=True` read the body via `iter_content`.
+
+        Raises CircuitOpen without calling the host while its breaker is open.
+        """
+        if httpx is None:
+            # Before the except clauses below, which need httpx
+            raise RuntimeError("no httpx module found")
+        url, host = self._target(url)
+        breaker = self.breakers.breaker(host)
+        probe = breaker.allow()
+        try:
+            response = await self._get(url, host, params, headers, timeout, stream)
+        except httpx.TransportError:
+            breaker.record(False, probe)
+            raise
+        except BaseException:
+            breaker.release(probe)
+            raise
+        breaker.record(self._healthy(response), probe)
+        return response
+
+    async def _get(self, url, host, params, headers, timeout, stream):
+        for attempt in range(self.retries + 1):
+            await self.limiter.acquire_async(host)
+            started = time.perf_counter()
+            try:
+                request = self.client.build_request(
+                    'GET', url, params=params, headers=headers,
+                    timeout=timeout or self.client.timeout
+                )
+                response = await self.client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                self._record(host, time.perf_counter() - started, error=True)
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Retrying {host} after {type(e).__name__}")
+                await self._sleep(host, self._backoff(attempt))
+                continue
+
+            delay = self._received(response, host, time.perf_counter() - started, stream, attempt)
+            if delay is None:
+                return response
+            await response.aclose()
+            await self._sleep(host, delay)
+
+    async def fetch(self, request):
+        """Perform a Get and return its Reply."""
+        stream = request.items is not None
+        response = await self.get(request.url, params=request.params, headers=request.headers, stream=stream)
+        try:
+            if response.status_code != 200:
+                data = None
+            elif stream:
+                items = aiter_json_array(self.iter_content(response), request.items)
+                data = _kept([item async for item in items], request.select)
+            else:
+                data = self.json(response)
+        finally:
+            await response.aclose()
+        return Reply(response.status_code, response.headers, data)
+
+    async def iter_content(self, response, chunk_size=64 * 1024):
+        """Iterate over the body of a streamed response, counting its bytes."""
+        async for chunk in response.aiter_bytes(chunk_size):
+            metrics.upstream_bytes.inc(len(chunk), host=response.upstream_host)
+            yield chunk
+
+    async def _sleep(self, host, seconds):
+        metrics.upstream_retries.inc(host=host)
+        await asyncio.sleep(seconds)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+limiter = RateLimiter(
+    # A stub server standing in for the upstreams has no rate limit
+    {} if Config.UPSTREAM_OVERRIDE else Config.UPSTREAM_RATE_LIMITS,
+    max_waits={LIVE: Config.UPSTREAM_LIVE_MAX_WAIT}
+)
+
+breakers = CircuitBreakers(
+    {
+        'failure_threshold': Config.CIRCUIT_FAILURE_THRESHOLD,
+        'reset_timeout': Config.CIRCUIT_RESET_TIMEOUT,
+        'half_open_probes': Config.CIRCUIT_HALF_OPEN_PROBES
+    },
+    overrides=Config.CIRCUIT_BREAKERS
+)
+
+CLIENT_SETTINGS = dict(
+    connect_timeout=Config.HTTP_CONNECT_TIMEOUT,
+    read_timeout=Config.HTTP_READ_TIMEOUT,
+    retries=Config.HTTP_RETRIES,
+    pool_maxsize=Config.HTTP_POOL_SIZE,
+    upstream_override=Config.UPSTREAM_OVERRIDE,
+    limiter=limiter,
+    breakers=breakers
+)
+
+http = HttpClient(**CLIENT_SETTINGS)
+async_http = AsyncHttpClient(**CLIENT_SETTINGS)
+
+
+def _attempt(fetch, request):
+    try:
+        return fetch(request)
+    except Exception as e:
+        return e
+
+def run(steps):
+    """Drive a service's request generator over `http`.
+
+    The generator yields a Get and is sent back its Reply; an error
+    performing it is raised inside the generator, at the yield. A list of
+    Gets is answered with a list in which each failed Get has its exception
+    instead of a Reply, so the other replies are not lost. What the
+    generator returns is the result. Services describe each endpoint once
+    this way, and only the transport is sync or async.
+    """
+    reply, error = None, None
+    while True:
+        try:
+            request = steps.send(reply) if error is None else steps.throw(error)
+        except StopIteration as done:
+            return done.value
+        reply, error = None, None
+        try:
+            if isinstance(request, list):
+                reply = [_attempt(http.fetch, each) for each in request]
+            else:
+                reply = http.fetch(request)
+        except Exception as e:
+            error = e
+
+async def run_async(steps):
+    """`run` over `async_http`; the Gets of a list are performed concurrently."""
+    reply, error = None, None
+    while True:
+        try:
+            request = steps.send(reply) if error is None else steps.throw(error)
+        except StopIteration as done:
+            return done.value
+        reply, error = None, None
+        try:
+            if isinstance(request, list):
+                reply = list(await asyncio.gather(
+                    *(async_http.fetch(each) for each in request), return_exceptions=True
+                ))
+            else:
+                reply = await async_http.fetch(request)
+        except Exception as e:
+            error = e
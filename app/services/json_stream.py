@@ -0,0 +1,86 @@
+"""Decode a JSON array from a streamed response body.
+
+Large upstream payloads such as yields.llama.fi/pools are objects with one
+big array (`{"status": ..., "data": [...]}`). `iter_json_array` yields the
+array's elements one at a time as chunks arrive instead of parsing the
+whole body into one large list first.
+"""
+import codecs
+import json
+import re
+
+_WHITESPACE = re.compile(r'[\s,]*')
+
+class JSONArrayStream:
+    """Incrementally decode the array under the top-level `key` of a JSON object.
+
+    `feed` takes the body in chunks of bytes and returns the elements
+    completed so far, so only one element and one chunk are held in memory
+    at a time.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.done = False
+        self._start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = None
+
+    def feed(self, chunk, final=False):
+        text = self._utf8.decode(chunk, final=final)
+        if self._pos is None:
+            # Keep a tail in case the key is split across chunks
+            self._buffer = self._buffer[-len(self.key) - 16:] + text
+        else:
+            self._buffer = self._buffer[self._pos:] + text
+            self._pos = 0
+
+        items = []
+        buffer = self._buffer
+        while not self.done:
+            if self._pos is None:
+                match = self._start.search(buffer)
+                if not match:
+                    break
+                self._pos = match.end()
+            pos = _WHITESPACE.match(buffer, self._pos).end()
+            if pos == len(buffer):
+                break
+            if buffer[pos] == ']':
+                self.done = True
+                break
+            try:
+                item, self._pos = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The element is split across chunks (or the body is broken)
+                if final:
+                    raise
+                break
+            items.append(item)
+
+        if final and not self.done:
+            raise ValueError(f"JSON array {self.key!r} not found or not terminated")
+        return items
+
+
+def iter_json_array(chunks, key):
+    """Yield the elements of the array under `key` from an iterable of bytes chunks."""
+    stream = JSONArrayStream(key)
+    for chunk in chunks:
+        yield from stream.feed(chunk)
+        if stream.done:
+            return
+    yield from stream.feed(b'', final=True)
+
+async def aiter_json_array(chunks, key):
+    """`iter_json_array` over an async iterable of bytes chunks."""
+    stream = JSONArrayStream(key)
+    async for chunk in chunks:
+        for item in stream.feed(chunk):
+            yield item
+        if stream.done:
+            return
+    for item in stream.feed(b'', final=True):
+        yield item
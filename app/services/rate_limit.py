@@ -0,0 +1,178 @@
+"""Per-host token buckets that queue and prioritize upstream calls.
+
+Every call to a host takes one token from that host's bucket; when none is
+left the caller waits in a queue ordered by priority (then arrival), so
+live `/api/gdp` requests are served ahead of scheduler refreshes and
+history backfills, and throughput settles at the configured rate instead
+of running into 429s. A Retry-After from the upstream pauses the whole
+bucket. Threads and event-loop tasks share the same buckets.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from app import metrics
+
+LIVE, REFRESH, BACKFILL = 0, 1, 2
+PRIORITY_NAMES = {LIVE: 'live', REFRESH: 'refresh', BACKFILL: 'backfill'}
+
+_priority = contextvars.ContextVar('upstream_priority', default=LIVE)
+
+
+@contextmanager
+def priority(level):
+    """Run the block's upstream calls at `level` (LIVE, REFRESH or BACKFILL)."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority():
+    return _priority.get()
+
+
+class RateLimited(Exception):
+    """An upstream call waited longer than its priority allows."""
+
+
+class TokenBucket:
+    """`rate` tokens per second up to `burst`; with no rate only pauses apply."""
+
+    def __init__(self, rate=None, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if self.rate is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _try_take(self, entry):
+        """Take a token for `entry` if it heads the queue; else the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self.rate is not None and self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+            if self._waiters[0] is not entry:
+                # A token is free but someone ahead takes it first
+                return 0.01
+            heapq.heappop(self._waiters)
+            if self.rate is not None:
+                self._tokens -= 1
+            return None
+
+    def _enqueue(self, level):
+        entry = [level, next(self._seq)]
+        with self._lock:
+            heapq.heappush(self._waiters, entry)
+        return entry
+
+    def _dequeue(self, entry):
+        with self._lock:
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+
+    def _delay(self, entry, deadline):
+        delay = self._try_take(entry)
+        if delay is not None and deadline is not None and time.monotonic() + delay > deadline:
+            raise RateLimited("waited too long for a rate limit token")
+        return delay
+
+    def acquire(self, level=LIVE, max_wait=None):
+        """Block until a token is granted; return the seconds waited."""
+        started = time.monotonic()
+        deadline = None if max_wait is None else started + max_wait
+        entry = self._enqueue(level)
+        try:
+            while True:
+                delay = self._delay(entry, deadline)
+                if delay is None:
+                    return time.monotonic() - started
+                time.sleep(delay)
+        finally:
+            self._dequeue(entry)
+
+    async def acquire_async(self, level=LIVE, max_wait=None):
+        """`acquire` without blocking the event loop."""
+        started = time.monotonic()
+        deadline = None if max_wait is None else started + max_wait
+        entry = self._enqueue(level)
+        try:
+            while True:
+                delay = self._delay(entry, deadline)
+                if delay is None:
+                    return time.monotonic() - started
+                await asyncio.sleep(delay)
+        finally:
+            self._dequeue(entry)
+
+    def pause(self, seconds):
+        """Hand out no tokens for `seconds`, e.g. after a 429 with Retry-After."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = min(self._tokens, 0)
+
+
+class RateLimiter:
+    """Token buckets by upstream host, with per-priority queueing limits.
+
+    `limits` maps hosts to (rate per second, burst); other hosts get a
+    bucket without a rate so Retry-After pauses still apply to them.
+    `max_waits` maps priorities to the longest they may queue.
+    """
+
+    def __init__(self, limits, max_waits=None):
+        self.limits = limits
+        self.max_waits = max_waits or {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host):
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                rate, burst = self.limits.get(host, (None, 1))
+                bucket = self._buckets[host] = TokenBucket(rate, burst)
+            return bucket
+
+    def _waited(self, host, level, seconds):
+        metrics.upstream_queue_seconds.observe(seconds, host=host, priority=PRIORITY_NAMES[level])
+        metrics.record_timing('queue', seconds)
+
+    def _limited(self, host, level):
+        metrics.upstream_rate_limited.inc(host=host, priority=PRIORITY_NAMES[level])
+
+    def acquire(self, host):
+        level = current_priority()
+        try:
+            waited = self.bucket(host).acquire(level, self.max_waits.get(level))
+        except RateLimited:
+            self._limited(host, level)
+            raise
+        self._waited(host, level, waited)
+
+    async def acquire_async(self, host):
+        level = current_priority()
+        try:
+            waited = await self.bucket(host).acquire_async(level, self.max_waits.get(level))
+        except RateLimited:
+            self._limited(host, level)
+            raise
+        self._waited(host, level, waited)
+
+    def pause(self, host, seconds):
+        self.bucket(host).pause(seconds)
@@ -0,0 +1,148 @@
+import threading
+import time
+from app import metrics
+from app.serialization import encode_columns
+from app.services.alignment import align
+from app.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+COMPONENTS = ['monetary_base', 'tvl', 'fees', 'stablecoins', 'protocols', 'cultural']
+
+RESOLUTIONS = {
+    '1h': 3600,
+    '4h': 4 * 3600,
+    '1d': 24 * 3600
+}
+
+# period: (resolution, number of buckets, label format). Nothing goes past
+# a year: that is all the history CoinGecko serves (HISTORY_BACKFILL_DAYS)
+# for the monetary base and protocol tokens
+PERIODS = {
+    '24h': ('1h', 25, '%H:%M'),
+    '1w': ('4h', 43, '%a %H:%M'),
+    '1m': ('1d', 31, '%Y-%m-%d'),
+    '3m': ('1d', 91, '%Y-%m-%d'),
+    '1y': ('1d', 366, '%Y-%m-%d')
+}
+
+class RollupLayer:
+    """GDP and component series materialized at 1h, 4h and 1d resolution.
+
+    Each resolution keeps a frame covering the longest period that uses it,
+    and every period's response body is rendered to JSON bytes up front
+    (MessagePack on first request).
+    When the history store reports new points (or the clock moves into a
+    new bucket) only the buckets from the earliest changed one onward are
+    recomputed and the affected periods re-rendered, so a request is a dict
+    lookup.
+    """
+
+    def __init__(self, history, periods=PERIODS):
+        self.history = history
+        self.periods = periods
+        self._lock = threading.Lock()
+        self._version = None
+        self._frames = {}
+        self._rendered = {}
+
+    def get(self, period, fmt='json'):
+        """(encoded body, rendered_at) for `period` ('json' or 'msgpack').
+
+        `rendered_at` is when the period was last re-rendered, i.e. when its
+        data last changed. Both are read under the lock, so a concurrent
+        rebuild cannot pair one version's body with another's time.
+        Raises KeyError for unknown periods.
+        """
+        if period not in self.periods:
+            raise KeyError(period)
+        self.update()
+        with self._lock:
+            rendered = self._rendered[period]
+            if fmt not in rendered:
+                rendered[fmt] = encode_columns(rendered['labels'], rendered['columns'], fmt)
+            return rendered[fmt], rendered['rendered_at']
+
+    def update(self):
+        with self._lock:
+            now = int(time.time())
+            version, changed_from = self.history.store.changes_since(self._version)
+            self._version = version
+
+            dirty = set()
+            for resolution, seconds in RESOLUTIONS.items():
+                frame = self._frames.get(resolution)
+                current = now // seconds * seconds
+                if frame is None:
+                    start = self._window_start(resolution, current)
+                elif changed_from is not None:
+                    start = min(changed_from // seconds * seconds, current)
+                elif frame.index[-1] < pd.Timestamp(current, unit='s'):
+                    start = int(frame.index[-1].timestamp())
+                else:
+                    continue
+                if start is None:
+                    continue
+
+                with metrics.timer(metrics.transform_seconds, 'transform', step='rollup_build'):
+                    rows = self._build(seconds, start, current)
+                if frame is not None:
+                    frame = pd.concat([frame[frame.index < rows.index[0]], rows])
+                    frame = frame[frame.index >= pd.Timestamp(self._window_start(resolution, current), unit='s')]
+                else:
+                    frame = rows
+                self._frames[resolution] = frame
+                dirty.add(resolution)
+
+            for period, (resolution, _, _) in self.periods.items():
+                if resolution in dirty or period not in self._rendered:
+                    with metrics.timer(metrics.transform_seconds, 'transform', step='rollup_render'):
+                        self._rendered[period] = self._render(period)
+
+    def _window_start(self, resolution, current):
+        seconds = RESOLUTIONS[resolution]
+        buckets = [n for res, n, _ in self.periods.values() if res == resolution]
+        if not buckets:
+            return None
+        return current - (max(buckets) - 1) * seconds
+
+    def _build(self, seconds, start, end):
+        """Component and GDP values for buckets start..end (unix seconds).
+
+        A component with any series missing at a bucket, and GDP with any
+        component missing, is NaN (a gap in the chart) rather than the sum
+        of the parts that are there.
+        """
+        buckets = np.arange(start, end + 1, seconds)
+        # Each bucket takes the values as of its end (or now, for the current one)
+        targets = np.minimum(buckets + seconds - 1, int(time.time()))
+        raw = self.history.load(start - max(seconds, 2 * 24 * 3600), end + seconds)
+        names, matrix = align(raw, targets, self.history.policies)
+
+        columns = {}
+        for component in COMPONENTS:
+            parts = matrix[:, [names.index(name) for name in self.history.components[component]]]
+            columns[component] = parts.sum(axis=1)
+
+        frame = pd.DataFrame(columns, index=pd.to_datetime(buckets, unit='s'))
+        frame['gdp'] = frame[COMPONENTS].sum(axis=1, skipna=False)
+        return frame
+
+    def _render(self, period):
+        resolution, buckets, label_format = self.periods[period]
+        frame = self._frames.get(resolution)
+        if frame is None:
+            frame = pd.DataFrame(columns=COMPONENTS + ['gdp'], index=pd.DatetimeIndex([]), dtype='float64')
+        frame = frame.iloc[-buckets:]
+
+        labels = frame.index.strftime(label_format).tolist()
+        columns = {'values': frame['gdp'].to_numpy(dtype='float64')}
+        for name in COMPONENTS:
+            columns[name] = frame[name].to_numpy(dtype='float64')
+        return {
+            'labels': labels,
+            'columns': columns,
+            'json': encode_columns(labels, columns),
+            'rendered_at': time.time()
+        }
@@ -0,0 +1,159 @@
+"""Index yield pools while streaming yields.llama.fi/pools.
+
+The /pools payload lists every pool on every chain (tens of MB). Rather
+than parsing it into one large list, the pools are decoded one at a time
+as chunks arrive (app/services/json_stream.py) and `PoolIndex` keeps only
+the Ethereum pools' fields it serves, as numpy columns. In the same pass bounded top-K
+heaps rank the pools by every sort key, which answer the common unfiltered
+pages; full sort orders for other queries are only built when first needed.
+"""
+import heapq
+from app.config import Config
+from app.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+class TopK:
+    """The `k` items with the largest scores, in one pass of bounded memory."""
+
+    def __init__(self, k):
+        self.k = k
+        self._heap = []
+        self._seen = 0
+
+    def offer(self, score, item):
+        self._seen += 1
+        if len(self._heap) < self.k:
+            # Among equal scores the later item ranks lower, as in a stable sort
+            heapq.heappush(self._heap, (score, -self._seen, item))
+        elif score > self._heap[0][0]:
+            heapq.heapreplace(self._heap, (score, -self._seen, item))
+
+    def result(self):
+        """Items in descending score order."""
+        return [item for _, _, item in sorted(self._heap, reverse=True)]
+
+
+class PoolIndex:
+    """Columnar snapshot of yield pools (apy, tvl, project, symbol, stablecoin).
+
+    The top `ranking_size` rows for every sort key are ranked while the
+    pools are read, so an unfiltered page within them is a slice. Other
+    queries mask and slice full sort orders (overall and per project),
+    built on first use.
+    """
+
+    SORT_KEYS = ('apy', 'tvl')
+    # Pool fields the index reads
+    FIELDS = ('project', 'symbol', 'apy', 'tvlUsd', 'stablecoin')
+
+    def __init__(self, pools, ranking_size=None):
+        self.ranking_size = ranking_size or Config.YIELDS_MAX_LIMIT
+        by_apy, by_tvl = TopK(self.ranking_size), TopK(self.ranking_size)
+        symbols, projects, apy, tvl, stablecoin = [], [], [], [], []
+        codes = {}
+        for i, p in enumerate(pools):
+            project = p.get('project') or 'unknown'
+            code = codes.get(project)
+            if code is None:
+                code = codes[project] = len(codes)
+            pool_apy, pool_tvl = float(p.get('apy') or 0), float(p.get('tvlUsd') or 0)
+            by_apy.offer(pool_apy, i)
+            by_tvl.offer(pool_tvl, i)
+            symbols.append(p.get('symbol') or '')
+            projects.append(code)
+            apy.append(pool_apy)
+            tvl.append(pool_tvl)
+            stablecoin.append(bool(p.get('stablecoin')))
+
+        self.symbols = symbols
+        self.project_names = list(codes)
+        self.project_codes = codes
+        self.projects = np.array(projects, dtype=np.int32)
+        self.apy = np.array(apy, dtype=np.float64)
+        self.tvl = np.array(tvl, dtype=np.float64)
+        self.stablecoin = np.array(stablecoin, dtype=bool)
+
+        self.rankings = {
+            'apy': np.array(by_apy.result(), dtype=np.intp),
+            'tvl': np.array(by_tvl.result(), dtype=np.intp)
+        }
+        self._orders = None
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def _sort_orders(self):
+        """Every row in descending order of each sort key, overall and per project."""
+        if self._orders is None:
+            orders = {
+                'apy': np.argsort(-self.apy, kind='stable'),
+                'tvl': np.argsort(-self.tvl, kind='stable')
+            }
+            size = len(self.project_names)
+            project_orders = {}
+            for key, order in orders.items():
+                # Group each order by project while keeping it sorted within a group
+                grouped = order[np.argsort(self.projects[order], kind='stable')]
+                bounds = np.searchsorted(self.projects[grouped], np.arange(size + 1))
+                project_orders[key] = [
+                    grouped[bounds[code]:bounds[code + 1]] for code in range(size)
+                ]
+            self._orders = orders, project_orders
+        return self._orders
+
+    def row(self, i):
+        return {
+            'pool': self.symbols[i],
+            'protocol': self.project_names[self.projects[i]],
+            'apy': float(self.apy[i]),
+            'tvl': float(self.tvl[i]),
+            'stablecoin': bool(self.stablecoin[i])
+        }
+
+    def _select(self, rows, stablecoin=False, min_tvl=None):
+        if stablecoin:
+            rows = rows[self.stablecoin[rows]]
+        if min_tvl is not None:
+            rows = rows[self.tvl[rows] >= min_tvl]
+        return rows
+
+    def query(self, sort='apy', project=None, stablecoin=False, min_tvl=None, offset=0, limit=10):
+        """One page of pools in descending `sort` order, and the total number matching."""
+        ranking = self.rankings[sort]
+        if (project is None and not stablecoin and min_tvl is None
+                and (offset + limit <= len(ranking) or len(ranking) == len(self))):
+            return len(self), [self.row(i) for i in ranking[offset:offset + limit]]
+
+        orders, project_orders = self._sort_orders()
+        if project is None:
+            rows = orders[sort]
+        else:
+            code = self.project_codes.get(project)
+            if code is None:
+                return 0, []
+            rows = project_orders[sort][code]
+        rows = self._select(rows, stablecoin, min_tvl)
+        return len(rows), [self.row(i) for i in rows[offset:offset + limit]]
+
+    def aggregates(self, stablecoin=False, min_tvl=None):
+        """Per-project pool count, total TVL, TVL-weighted and max APY, by TVL."""
+        rows = self._select(np.arange(len(self)), stablecoin, min_tvl)
+        codes = self.projects[rows]
+        size = len(self.project_names)
+        pools = np.bincount(codes, minlength=size)
+        tvl = np.bincount(codes, weights=self.tvl[rows], minlength=size)
+        weighted = np.bincount(codes, weights=self.tvl[rows] * self.apy[rows], minlength=size)
+        max_apy = np.full(size, -np.inf)
+        np.maximum.at(max_apy, codes, self.apy[rows])
+
+        return [
+            {
+                'protocol': self.project_names[code],
+                'pools': int(pools[code]),
+                'tvl': float(tvl[code]),
+                'apy': float(weighted[code] / tvl[code]) if tvl[code] else 0.0,
+                'max_apy': float(max_apy[code])
+            }
+            for code in np.argsort(-tvl, kind='stable') if pools[code]
+        ]
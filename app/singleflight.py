@@ -0,0 +1,349 @@
+"""Single-flight memoization for upstream-bound functions.
+
+``@singleflight(timeout=300)`` is used in place of ``@cache.memoize(timeout=300)``.
+On a miss only one caller computes the value; concurrent callers in the same
+process wait for its result, and callers in other processes wait on a lock
+kept in the shared cache (when the backend supports ``add``-based locks).
+Once an entry is older than ``timeout`` it is still served for another
+``stale_timeout`` seconds while a single background refresh replaces it.
+
+Coroutine functions get the same behaviour on the event loop (waiters share
+an ``asyncio`` task, background refreshes are tasks). Their cache reads and
+writes, which block on SQLite or Redis and unpickling, run on the default
+thread pool. An async variant can pass ``shares=`` its sync twin so both
+read and write the same entries.
+
+``f.snapshot(*args)`` returns the value together with the time it was
+computed (None if it was not cached), for Last-Modified/ETag handling.
+
+With ``local_copies=n`` the entries of up to n keys are also kept decoded
+in this process. Each entry is written with a small ``<key>:at`` stamp of
+its computation time. Reads fetch the stamp and only load and unpickle
+the full entry when it no longer matches the local copy. For large values
+(the protocol and yield indexes), most of a request's time otherwise goes
+into unpickling the same entry again.
+
+When a computation fails, returns None or returns a value
+``should_cache`` rejects after an upstream call was turned away by an open
+circuit breaker, the last known value is returned instead (with its
+original computation time), so a tripped breaker degrades to old data at
+once. That is the shared cache entry, even if stale, or else this
+process's local copy, so only functions with ``local_copies`` keep one
+past the entry's expiry.
+
+A caller waiting on another thread's computation for longer than
+``lock_timeout`` gets the last known value too, or ``StillComputing``
+(answered with a 503) when there is none.
+"""
+import asyncio
+import hashlib
+import inspect
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from functools import wraps
+from app import cache, metrics
+from app.services.circuit_breaker import rejections
+
+logger = logging.getLogger(__name__)
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+_async_inflight = {}
+# Decoded entries by namespace, then cache key (least recently used first)
+_local = {}
+_local_lock = threading.Lock()
+
+
+class StillComputing(TimeoutError):
+    """Waited `lock_timeout` for another caller's computation, with nothing to serve meanwhile."""
+
+
+def _supports_locks():
+    return getattr(cache.cache, 'supports_locks', False)
+
+
+def singleflight(timeout, stale_timeout=None, lock_timeout=30, should_cache=None, shares=None,
+                 local_copies=None):
+    """Memoize a function with request coalescing and stale-while-revalidate.
+
+    ``should_cache`` is an optional predicate on the computed value; values it
+    rejects are returned to the caller but not stored. ``shares`` is another
+    singleflight-decorated function whose cache entries (and, by default,
+    ``should_cache`` and ``local_copies``) this one uses. ``local_copies`` is
+    how many keys' entries to keep decoded in this process.
+    """
+    if stale_timeout is None:
+        stale_timeout = timeout
+    if should_cache is None and shares is not None:
+        should_cache = getattr(shares, '__func__', shares).should_cache
+    if local_copies is None:
+        local_copies = getattr(shares, '__func__', shares).local_copies if shares is not None else 0
+
+    def decorator(f):
+        if shares is not None:
+            namespace = getattr(shares, '__func__', shares).namespace
+        else:
+            namespace = f"singleflight:{f.__module__}.{f.__qualname__}"
+        with _local_lock:
+            local = _local.setdefault(namespace, OrderedDict())
+
+        def make_cache_key(*args, **kwargs):
+            digest = hashlib.md5(repr((args, sorted(kwargs.items()))).encode()).hexdigest()
+            return f"{namespace}:{digest}"
+
+        def keep(key, entry):
+            with _local_lock:
+                local[key] = entry
+                local.move_to_end(key)
+                while len(local) > local_copies:
+                    local.popitem(last=False)
+
+        def read(key):
+            """The shared cache entry of `key`, decoded only when it changed."""
+            if not local_copies:
+                return cache.get(key)
+            stamp = cache.get(f"{key}:at")
+            if stamp is None:
+                return None
+            with _local_lock:
+                entry = local.get(key)
+                if entry is not None and entry['computed_at'] == stamp:
+                    local.move_to_end(key)
+                    return entry
+            entry = cache.get(key)
+            if entry is not None:
+                keep(key, entry)
+            return entry
+
+        def store(key, value):
+            """Cache `value`; return the time it was stored, or None if rejected."""
+            if should_cache is not None and not should_cache(value):
+                return None
+            now = time.time()
+            entry = {'value': value, 'computed_at': now, 'expires_at': now + timeout}
+            cache.set(key, entry, timeout=timeout + stale_timeout)
+            if local_copies:
+                cache.set(f"{key}:at", now, timeout=timeout + stale_timeout)
+                keep(key, entry)
+            return now
+
+        def last_known(key):
+            """The stored (value, computed_at) of `key`, from the shared cache or the local copy."""
+            entry = read(key)
+            if entry is None:
+                with _local_lock:
+                    entry = local.get(key)
+            return None if entry is None else (entry['value'], computed_at(entry))
+
+        def degraded(key, rejected):
+            """The last known value if an open circuit got in the way of computing `key`."""
+            if not rejected:
+                return None
+            known = last_known(key)
+            if known is not None:
+                logger.warning(
+                    f"Serving the last known {f.__qualname__}: circuit open for {', '.join(sorted(rejected))}"
+                )
+            return known
+
+        def settle(key, value, rejected):
+            """Store a computed value; (value, computed_at) to answer with."""
+            if rejected and value is None:
+                # Services swallow upstream errors into None
+                return degraded(key, rejected) or (value, None)
+            stored_at = store(key, value)
+            if stored_at is None:
+                return degraded(key, rejected) or (value, None)
+            return value, stored_at
+
+        def computed_at(entry):
+            # Entries written before computed_at was recorded
+            return entry.get('computed_at', entry['expires_at'] - timeout)
+
+        def lookup(key):
+            """The cached entry and whether it is 'hit', 'stale' or 'miss'."""
+            entry = read(key)
+            if entry is None:
+                result = 'miss'
+            elif entry['expires_at'] <= time.time():
+                result = 'stale'
+            else:
+                result = 'hit'
+            metrics.cache_lookups.inc(function=f.__qualname__, result=result)
+            return entry, result
+
+        def fresh_entry(key):
+            entry = read(key)
+            if entry is not None and entry['expires_at'] > time.time():
+                return entry
+            return None
+
+        def compute(key, args, kwargs):
+            """Compute (value, computed_at) once per process and once per shared lock."""
+            with _inflight_lock:
+                future = _inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = _inflight[key] = Future()
+            if not leader:
+                try:
+                    return future.result(timeout=lock_timeout)
+                except FutureTimeout:
+                    known = last_known(key)
+                    if known is None:
+                        raise StillComputing(f"{f.__qualname__} is still being computed") from None
+                    return known
+
+            try:
+                snapshot = _compute_locked(key, args, kwargs)
+                future.set_result(snapshot)
+                return snapshot
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            finally:
+                with _inflight_lock:
+                    _inflight.pop(key, None)
+
+        def _compute_locked(key, args, kwargs):
+            lock_key = f"{key}:lock"
+            locked = _supports_locks() and cache.add(lock_key, 1, timeout=lock_timeout)
+            if _supports_locks() and not locked:
+                # Another process is computing it; wait for its result
+                deadline = time.monotonic() + lock_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    entry = fresh_entry(key)
+                    if entry is not None:
+                        return entry['value'], computed_at(entry)
+                    if not cache.has(lock_key):
+                        break
+            try:
+                with rejections() as rejected:
+                    try:
+                        value = f(*args, **kwargs)
+                    except Exception:
+                        known = degraded(key, rejected)
+                        if known is None:
+                            raise
+                        return known
+                return settle(key, value, rejected)
+            finally:
+                # Only the lock this call took: after a wait it is another process's
+                if locked:
+                    cache.delete(lock_key)
+
+        def revalidate(key, args, kwargs):
+            try:
+                compute(key, args, kwargs)
+            except Exception as e:
+                logger.error(f"Error revalidating {f.__qualname__}: {e}")
+
+        def snapshot_sync(*args, **kwargs):
+            """The value and the time it was computed (None when it was not cached)."""
+            key = make_cache_key(*args, **kwargs)
+            entry, result = lookup(key)
+            if result == 'miss':
+                return compute(key, args, kwargs)
+            if result == 'stale':
+                with _inflight_lock:
+                    refreshing = key in _inflight
+                if not refreshing:
+                    threading.Thread(
+                        target=revalidate, args=(key, args, kwargs), daemon=True
+                    ).start()
+            return entry['value'], computed_at(entry)
+
+        @wraps(f)
+        def decorated_sync(*args, **kwargs):
+            return snapshot_sync(*args, **kwargs)[0]
+
+        def refresh_sync(*args, **kwargs):
+            """Recompute and store the value regardless of the cached entry."""
+            value = f(*args, **kwargs)
+            store(make_cache_key(*args, **kwargs), value)
+            return value
+
+        def compute_async(key, args, kwargs):
+            """The task computing (value, computed_at) for `key` on this event loop."""
+            task = _async_inflight.get(key)
+            if task is None:
+                task = _async_inflight[key] = asyncio.ensure_future(
+                    _compute_locked_async(key, args, kwargs)
+                )
+                task.add_done_callback(lambda _: _async_inflight.pop(key, None))
+            return task
+
+        async def _compute_locked_async(key, args, kwargs):
+            lock_key = f"{key}:lock"
+            locks = _supports_locks()
+            locked = locks and await asyncio.to_thread(cache.add, lock_key, 1, timeout=lock_timeout)
+            if locks and not locked:
+                deadline = time.monotonic() + lock_timeout
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(0.05)
+                    entry = await asyncio.to_thread(fresh_entry, key)
+                    if entry is not None:
+                        return entry['value'], computed_at(entry)
+                    if not await asyncio.to_thread(cache.has, lock_key):
+                        break
+            try:
+                with rejections() as rejected:
+                    try:
+                        value = await f(*args, **kwargs)
+                    except Exception:
+                        known = await asyncio.to_thread(degraded, key, rejected)
+                        if known is None:
+                            raise
+                        return known
+                return await asyncio.to_thread(settle, key, value, rejected)
+            finally:
+                if locked:
+                    await asyncio.to_thread(cache.delete, lock_key)
+
+        def log_revalidation(task):
+            if not task.cancelled() and task.exception() is not None:
+                logger.error(f"Error revalidating {f.__qualname__}: {task.exception()}")
+
+        async def snapshot_async(*args, **kwargs):
+            key = make_cache_key(*args, **kwargs)
+            entry, result = await asyncio.to_thread(lookup, key)
+            if result == 'miss':
+                # Shielded so a cancelled request does not cancel other waiters
+                return await asyncio.shield(compute_async(key, args, kwargs))
+            if result == 'stale' and key not in _async_inflight:
+                compute_async(key, args, kwargs).add_done_callback(log_revalidation)
+            return entry['value'], computed_at(entry)
+
+        @wraps(f)
+        async def decorated_coroutine(*args, **kwargs):
+            return (await snapshot_async(*args, **kwargs))[0]
+
+        async def refresh_async(*args, **kwargs):
+            value = await f(*args, **kwargs)
+            await asyncio.to_thread(store, make_cache_key(*args, **kwargs), value)
+            return value
+
+        def peek(*args, **kwargs):
+            """Return the cached value, even if stale, without computing it."""
+            entry = read(make_cache_key(*args, **kwargs))
+            return None if entry is None else entry['value']
+
+        is_async = inspect.iscoroutinefunction(f)
+        decorated_function = decorated_coroutine if is_async else decorated_sync
+        decorated_function.uncached = f
+        decorated_function.namespace = namespace
+        decorated_function.cache_timeout = timeout
+        decorated_function.stale_timeout = stale_timeout
+        decorated_function.should_cache = should_cache
+        decorated_function.local_copies = local_copies
+        decorated_function.snapshot = snapshot_async if is_async else snapshot_sync
+        decorated_function.make_cache_key = make_cache_key
+        decorated_function.refresh = refresh_async if is_async else refresh_sync
+        decorated_function.peek = peek
+        return decorated_function
+
+    return decorator
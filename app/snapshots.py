@@ -0,0 +1,83 @@
+"""Last-known-good values of the GDP components, kept on local disk.
+
+The file is read through mmap when the store is created (at import), so a
+fresh process, e.g. a serverless cold start, has a value for every
+component before making a single upstream call. Successful fetches are
+merged in (newest `updated_at` wins, so workers sharing the file do not
+roll each other back) and written atomically: a temporary file in the same
+directory is renamed over the old one, so readers see either the old or
+the new snapshot, never a partial one.
+"""
+import logging
+import mmap
+import os
+import tempfile
+import threading
+from app.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotStore:
+    """{name: {'value', 'updated_at'}} persisted as one JSON file at `path`."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._snapshots = self._read()
+
+    def _read(self):
+        try:
+            with open(self.path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data, memoryview(data) as view:
+                    snapshots = loads(view)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            # Empty, truncated by hand or unreadable: start without snapshots
+            logger.warning(f"Ignoring snapshot file {self.path}: {e}")
+            return {}
+        return snapshots if isinstance(snapshots, dict) else {}
+
+    def get(self, name):
+        """The last good {'value', 'updated_at'} of `name`, or None."""
+        with self._lock:
+            return self._snapshots.get(name)
+
+    def names(self):
+        with self._lock:
+            return list(self._snapshots)
+
+    def record(self, name, value, updated_at):
+        """Remember a successful value and persist every snapshot.
+
+        A value no newer than the stored one (the same cached result seen
+        again) is ignored without touching the file.
+        """
+        with self._lock:
+            current = self._snapshots.get(name)
+            if current is not None and current['updated_at'] >= updated_at:
+                return
+            self._snapshots[name] = {'value': value, 'updated_at': updated_at}
+            # Keep newer values other workers have written since we read
+            for other, snapshot in self._read().items():
+                current = self._snapshots.get(other)
+                if current is None or snapshot['updated_at'] > current['updated_at']:
+                    self._snapshots[other] = snapshot
+            self._write(dumps(self._snapshots))
+
+    def _write(self, data):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshots-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            logger.error(f"Error writing snapshot file {self.path}: {e}")
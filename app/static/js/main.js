@@ -1,6 +1,8 @@
 // Feature flags
 const CONFIG = {
-    enableTimeline: false  // Set to true to enable timeline feature
+    enableTimeline: false,  // Set to true to enable timeline feature
+    // Only the ASGI server streams GDP updates; otherwise poll
+    gdpStream: document.body.dataset.gdpStream === '1'
 };
 
 // Chart configuration
@@ -87,67 +89,182 @@ function formatChange(current, previous) {
     return `${sign}${change.toFixed(2)}%`;
 }
 
-function updateGDP() {
-    fetch('/api/gdp')
+// Latest dashboard sections, kept so tables can be re-sorted without a fetch
+const dashboardState = {};
+
+// Fetch the given sections (all by default) of /api/dashboard in one
+// request and render each of them
+function loadDashboard(fields) {
+    const query = fields ? `?fields=${fields.join(',')}` : '';
+    return fetch(`/api/dashboard${query}`)
         .then(response => {
             if (!response.ok) {
-                throw new Error('Network response was not ok');
+                throw new Error(`HTTP error! status: ${response.status}`);
             }
             return response.json();
         })
         .then(data => {
-            if (data.error) {
-                throw new Error(data.error);
-            }
-            
-            // Update main GDP value
-            document.getElementById('gdp-value').textContent = formatNumber(data.gdp);
-            
-            // Update GDP 24h change
-            const gdpChange = data.change_24h;
-            document.getElementById('gdp-change').innerHTML = 
-                `24h Change: ${formatPercentage(gdpChange)}`;
-            
-            // Update components
-            const components = data.components;
-            Object.entries(components).forEach(([key, value]) => {
-                const element = document.getElementById(key);
-                if (element) {
-                    element.textContent = value ? formatNumber(value) : '$0.00';
+            if ('gdp' in data) {
+                if (!data.gdp) {
+                    showGDPError(new Error('No GDP data received'));
+                } else if (!gdpState) {
+                    // Once the stream has sent a snapshot it is the newer source
+                    renderGDP(data.gdp);
                 }
-            });
-            
-            // Update metadata
-            const metadata = data.metadata;
-            document.getElementById('eth_volume').textContent = 
-                formatNumber(metadata.eth_24h_volume);
-            document.getElementById('eth_change').innerHTML = 
-                formatPercentage(metadata.eth_24h_change);
-            document.getElementById('tvl-change').innerHTML = 
-                `24h Change: ${formatPercentage(metadata.tvl_24h_change)}`;
-            document.getElementById('revenue-change').innerHTML = 
-                `24h Change: ${formatPercentage(metadata.fees_24h_change)}`;
-            document.getElementById('stablecoins-change').innerHTML = 
-                `24h Change: ${formatPercentage(metadata.stablecoins_24h_change)}`;
-            
-            // Update chart
-            updateChart(data.gdp);
-            
-            // Update pie chart
-            if (gdpPieChart) {
-                updateGDPPieChart(data.components);
+            }
+            if ('protocols' in data) {
+                dashboardState.protocols = data.protocols;
+                renderProtocols(data.protocols);
+            }
+            if ('categories' in data) {
+                renderCategories(data.categories);
+            }
+            if ('yields' in data) {
+                dashboardState.yields = data.yields;
+                renderYields(data.yields);
             }
         })
         .catch(error => {
-            console.error('Error:', error);
-            document.querySelectorAll('.text-eth-blue').forEach(element => {
-                if (element.textContent === 'Loading...') {
-                    element.textContent = 'Error loading data';
-                }
-            });
+            console.error('Error loading dashboard:', error);
+            if (!fields || fields.includes('gdp')) {
+                showGDPError(error);
+            }
+            if (!fields || fields.includes('categories')) {
+                renderCategories(null, error);
+            }
         });
 }
 
+function updateGDP() {
+    fetch('/api/dashboard?fields=gdp')
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Network response was not ok');
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (!data.gdp) {
+                throw new Error('No GDP data received');
+            }
+            renderGDP(data.gdp);
+        })
+        .catch(showGDPError);
+}
+
+function showGDPError(error) {
+    console.error('Error:', error);
+    document.querySelectorAll('.text-eth-blue').forEach(element => {
+        if (element.textContent === 'Loading...') {
+            element.textContent = 'Error loading data';
+        }
+    });
+}
+
+// Latest GDP payload, kept up to date by /api/stream deltas
+let gdpState = null;
+
+// Apply a delta event: `changed` maps dotted field paths to new values
+function applyGDPDelta(state, delta) {
+    Object.entries(delta.changed).forEach(([path, value]) => {
+        const keys = path.split('.');
+        const last = keys.pop();
+        let target = state;
+        keys.forEach(key => {
+            if (typeof target[key] !== 'object' || target[key] === null) {
+                target[key] = {};
+            }
+            target = target[key];
+        });
+        target[last] = value;
+    });
+    delta.removed.forEach(path => {
+        const keys = path.split('.');
+        const last = keys.pop();
+        const target = keys.reduce((obj, key) => (obj ? obj[key] : undefined), state);
+        if (target) {
+            delete target[last];
+        }
+    });
+}
+
+function startGDPPolling() {
+    updateGDP();
+    setInterval(updateGDP, 300000); // Update every 5 minutes
+}
+
+// Receive GDP updates pushed by the server; fall back to polling when
+// Server-Sent Events are unavailable
+function startGDPStream() {
+    if (!window.EventSource) {
+        startGDPPolling();
+        return;
+    }
+    const source = new EventSource('/api/stream');
+    let received = false;
+    source.addEventListener('snapshot', event => {
+        received = true;
+        gdpState = JSON.parse(event.data);
+        renderGDP(gdpState);
+    });
+    source.addEventListener('delta', event => {
+        received = true;
+        applyGDPDelta(gdpState, JSON.parse(event.data));
+        renderGDP(gdpState);
+    });
+    source.onerror = () => {
+        // The browser reconnects on its own unless the stream was refused
+        if (source.readyState === EventSource.CLOSED || !received) {
+            source.close();
+            startGDPPolling();
+        }
+    };
+}
+
+function renderGDP(data) {
+    try {
+        // Update main GDP value
+        document.getElementById('gdp-value').textContent = formatNumber(data.gdp);
+        
+        // Update GDP 24h change
+        const gdpChange = data.change_24h;
+        document.getElementById('gdp-change').innerHTML = 
+            `24h Change: ${formatPercentage(gdpChange)}`;
+        
+        // Update components
+        const components = data.components;
+        Object.entries(components).forEach(([key, value]) => {
+            const element = document.getElementById(key);
+            if (element) {
+                element.textContent = value ? formatNumber(value) : '$0.00';
+            }
+        });
+        
+        // Update metadata
+        const metadata = data.metadata;
+        document.getElementById('eth_volume').textContent = 
+            formatNumber(metadata.eth_24h_volume);
+        document.getElementById('eth_change').innerHTML = 
+            formatPercentage(metadata.eth_24h_change);
+        document.getElementById('tvl-change').innerHTML = 
+            `24h Change: ${formatPercentage(metadata.tvl_24h_change)}`;
+        document.getElementById('revenue-change').innerHTML = 
+            `24h Change: ${formatPercentage(metadata.fees_24h_change)}`;
+        document.getElementById('stablecoins-change').innerHTML = 
+            `24h Change: ${formatPercentage(metadata.stablecoins_24h_change)}`;
+        
+        // Update chart
+        updateChart(data.gdp);
+        
+        // Update pie chart
+        if (gdpPieChart) {
+            updateGDPPieChart(data.components);
+        }
+    } catch (error) {
+        showGDPError(error);
+    }
+}
+
 function formatPercentage(num) {
     const sign = num >= 0 ? '+' : '';
     const value = `${sign}${num.toFixed(2)}%`;
@@ -387,62 +504,54 @@ function sortData(data, column, direction) {
     });
 }
 
-function loadProtocolsData() {
-    fetch('/api/protocols')
-        .then(response => response.json())
-        .then(data => {
-            const sortedData = sortData(data, protocolSortConfig.column, protocolSortConfig.direction);
-            const table = document.getElementById('topProtocolsTable');
-            let html = `
-                <table class="min-w-full divide-y divide-gray-700">
-                    <thead>
-                        <tr class="text-left text-xs font-medium text-gray-300 uppercase tracking-wider">
-                            <th class="px-6 py-3 cursor-pointer hover:bg-gray-700/50" onclick="updateProtocolSort('name')">
-                                Protocol ${protocolSortConfig.column === 'name' ? (protocolSortConfig.direction === 'asc' ? '↑' : '↓') : ''}
-                            </th>
-                            <th class="px-6 py-3 cursor-pointer hover:bg-gray-700/50" onclick="updateProtocolSort('category')">
-                                Category ${protocolSortConfig.column === 'category' ? (protocolSortConfig.direction === 'asc' ? '↑' : '↓') : ''}
-                            </th>
-                            <th class="px-6 py-3 text-right cursor-pointer hover:bg-gray-700/50" onclick="updateProtocolSort('tvl')">
-                                TVL ${protocolSortConfig.column === 'tvl' ? (protocolSortConfig.direction === 'asc' ? '↑' : '↓') : ''}
-                            </th>
-                            <th class="px-6 py-3 cursor-pointer hover:bg-gray-700/50" onclick="updateProtocolSort('change_1d')">
-                                24h Change ${protocolSortConfig.column === 'change_1d' ? (protocolSortConfig.direction === 'asc' ? '↑' : '↓') : ''}
-                            </th>
-                        </tr>
-                    </thead>
-                    <tbody class="divide-y divide-gray-700 text-gray-300">
-            `;
-            
-            sortedData.forEach(protocol => {
-                html += `
-                    <tr class="hover:bg-gray-700/50">
-                        <td class="px-6 py-4">${protocol.name}</td>
-                        <td class="px-6 py-4">${protocol.category}</td>
-                        <td class="px-6 py-4 text-right">${formatNumber(protocol.tvl)}</td>
-                        <td class="px-6 py-4 whitespace-nowrap ${protocol.change_1d >= 0 ? 'text-green-400' : 'text-red-400'}">
-                            ${protocol.change_1d.toFixed(2)}%
-                        </td>
-                    </tr>
-                `;
-            });
-            
-            html += '</tbody></table>';
-            table.innerHTML = html;
-        });
+function renderProtocols(data) {
+    const sortedData = sortData(data, protocolSortConfig.column, protocolSortConfig.direction);
+    const table = document.getElementById('topProtocolsTable');
+    let html = `
+        <table class="min-w-full divide-y divide-gray-700">
+            <thead>
+                <tr class="text-left text-xs font-medium text-gray-300 uppercase tracking-wider">
+                    <th class="px-6 py-3 cursor-pointer hover:bg-gray-700/50" onclick="updateProtocolSort('name')">
+                        Protocol ${protocolSortConfig.column === 'name' ? (protocolSortConfig.direction === 'asc' ? '↑' : '↓') : ''}
+                    </th>
+                    <th class="px-6 py-3 cursor-pointer hover:bg-gray-700/50" onclick="updateProtocolSort('category')">
+                        Category ${protocolSortConfig.column === 'category' ? (protocolSortConfig.direction === 'asc' ? '↑' : '↓') : ''}
+                    </th>
+                    <th class="px-6 py-3 text-right cursor-pointer hover:bg-gray-700/50" onclick="updateProtocolSort('tvl')">
+                        TVL ${protocolSortConfig.column === 'tvl' ? (protocolSortConfig.direction === 'asc' ? '↑' : '↓') : ''}
+                    </th>
+                    <th class="px-6 py-3 cursor-pointer hover:bg-gray-700/50" onclick="updateProtocolSort('change_1d')">
+                        24h Change ${protocolSortConfig.column === 'change_1d' ? (protocolSortConfig.direction === 'asc' ? '↑' : '↓') : ''}
+                    </th>
+                </tr>
+            </thead>
+            <tbody class="divide-y divide-gray-700 text-gray-300">
+    `;
+    
+    sortedData.forEach(protocol => {
+        html += `
+            <tr class="hover:bg-gray-700/50">
+                <td class="px-6 py-4">${protocol.name}</td>
+                <td class="px-6 py-4">${protocol.category}</td>
+                <td class="px-6 py-4 text-right">${formatNumber(protocol.tvl)}</td>
+                <td class="px-6 py-4 whitespace-nowrap ${protocol.change_1d >= 0 ? 'text-green-400' : 'text-red-400'}">
+                    ${protocol.change_1d.toFixed(2)}%
+                </td>
+            </tr>
+        `;
+    });
+    
+    html += '</tbody></table>';
+    table.innerHTML = html;
 }
 
-function loadCategoryData() {
-    fetch('/api/categories')
-        .then(response => {
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-            return response.json();
-        })
+function renderCategories(data, loadError) {
+    // A chain so load and rendering errors share the fallback message below
+    Promise.resolve(data)
         .then(data => {
-            console.log('Raw category data:', data);
-            
+            if (loadError) {
+                throw loadError;
+            }
             if (!data || Object.keys(data).length === 0) {
                 throw new Error('No category data received');
             }
@@ -583,48 +692,44 @@ function loadCategoryData() {
         });
 }
 
-function loadYieldsData() {
-    fetch('/api/yields')
-        .then(response => response.json())
-        .then(data => {
-            const sortedData = sortData(data, yieldSortConfig.column, yieldSortConfig.direction);
-            const table = document.getElementById('yieldsTable');
-            let html = `
-                <table class="min-w-full divide-y divide-gray-700">
-                    <thead>
-                        <tr class="text-left text-xs font-medium text-gray-300 uppercase tracking-wider">
-                            <th class="px-6 py-3 cursor-pointer hover:bg-gray-700/50" onclick="updateYieldSort('pool')">
-                                Pool ${yieldSortConfig.column === 'pool' ? (yieldSortConfig.direction === 'asc' ? '↑' : '↓') : ''}
-                            </th>
-                            <th class="px-6 py-3 cursor-pointer hover:bg-gray-700/50" onclick="updateYieldSort('protocol')">
-                                Protocol ${yieldSortConfig.column === 'protocol' ? (yieldSortConfig.direction === 'asc' ? '↑' : '↓') : ''}
-                            </th>
-                            <th class="px-6 py-3 cursor-pointer hover:bg-gray-700/50" onclick="updateYieldSort('apy')">
-                                APY ${yieldSortConfig.column === 'apy' ? (yieldSortConfig.direction === 'asc' ? '↑' : '↓') : ''}
-                            </th>
-                            <th class="px-6 py-3 cursor-pointer hover:bg-gray-700/50" onclick="updateYieldSort('tvl')">
-                                TVL ${yieldSortConfig.column === 'tvl' ? (yieldSortConfig.direction === 'asc' ? '↑' : '↓') : ''}
-                            </th>
-                        </tr>
-                    </thead>
-                    <tbody class="divide-y divide-gray-700 text-gray-300">
-            `;
-            
-            sortedData.forEach(pool => {
-                html += `
-                    <tr class="hover:bg-gray-700/50 transition-colors duration-150 cursor-pointer"
-                        onclick="window.open('https://defillama.com/yields?token=${pool.pool}', '_blank')">
-                        <td class="px-6 py-4 whitespace-nowrap">${pool.pool}</td>
-                        <td class="px-6 py-4 whitespace-nowrap">${pool.protocol}</td>
-                        <td class="px-6 py-4 whitespace-nowrap text-green-400">${pool.apy.toFixed(2)}%</td>
-                        <td class="px-6 py-4 whitespace-nowrap">${formatNumber(pool.tvl)}</td>
-                    </tr>
-                `;
-            });
-            
-            html += '</tbody></table>';
-            table.innerHTML = html;
-        });
+function renderYields(data) {
+    const sortedData = sortData(data, yieldSortConfig.column, yieldSortConfig.direction);
+    const table = document.getElementById('yieldsTable');
+    let html = `
+        <table class="min-w-full divide-y divide-gray-700">
+            <thead>
+                <tr class="text-left text-xs font-medium text-gray-300 uppercase tracking-wider">
+                    <th class="px-6 py-3 cursor-pointer hover:bg-gray-700/50" onclick="updateYieldSort('pool')">
+                        Pool ${yieldSortConfig.column === 'pool' ? (yieldSortConfig.direction === 'asc' ? '↑' : '↓') : ''}
+                    </th>
+                    <th class="px-6 py-3 cursor-pointer hover:bg-gray-700/50" onclick="updateYieldSort('protocol')">
+                        Protocol ${yieldSortConfig.column === 'protocol' ? (yieldSortConfig.direction === 'asc' ? '↑' : '↓') : ''}
+                    </th>
+                    <th class="px-6 py-3 cursor-pointer hover:bg-gray-700/50" onclick="updateYieldSort('apy')">
+                        APY ${yieldSortConfig.column === 'apy' ? (yieldSortConfig.direction === 'asc' ? '↑' : '↓') : ''}
+                    </th>
+                    <th class="px-6 py-3 cursor-pointer hover:bg-gray-700/50" onclick="updateYieldSort('tvl')">
+                        TVL ${yieldSortConfig.column === 'tvl' ? (yieldSortConfig.direction === 'asc' ? '↑' : '↓') : ''}
+                    </th>
+                </tr>
+            </thead>
+            <tbody class="divide-y divide-gray-700 text-gray-300">
+    `;
+    
+    sortedData.forEach(pool => {
+        html += `
+            <tr class="hover:bg-gray-700/50 transition-colors duration-150 cursor-pointer"
+                onclick="window.open('https://defillama.com/yields?token=${pool.pool}', '_blank')">
+                <td class="px-6 py-4 whitespace-nowrap">${pool.pool}</td>
+                <td class="px-6 py-4 whitespace-nowrap">${pool.protocol}</td>
+                <td class="px-6 py-4 whitespace-nowrap text-green-400">${pool.apy.toFixed(2)}%</td>
+                <td class="px-6 py-4 whitespace-nowrap">${formatNumber(pool.tvl)}</td>
+            </tr>
+        `;
+    });
+    
+    html += '</tbody></table>';
+    table.innerHTML = html;
 }
 
 // Helper function to generate colors for the pie chart
@@ -645,20 +750,22 @@ document.addEventListener('DOMContentLoaded', () => {
     if (CONFIG.enableTimeline) {
         initializeTimelineChart();
     }
-    updateGDP();
-    setInterval(updateGDP, 300000); // Update every 5 minutes
     
     // Wait a brief moment to ensure DOM is fully ready
     setTimeout(() => {
-        loadProtocolsData();
-        loadCategoryData();
-        loadYieldsData();
+        // Everything in one request, then GDP updates over the stream
+        // or, on sync servers, by polling
+        loadDashboard().then(() => {
+            if (CONFIG.gdpStream) {
+                startGDPStream();
+            } else {
+                setInterval(updateGDP, 300000);
+            }
+        });
         
-        // Refresh data every 5 minutes
+        // Refresh the tables and categories every 5 minutes
         setInterval(() => {
-            loadProtocolsData();
-            loadCategoryData();
-            loadYieldsData();
+            loadDashboard(['protocols', 'categories', 'yields']);
         }, 300000);
     }, 100);
 });
@@ -682,7 +789,7 @@ function updateProtocolSort(column) {
         protocolSortConfig.column = column;
         protocolSortConfig.direction = 'desc';
     }
-    loadProtocolsData();
+    renderProtocols(dashboardState.protocols || []);
 }
 
 function updateYieldSort(column) {
@@ -692,7 +799,7 @@ function updateYieldSort(column) {
         yieldSortConfig.column = column;
         yieldSortConfig.direction = 'desc';
     }
-    loadYieldsData();
+    renderYields(dashboardState.yields || []);
 }
 
 function updateGDPPieChart(components) {
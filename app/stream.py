@@ -0,0 +1,171 @@
+"""Server-Sent Events fan-out of one producer's updates.
+
+A Broadcaster polls `source` (a memoized function, so it reads the shared
+cache entry the background scheduler keeps warm) from one thread per
+process, and keeps the latest snapshot plus a short log of deltas: the
+fields that changed, by dotted path. Each subscriber gets the snapshot
+once and then only deltas. Subscribers are async generators served by
+app/asgi.py, where an idle viewer costs one suspended coroutine and no
+cache or upstream work; sync workers do not stream (the page polls).
+"""
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from app.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+EVENT_STREAM_MIMETYPE = 'text/event-stream'
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'  # keep nginx from buffering the stream
+}
+KEEPALIVE = b": keepalive\n\n"
+
+_MISSING = object()
+
+
+def flatten(payload, prefix=''):
+    """Nested dicts as {'dotted.path': leaf value}."""
+    fields = {}
+    for key, value in payload.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            fields.update(flatten(value, f"{path}."))
+        else:
+            fields[path] = value
+    return fields
+
+def format_event(event, data, event_id=None):
+    lines = [] if event_id is None else [f"id: {event_id}"]
+    lines.append(f"event: {event}")
+    lines.append(f"data: {dumps(data).decode()}")
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+class Broadcaster:
+    """Publish changes of `source()` every `interval` seconds to SSE subscribers.
+
+    Event ids carry a per-process epoch, so a client reconnecting to
+    another worker gets a fresh snapshot instead of deltas it cannot apply.
+    """
+
+    def __init__(self, source, interval, keepalive=15, retry=5000, history=64):
+        self.source = source
+        self.interval = interval
+        self.keepalive = keepalive
+        self.retry = retry
+        self.version = 0
+        self.snapshot = None
+        self._epoch = uuid.uuid4().hex[:8]
+        self._fields = None
+        self._deltas = deque(maxlen=history)  # (version, changed, removed)
+        self._condition = threading.Condition()
+        self._loop_events = {}
+        self._subscribers = 0
+        self._thread = None
+
+    def publish(self, payload):
+        """Record `payload` as the latest snapshot and wake subscribers if it changed."""
+        fields = flatten(payload)
+        with self._condition:
+            if self._fields is not None:
+                changed = {
+                    path: value for path, value in fields.items()
+                    if self._fields.get(path, _MISSING) != value
+                }
+                removed = [path for path in self._fields if path not in fields]
+                if not changed and not removed:
+                    return False
+                self._deltas.append((self.version + 1, changed, removed))
+            self.version += 1
+            self.snapshot, self._fields = payload, fields
+            self._condition.notify_all()
+            loop_events, self._loop_events = self._loop_events, {}
+
+        for loop, event in loop_events.items():
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:  # the loop has been closed
+                pass
+        return True
+
+    def _run(self):
+        while True:
+            with self._condition:
+                # Idle while nobody is connected
+                self._condition.wait_for(lambda: self._subscribers > 0)
+            try:
+                self.publish(self.source())
+            except Exception as e:
+                logger.error(f"Error producing stream update: {e}")
+            time.sleep(self.interval)
+
+    def _subscribe(self):
+        with self._condition:
+            self._subscribers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stream-producer', daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def _unsubscribe(self):
+        with self._condition:
+            self._subscribers -= 1
+
+    def _parse_event_id(self, event_id):
+        """The version a reconnecting client has seen, or None to send a snapshot."""
+        epoch, _, version = (event_id or '').partition('.')
+        if epoch != self._epoch or not version.isdigit():
+            return None
+        return int(version)
+
+    def _catch_up(self, version):
+        """Events bringing a client at `version` to the latest one, and that version."""
+        with self._condition:
+            current = self.version
+            if current == 0 or version == current:
+                # Nothing published yet: wait for the first snapshot
+                return [], current
+            event_id = f"{self._epoch}.{current}"
+            if version is None or not self._deltas or self._deltas[0][0] > version + 1:
+                return [format_event('snapshot', self.snapshot, event_id)], current
+
+            # Merge the deltas the client missed into one
+            changed, removed = {}, set()
+            for delta_version, delta_changed, delta_removed in self._deltas:
+                if delta_version <= version:
+                    continue
+                changed.update(delta_changed)
+                removed.difference_update(delta_changed)
+                for path in delta_removed:
+                    changed.pop(path, None)
+                    removed.add(path)
+            delta = {'changed': changed, 'removed': sorted(removed)}
+            return [format_event('delta', delta, event_id)], current
+
+    async def aevents(self, last_event_id=None):
+        """SSE chunks for one subscriber, as an async generator that never blocks the event loop."""
+        loop = asyncio.get_running_loop()
+        version = self._parse_event_id(last_event_id)
+        self._subscribe()
+        try:
+            yield f"retry: {self.retry}\n\n".encode()
+            while True:
+                # Take the wake-up event before reading so no publish is missed
+                with self._condition:
+                    event = self._loop_events.get(loop)
+                    if event is None:
+                        event = self._loop_events[loop] = asyncio.Event()
+                chunks, version = self._catch_up(version)
+                for chunk in chunks:
+                    yield chunk
+                try:
+                    await asyncio.wait_for(event.wait(), self.keepalive)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE
+        finally:
+            self._unsubscribe()
@@ -0,0 +1,110 @@
+"""On-disk time-series store for the historical GDP components.
+
+Points live in one SQLite table keyed by (series, ts) so a window query is
+an index range scan, and every series remembers when it was last synced
+with its upstream so it can be extended with only the newer points. Each
+write is also logged under an increasing change id, which readers use to
+find what changed since they last looked.
+"""
+import sqlite3
+import threading
+import time
+from app.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+class TimeSeriesStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS points ('
+            'series TEXT NOT NULL, ts INTEGER NOT NULL, value REAL NOT NULL, '
+            'PRIMARY KEY (series, ts)) WITHOUT ROWID'
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS syncs ('
+            'series TEXT PRIMARY KEY, synced_at REAL NOT NULL)'
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS changes ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, series TEXT NOT NULL, changed_from INTEGER NOT NULL)'
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def append(self, series, points):
+        """Insert or overwrite (ts, value) points; ts is in unix seconds."""
+        rows = [(series, int(ts), float(value)) for ts, value in points]
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT OR REPLACE INTO points (series, ts, value) VALUES (?, ?, ?)',
+                rows
+            )
+            conn.execute(
+                'INSERT OR REPLACE INTO syncs (series, synced_at) VALUES (?, ?)',
+                (series, time.time())
+            )
+            if rows:
+                conn.execute(
+                    'INSERT INTO changes (series, changed_from) VALUES (?, ?)',
+                    (series, min(row[1] for row in rows))
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def last_timestamp(self, series):
+        row = self._connect().execute(
+            'SELECT MAX(ts) FROM points WHERE series = ?', (series,)
+        ).fetchone()
+        return row[0]
+
+    def synced_at(self, series):
+        row = self._connect().execute(
+            'SELECT synced_at FROM syncs WHERE series = ?', (series,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def synced(self):
+        """{series: last sync time} of every series synced at least once."""
+        return dict(self._connect().execute('SELECT series, synced_at FROM syncs').fetchall())
+
+    def changes_since(self, version):
+        """Return (new version, earliest ts written by syncs after `version`).
+
+        The version is the latest change id, assigned at commit so writers
+        finishing out of order are never skipped; the timestamp is None when
+        nothing was written since.
+        """
+        row = self._connect().execute(
+            'SELECT MAX(id), MIN(changed_from) FROM changes WHERE id > ?',
+            (version or 0,)
+        ).fetchone()
+        return (row[0] or version), row[1]
+
+    def arrays(self, series, start=None, end=None):
+        """(ts, values) numpy arrays of `series` with start <= ts <= end."""
+        rows = self._connect().execute(
+            'SELECT ts, value FROM points WHERE series = ? AND ts BETWEEN ? AND ? ORDER BY ts',
+            (series, int(start or 0), int(end if end is not None else 2 ** 62))
+        ).fetchall()
+        data = np.array(rows, dtype='float64').reshape(-1, 2)
+        return data[:, 0].astype('int64'), data[:, 1]
+
+    def range(self, series, start=None, end=None):
+        """Points of `series` with start <= ts <= end as a datetime-indexed Series."""
+        ts, values = self.arrays(series, start, end)
+        return pd.Series(values, index=pd.to_datetime(ts, unit='s'), name=series)
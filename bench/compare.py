@@ -0,0 +1,56 @@
+"""Compare two bench/run.py result files and flag regressions.
+
+    python -m bench.compare OLD.json NEW.json [--threshold 0.10]
+
+Exits with status 1 when any metric got worse by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+def metrics(results):
+    for endpoint, values in results['endpoints'].items():
+        yield f"{endpoint} cold", values['cold_seconds'], 's'
+        yield f"{endpoint} warm p50", values['warm']['p50'], 's'
+        yield f"{endpoint} warm p99", values['warm']['p99'], 's'
+        yield f"{endpoint} cold peak memory", values['cold_peak_bytes'], 'B'
+        if 'history_sync_seconds' in values:
+            yield f"{endpoint} history sync", values['history_sync_seconds'], 's'
+    yield 'import', results['import_seconds'], 's'
+    for mode, endpoints in results.get('startup', {}).items():
+        for endpoint, values in endpoints.items():
+            yield f"startup {mode} {endpoint} import", values['import_seconds'], 's'
+            yield f"startup {mode} {endpoint} first response", values['first_response_seconds'], 's'
+    yield 'concurrent p99', results['concurrency']['latency']['p99'], 's'
+    # Higher is better, so compare the inverse
+    yield 'concurrent seconds/request', 1 / max(results['concurrency']['throughput_rps'], 1e-9), 's'
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative slowdown that counts as a regression')
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = {name: value for name, value, _ in metrics(json.load(f))}
+    with open(args.new) as f:
+        new = list(metrics(json.load(f)))
+
+    regressions = 0
+    for name, value, unit in new:
+        before = old.get(name)
+        if not before:
+            continue
+        change = (value - before) / before
+        flag = ''
+        if change > args.threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{name:45} {before:12.4g}{unit} -> {value:12.4g}{unit} {change:+8.1%}{flag}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Upstream payloads for offline benchmarks.
+
+Fixtures live in bench/fixtures/<host>/<path>.json. Record them once from
+the live APIs with
+
+    python -m bench.fixtures record
+
+or generate synthetic payloads of realistic size with
+
+    python -m bench.fixtures synthesize
+"""
+import argparse
+import json
+import os
+import random
+import re
+import time
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+COINGECKO = 'https://api.coingecko.com/api/v3'
+COINS = [
+    'ethereum', 'uniswap', 'aave', 'chainlink', 'maker',
+    'compound-governance-token', 'curve-dao-token',
+    'synthetix-network-token', 'lido-dao', 'arbitrum', 'optimism'
+]
+
+# One year of market chart history covers every window the app asks for
+YEAR = 365 * 24 * 3600
+
+UPSTREAMS = [
+    f"{COINGECKO}/simple/price?ids={','.join(COINS)}&vs_currencies=usd"
+    "&include_market_cap=true&include_24hr_vol=true&include_24hr_change=true",
+    *[f"{COINGECKO}/coins/{coin}/market_chart/range" for coin in COINS],
+    'https://api.llama.fi/v2/historicalChainTvl/ethereum',
+    'https://api.llama.fi/protocols',
+    'https://api.llama.fi/overview/fees/ethereum',
+    'https://api.llama.fi/summary/fees/ethereum',
+    'https://api.llama.fi/nfts/historical/ethereum',
+    'https://stablecoins.llama.fi/stablecoins?includePrices=true',
+    'https://stablecoins.llama.fi/stablecoincharts/Ethereum',
+    'https://yields.llama.fi/pools',
+    'https://api.cryptostats.community/api/v1/fees/oneDayTotalFees/DATE'
+]
+
+def fixture_path(host, path):
+    """File holding the payload for an upstream host and URL path."""
+    path = re.sub(r'\d{4}-\d{2}-\d{2}', 'DATE', path.strip('/'))
+    return os.path.join(FIXTURES_DIR, host, f"{path}.json")
+
+def write(host, path, payload):
+    target = fixture_path(host, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'w') as f:
+        json.dump(payload, f)
+    print(f"{target}: {os.path.getsize(target) / 1e6:.1f} MB")
+
+def record():
+    # Imported here so the stub server (and the startup phase) does not load it
+    import requests
+
+    now = int(time.time())
+    for url in UPSTREAMS:
+        params = None
+        if 'market_chart/range' in url:
+            params = {'vs_currency': 'usd', 'from': now - YEAR, 'to': now}
+        live_url = url.replace('DATE', time.strftime('%Y-%m-%d'))
+        response = requests.get(live_url, params=params, timeout=60)
+        response.raise_for_status()
+        host, _, path = live_url.split('://', 1)[1].partition('/')
+        write(host, '/' + path.split('?', 1)[0], response.json())
+        time.sleep(2)  # stay under CoinGecko's free-tier rate limit
+
+def synthesize(seed=0):
+    rng = random.Random(seed)
+    now = int(time.time())
+    days = [now - (now % 86400) - 86400 * i for i in range(5 * 365, -1, -1)]
+
+    def walk(start, n, drift=0.0005, vol=0.02):
+        value, values = start, []
+        for _ in range(n):
+            value *= 1 + rng.gauss(drift, vol)
+            values.append(value)
+        return values
+
+    write('api.coingecko.com', '/api/v3/simple/price', {
+        coin: {
+            'usd': rng.uniform(1, 4000),
+            'usd_market_cap': rng.uniform(1e9, 4e11),
+            'usd_24h_vol': rng.uniform(1e7, 2e10),
+            'usd_24h_change': rng.uniform(-5, 5)
+        } for coin in COINS
+    })
+    hours = list(range(now - YEAR, now, 3600))
+    for coin in COINS:
+        caps = walk(rng.uniform(1e9, 3e11), len(hours), vol=0.004)
+        points = [[ts * 1000, cap] for ts, cap in zip(hours, caps)]
+        write('api.coingecko.com', f"/api/v3/coins/{coin}/market_chart/range", {
+            'prices': points, 'market_caps': points, 'total_volumes': points
+        })
+
+    tvl = walk(2e10, len(days))
+    write('api.llama.fi', '/v2/historicalChainTvl/ethereum',
+          [{'date': ts, 'tvl': value} for ts, value in zip(days, tvl)])
+
+    categories = ['Dexes', 'Lending', 'Liquid Staking', 'Bridge', 'CDP', 'Yield',
+                  'Derivatives', 'RWA', 'CEX', 'Services', 'Restaking']
+    chains = ['Ethereum', 'Arbitrum', 'Optimism', 'Base', 'Solana', 'BSC', 'Polygon']
+    write('api.llama.fi', '/protocols', [{
+        'id': str(i),
+        'name': f"Protocol {i}",
+        'slug': f"protocol-{i}",
+        'category': rng.choice(categories),
+        'chains': rng.sample(chains, rng.randint(1, 4)),
+        'tvl': rng.paretovariate(1.2) * 1e6,
+        'change_1h': rng.uniform(-2, 2),
+        'change_1d': rng.uniform(-10, 10),
+        'change_7d': rng.uniform(-30, 30),
+        'chainTvls': {chain: rng.uniform(0, 1e9) for chain in rng.sample(chains, 3)},
+        'description': 'x' * rng.randint(50, 400)
+    } for i in range(4000)])
+
+    write('api.llama.fi', '/overview/fees/ethereum', {'total24h': 4.1e6, 'total48to24': 3.9e6})
+    fees = walk(3e6, len(days), drift=0, vol=0.1)
+    write('api.llama.fi', '/summary/fees/ethereum',
+          {'totalDataChart': [[ts, value] for ts, value in zip(days, fees)]})
+    nft = walk(5e9, len(days))
+    write('api.llama.fi', '/nfts/historical/ethereum',
+          [{'date': ts, 'totalMarketCap': value} for ts, value in zip(days, nft)])
+
+    symbols = ['USDT', 'USDC', 'DAI'] + [f"STB{i}" for i in range(150)]
+    write('stablecoins.llama.fi', '/stablecoins', {'peggedAssets': [{
+        'symbol': symbol,
+        'chainCirculating': {
+            chain: {
+                'current': {'peggedUSD': rng.uniform(1e6, 5e10)},
+                'circulatingPrevDay': {'peggedUSD': rng.uniform(1e6, 5e10)}
+            } for chain in rng.sample(chains, 3) + ['Ethereum']
+        }
+    } for symbol in symbols]})
+    stables = walk(1e11, len(days), vol=0.005)
+    write('stablecoins.llama.fi', '/stablecoincharts/Ethereum', [
+        {'date': str(ts), 'totalCirculating': {'peggedUSD': value}}
+        for ts, value in zip(days, stables)
+    ])
+
+    projects = [f"project-{i}" for i in range(600)]
+    write('yields.llama.fi', '/pools', {'status': 'success', 'data': [{
+        'chain': rng.choice(chains),
+        'project': rng.choice(projects),
+        'symbol': f"TKN{i}-TKN{i + 1}",
+        'tvlUsd': rng.paretovariate(1.1) * 1e4,
+        'apy': rng.expovariate(0.1),
+        'apyBase': rng.expovariate(0.2),
+        'apyReward': None,
+        'stablecoin': rng.random() < 0.2,
+        'ilRisk': rng.choice(['yes', 'no']),
+        'exposure': rng.choice(['single', 'multi']),
+        'pool': f"{i:08x}-0000-0000-0000-000000000000",
+        'predictions': {'predictedClass': 'Stable/Up', 'predictedProbability': 70}
+    } for i in range(18000)]})
+
+    write('api.cryptostats.community', '/api/v1/fees/oneDayTotalFees/DATE', [
+        {'id': 'ethereum', 'value': 4.1e6, 'metadata': {'name': 'Ethereum'}},
+        {'id': 'bitcoin', 'value': 1.5e6, 'metadata': {'name': 'Bitcoin'}}
+    ])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['record', 'synthesize'])
+    args = parser.parse_args()
+    record() if args.command == 'record' else synthesize()
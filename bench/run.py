@@ -0,0 +1,285 @@
+"""Offline benchmark of the API endpoints against recorded upstream fixtures.
+
+    python -m bench.fixtures synthesize   # or `record`, once
+    python -m bench.run                   # writes bench/results/<commit>.json
+    python -m bench.run --startup-only    # just the cold-start numbers
+    python -m bench.compare bench/results/<old>.json bench/results/<new>.json
+
+Every measurement runs in a fresh subprocess with its own empty cache and
+history files, talking to a stub server that replays bench/fixtures with
+an artificial per-call latency. Per endpoint it reports the cold-cache
+latency, warm-cache latency percentiles and peak Python memory (cold and
+warm, via tracemalloc), plus throughput under concurrent clients. The
+history store is synced from the stub before the historical endpoints are
+timed; the sync itself is reported as `history_sync_seconds`.
+
+The startup phase measures what a serverless cold start pays: import time
+and time to first response for `/` and `/api/gdp` separately, with
+FAST_START on and off, as the median of several fresh processes, and which
+heavy modules each one ended up importing.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ENDPOINTS = [
+    '/api/gdp',
+    '/api/protocols',
+    '/api/categories',
+    '/api/yields',
+    '/api/gdp/historical/24h',
+    '/api/gdp/historical/1w',
+    '/api/gdp/historical/1m',
+    '/api/gdp/historical/1y'
+]
+
+STARTUP_ENDPOINTS = ['/', '/api/gdp']
+STARTUP_MODES = {'fast_start': True, 'preload': False}
+HEAVY_MODULES = ['pandas', 'numpy', 'requests', 'httpx', 'apscheduler']
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+def percentiles(samples):
+    samples = sorted(samples)
+    def pick(q):
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+    return {
+        'mean': statistics.fmean(samples),
+        'p50': pick(0.50),
+        'p95': pick(0.95),
+        'p99': pick(0.99)
+    }
+
+def load_app(latency):
+    """Import the app against a fresh stub server and empty local state."""
+    from bench import stub_server
+
+    stub = stub_server.start(latency=latency)
+    state = tempfile.mkdtemp(prefix='eth-gdp-bench-')
+    os.environ.update({
+        'UPSTREAM_OVERRIDE': f"http://127.0.0.1:{stub.server_port}",
+        'ENABLE_SCHEDULER': '0',
+        'CACHE_SQLITE_PATH': os.path.join(state, 'cache.sqlite3'),
+        'HISTORY_DB_PATH': os.path.join(state, 'history.sqlite3'),
+        'SNAPSHOT_PATH': os.path.join(state, 'snapshots.json'),
+        'SCHEDULER_LOCK_FILE': os.path.join(state, 'scheduler.lock')
+    })
+    started = time.perf_counter()
+    from app import app
+    return app, time.perf_counter() - started
+
+def is_historical(path):
+    return path.startswith('/api/gdp/historical/')
+
+def sync_history():
+    """Fill the history store from the stub and return how long it took.
+
+    Run before the historical endpoints are timed, so their timings measure
+    serving the charts rather than the first backfill.
+    """
+    from app.services.history import history
+
+    started = time.perf_counter()
+    history.sync()
+    elapsed = time.perf_counter() - started
+    missing = history.missing()
+    if missing:
+        raise RuntimeError(f"history sync left {', '.join(missing)} empty; check bench/fixtures")
+    return elapsed
+
+def timed_get(client, path):
+    started = time.perf_counter()
+    response = client.get(path)
+    elapsed = time.perf_counter() - started
+    if response.status_code != 200:
+        raise RuntimeError(f"{path} returned {response.status_code}")
+    return elapsed
+
+def phase_latency(args):
+    app, import_seconds = load_app(args.latency)
+    client = app.test_client()
+    history_sync = sync_history() if is_historical(args.endpoint) else None
+    cold = timed_get(client, args.endpoint)
+    warm = [timed_get(client, args.endpoint) for _ in range(args.requests)]
+    result = {'import_seconds': import_seconds, 'cold_seconds': cold, 'warm': percentiles(warm)}
+    if history_sync is not None:
+        result['history_sync_seconds'] = history_sync
+    return result
+
+def phase_startup(args):
+    os.environ['FAST_START'] = '1' if args.fast_start else '0'
+    app, import_seconds = load_app(args.latency)
+    first_response = timed_get(app.test_client(), args.endpoint)
+    return {
+        'import_seconds': import_seconds,
+        'first_response_seconds': first_response,
+        'modules': [name for name in HEAVY_MODULES if name in sys.modules]
+    }
+
+def phase_memory(args):
+    import tracemalloc
+
+    app, _ = load_app(args.latency)
+    client = app.test_client()
+    if is_historical(args.endpoint):
+        sync_history()
+    tracemalloc.start()
+    timed_get(client, args.endpoint)
+    _, cold_peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    timed_get(client, args.endpoint)
+    _, warm_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'cold_peak_bytes': cold_peak, 'warm_peak_bytes': warm_peak}
+
+def phase_concurrency(args):
+    import requests
+    from werkzeug.serving import make_server
+
+    app, _ = load_app(args.latency)
+    client = app.test_client()
+    sync_history()
+    for path in ENDPOINTS:
+        timed_get(client, path)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    samples, errors = [], []
+    deadline = time.perf_counter() + args.duration
+
+    def worker(offset):
+        session = requests.Session()
+        i = offset
+        while time.perf_counter() < deadline:
+            path = ENDPOINTS[i % len(ENDPOINTS)]
+            started = time.perf_counter()
+            try:
+                ok = session.get(base + path, timeout=30).status_code == 200
+            except requests.RequestException:
+                ok = False
+            (samples if ok else errors).append(time.perf_counter() - started)
+            i += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.clients)]
+    started = time.perf_counter()
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+    return {
+        'clients': args.clients,
+        'duration_seconds': elapsed,
+        'requests': len(samples),
+        'errors': len(errors),
+        'throughput_rps': len(samples) / elapsed,
+        'latency': percentiles(samples or [0])
+    }
+
+PHASES = {
+    'latency': phase_latency,
+    'startup': phase_startup,
+    'memory': phase_memory,
+    'concurrency': phase_concurrency
+}
+
+def run_phase(args, phase, endpoint=None, fast_start=False):
+    command = [
+        sys.executable, '-m', 'bench.run', '--phase', phase,
+        '--latency', str(args.latency),
+        '--requests', str(args.requests),
+        '--clients', str(args.clients),
+        '--duration', str(args.duration)
+    ]
+    if endpoint:
+        command += ['--endpoint', endpoint]
+    if fast_start:
+        command.append('--fast-start')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(command, cwd=root, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def measure_startup(args):
+    """Median import and first-response time of fresh processes, per mode and endpoint."""
+    startup = {}
+    for mode, fast_start in STARTUP_MODES.items():
+        startup[mode] = {}
+        for endpoint in STARTUP_ENDPOINTS:
+            runs = [run_phase(args, 'startup', endpoint, fast_start) for _ in range(args.startup_runs)]
+            result = {
+                key: statistics.median(run[key] for run in runs)
+                for key in ('import_seconds', 'first_response_seconds')
+            }
+            result['total_seconds'] = result['import_seconds'] + result['first_response_seconds']
+            result['modules'] = runs[-1]['modules']
+            startup[mode][endpoint] = result
+            print(f"startup {mode} {endpoint}: import {result['import_seconds'] * 1000:.0f} ms, "
+                  f"first response {result['first_response_seconds'] * 1000:.0f} ms, "
+                  f"loaded {', '.join(result['modules']) or 'no heavy modules'}", file=sys.stderr)
+    return startup
+
+def main(args):
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'settings': {
+            'upstream_latency_seconds': args.latency,
+            'warm_requests': args.requests,
+            'clients': args.clients
+        },
+        'endpoints': {}
+    }
+    results['startup'] = measure_startup(args)
+    if args.startup_only:
+        print(json.dumps(results['startup'], indent=2))
+        return
+
+    for endpoint in ENDPOINTS:
+        latency = run_phase(args, 'latency', endpoint)
+        results['import_seconds'] = latency.pop('import_seconds')
+        results['endpoints'][endpoint] = {**latency, **run_phase(args, 'memory', endpoint)}
+        print(f"{endpoint}: cold {latency['cold_seconds'] * 1000:.1f} ms, "
+              f"warm p50 {latency['warm']['p50'] * 1000:.2f} ms", file=sys.stderr)
+    results['concurrency'] = run_phase(args, 'concurrency')
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the API against recorded upstream fixtures')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds of fake upstream latency per call')
+    parser.add_argument('--requests', type=int, default=200, help='warm requests per endpoint')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of concurrent load')
+    parser.add_argument('--output', help='result file (default bench/results/<commit>.json)')
+    parser.add_argument('--startup-runs', type=int, default=5, help='fresh processes per startup measurement')
+    parser.add_argument('--startup-only', action='store_true', help='only measure startup and print it')
+    parser.add_argument('--phase', choices=PHASES, help=argparse.SUPPRESS)
+    parser.add_argument('--endpoint', help=argparse.SUPPRESS)
+    parser.add_argument('--fast-start', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.phase:
+        print(json.dumps(PHASES[args.phase](args)))
+    else:
+        main(args)
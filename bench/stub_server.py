@@ -0,0 +1,85 @@
+"""Local stand-in for the upstream APIs that replays bench/fixtures.
+
+The app reaches it through UPSTREAM_OVERRIDE, which turns
+https://<host>/<path> into http://127.0.0.1:<port>/<host>/<path>.
+"""
+import argparse
+import gzip
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from bench.fixtures import fixture_path
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    fixtures = {}
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        host, _, path = url.path.lstrip('/').partition('/')
+        payload = self._load(host, '/' + path)
+        if payload is None:
+            return self._send(404, b'{"error": "no fixture"}')
+
+        query = parse_qs(url.query)
+        if path.endswith('simple/price') and 'ids' in query:
+            ids = query['ids'][0].split(',')
+            payload = {coin: payload[coin] for coin in ids if coin in payload}
+        elif path.endswith('market_chart/range'):
+            start = int(query.get('from', ['0'])[0]) * 1000
+            end = int(query.get('to', [str(2 ** 40)])[0]) * 1000
+            payload = {
+                key: [point for point in points if start <= point[0] <= end]
+                for key, points in payload.items()
+            }
+
+        time.sleep(self.latency)
+        self._send(200, json.dumps(payload).encode())
+
+    def _load(self, host, path):
+        key = (host, path)
+        if key not in self.fixtures:
+            target = fixture_path(host, path)
+            if not os.path.exists(target):
+                return None
+            with open(target) as f:
+                self.fixtures[key] = json.load(f)
+        return self.fixtures[key]
+
+    def _send(self, status, body):
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if gzipped:
+            body = gzip.compress(body, compresslevel=1)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start(port=0, latency=0.0):
+    """Start the stub in a background thread and return the server."""
+    handler = type('Handler', (StubHandler,), {'fixtures': {}, 'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve bench/fixtures as fake upstream APIs')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every response')
+    args = parser.parse_args()
+    server = start(args.port, args.latency)
+    print(f"Serving fixtures on http://127.0.0.1:{server.server_port}")
+    threading.Event().wait()
@@ -0,0 +1,70 @@
+import fnmatch
+import os
+import tempfile
+import threading
+import time
+
+# Importing the app package builds the Flask app: keep it off the network,
+# without the scheduler, and away from the real cache and data files
+_data = tempfile.mkdtemp(prefix='eth_gdp_tests_')
+os.environ.update(
+    FAST_START='1',
+    ENABLE_SCHEDULER='0',
+    CACHE_SQLITE_PATH=os.path.join(_data, 'cache.sqlite3'),
+    SNAPSHOT_PATH=os.path.join(_data, 'snapshots.json'),
+    HISTORY_DB_PATH=os.path.join(_data, 'history.sqlite3')
+)
+
+import pytest
+from app import cache, singleflight
+from app.cache_backends import SharedRedisCache, SQLiteCache
+
+
+class FakeRedis:
+    """In-memory stand-in for the parts of the redis-py client SharedRedisCache uses."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        value, expires = self._data.get(key, (None, None))
+        if expires is not None and expires <= time.time():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return None
+            self._data[key] = (value, None if ex is None else time.time() + ex)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def exists(self, key):
+        with self._lock:
+            return int(self._live(key) is not None)
+
+    def scan_iter(self, match='*'):
+        with self._lock:
+            return [key for key in list(self._data) if fnmatch.fnmatch(key, match)]
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def shared_cache(request, tmp_path, monkeypatch):
+    """A fresh shared cache backend (SQLite file or Redis stand-in) behind `app.cache`."""
+    if request.param == 'sqlite':
+        backend = SQLiteCache(str(tmp_path / 'cache.sqlite3'))
+    else:
+        backend = SharedRedisCache(FakeRedis(), key_prefix='test:')
+    monkeypatch.setitem(cache.app.extensions['cache'], cache, backend)
+    monkeypatch.setattr(singleflight, '_local', {})
+    return backend
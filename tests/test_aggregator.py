@@ -0,0 +1,48 @@
+import time
+from app.services.aggregator import ComponentAggregator
+
+
+class StubComponent:
+    """A memoized function's `snapshot` interface over a scripted result."""
+
+    cache_timeout = 300
+
+    def __init__(self, value, delay=0):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+
+    def snapshot(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if isinstance(self.value, Exception):
+            raise self.value
+        return self.value, time.time()
+
+
+def test_a_late_component_is_reported_missing_and_not_fetched_twice():
+    slow = StubComponent(42, delay=0.3)
+    aggregator = ComponentAggregator({'fast': StubComponent(1), 'slow': slow}, timeouts={'slow': 0.05})
+
+    started = time.monotonic()
+    results = aggregator.fetch(budget=5)
+    assert time.monotonic() - started < 0.25
+    assert results['fast']['status'] == 'ok'
+    assert results['slow'] == {'value': None, 'status': 'missing', 'updated_at': None}
+
+    # Later callers wait on the fetch still running instead of starting another
+    assert aggregator.fetch(names=['slow'])['slow']['status'] == 'missing'
+    aggregator.timeouts['slow'] = 1
+    assert aggregator.fetch(names=['slow'])['slow']['value'] == 42
+    assert slow.calls == 1
+
+
+def test_a_failed_component_falls_back_to_its_last_good_value():
+    component = StubComponent(42)
+    aggregator = ComponentAggregator({'fees': component})
+    first = aggregator.fetch()['fees']
+    assert first['status'] == 'ok'
+
+    component.value = ConnectionError("upstream down")
+    result = aggregator.fetch()['fees']
+    assert result == {'value': 42, 'status': 'stale', 'updated_at': first['updated_at']}
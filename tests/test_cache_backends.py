@@ -0,0 +1,30 @@
+import time
+from app import app
+from app.cache_backends import SQLiteCache
+
+
+def test_prune_drops_expired_rows_then_those_closest_to_expiry(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'), threshold=3)
+    cache.set('expired', 0, timeout=1)
+    for i, timeout in enumerate([100, 200, 300, 400]):
+        cache.set(f'key{i}', i, timeout=timeout)
+    time.sleep(1.1)
+
+    cache._prune()
+    assert not cache.has('expired')
+    assert not cache.has('key0')
+    assert all(cache.has(f'key{i}') for i in (1, 2, 3))
+    assert cache.stats()['evictions'] == 2
+
+
+def test_hits_and_misses_are_counted_and_exported(shared_cache):
+    shared_cache.set('present', 1)
+    shared_cache.get('present')
+    shared_cache.get('present')
+    shared_cache.get('absent')
+    assert shared_cache.stats()['hits'] == 2
+    assert shared_cache.stats()['misses'] == 1
+
+    body = app.test_client().get('/metrics').get_data(as_text=True)
+    assert 'eth_gdp_cache_backend_events_total{event="hits"} 2' in body
+    assert 'eth_gdp_cache_backend_events_total{event="misses"} 1' in body
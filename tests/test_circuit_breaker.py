@@ -0,0 +1,45 @@
+import time
+import pytest
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, rejections
+
+
+def fail(breaker, times):
+    for _ in range(times):
+        probe = breaker.allow()
+        breaker.record(False, probe)
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker('api.example.com', failure_threshold=3, reset_timeout=60)
+    fail(breaker, 2)
+    breaker.record(True, breaker.allow())
+    fail(breaker, 2)
+    assert breaker.state == CLOSED
+
+    fail(breaker, 1)
+    assert breaker.state == OPEN
+    with rejections() as rejected, pytest.raises(CircuitOpen):
+        breaker.allow()
+    assert rejected == {'api.example.com'}
+
+
+def test_half_open_probe_closes_or_reopens():
+    breaker = CircuitBreaker('api.example.com', failure_threshold=1, reset_timeout=0.1)
+    fail(breaker, 1)
+    time.sleep(0.15)
+
+    # One probe at a time once the reset timeout is over
+    assert breaker.allow() is True
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+
+    breaker.record(False, probe=True)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+
+    time.sleep(0.15)
+    breaker.record(True, breaker.allow())
+    assert breaker.state == CLOSED
+    assert breaker.allow() is False
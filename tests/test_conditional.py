@@ -0,0 +1,73 @@
+import gzip
+import time
+import pytest
+from email.utils import formatdate
+from app.conditional import Representation, RepresentationCache
+
+BODY = b'{"gdp": 1.0, "padding": "' + b'x' * 2048 + b'"}'
+
+
+def test_matching_etag_of_any_encoding_gets_304():
+    representation = Representation(BODY, last_modified=1700000000, expires_at=time.time() + 60)
+    status, body, headers = representation.respond({'Accept-Encoding': 'gzip'})
+    assert status == 200
+    etag = headers['ETag']
+    assert etag.endswith('-gz"')
+
+    for tag in [etag, etag.replace('-gz', ''), 'W/' + etag, '"other", ' + etag]:
+        status, body, headers = representation.respond({'If-None-Match': tag})
+        assert (status, body) == (304, b'')
+    assert representation.respond({'If-None-Match': '"other"'})[0] == 200
+
+
+def test_if_modified_since_is_ignored_when_if_none_match_is_sent():
+    representation = Representation(BODY, last_modified=1700000000)
+    since = formatdate(1700000000, usegmt=True)
+    assert representation.respond({'If-Modified-Since': since})[0] == 304
+    assert representation.respond({'If-Modified-Since': since, 'If-None-Match': '"other"'})[0] == 200
+    assert representation.respond({'If-Modified-Since': formatdate(1699999999, usegmt=True)})[0] == 200
+
+
+def test_gzip_is_compressed_once():
+    representation = Representation(BODY)
+    status, body, headers = representation.respond({'Accept-Encoding': 'deflate, gzip;q=0.5'})
+    assert headers['Content-Encoding'] == 'gzip'
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(body) == BODY
+    assert representation.respond({'Accept-Encoding': 'gzip'})[1] is body
+
+    assert 'Content-Encoding' not in representation.respond({'Accept-Encoding': 'gzip;q=0'})[2]
+    assert 'Content-Encoding' not in Representation(b'{}').respond({'Accept-Encoding': 'gzip'})[2]
+
+
+def test_brotli_is_preferred_when_accepted():
+    brotli = pytest.importorskip('brotli')
+    status, body, headers = Representation(BODY).respond({'Accept-Encoding': 'gzip, br'})
+    assert headers['Content-Encoding'] == 'br'
+    assert headers['ETag'].endswith('-br"')
+    assert brotli.decompress(body) == BODY
+
+
+def test_cache_control_follows_the_snapshot():
+    assert Representation(BODY).cache_control() == 'no-cache'
+    representation = Representation(BODY, expires_at=time.time() + 120.5, stale_while_revalidate=30)
+    assert representation.cache_control() in (
+        'public, max-age=120, stale-while-revalidate=30',
+        'public, max-age=119, stale-while-revalidate=30'
+    )
+
+
+def test_cache_renders_once_per_snapshot_version():
+    cache = RepresentationCache(maxsize=1)
+    builds = []
+
+    def build():
+        builds.append(1)
+        return Representation(BODY)
+
+    first = cache.get('gdp', 100, build)
+    assert cache.get('gdp', 100, build) is first
+    cache.get('gdp', None, build)
+    cache.get('gdp', 200, build)
+    cache.get('gdp', 100, build)
+    assert len(builds) == 4
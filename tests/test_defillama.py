@@ -0,0 +1,45 @@
+import requests
+from app.services import http_client
+from app.services.defillama import DefiLlamaService
+from app.services.http_client import Reply
+
+PROTOCOLS = [
+    {'name': 'Aave', 'chains': ['Ethereum'], 'category': 'Lending', 'tvl': 10e9},
+    {'name': 'Binance', 'chains': ['Ethereum'], 'category': 'CEX', 'tvl': 50e9},
+    {'name': 'Raydium', 'chains': ['Solana'], 'category': 'Dexes', 'tvl': 1e9}
+]
+
+
+def respond(monkeypatch, reply):
+    def fetch(request):
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+    monkeypatch.setattr(http_client.http, 'fetch', fetch)
+
+
+def test_failed_protocol_download_keeps_the_previous_entry_and_its_time(shared_cache, monkeypatch):
+    memoized = DefiLlamaService.get_protocol_index
+    respond(monkeypatch, Reply(200, {'ETag': '"v1"'}, PROTOCOLS))
+    index, computed_at = memoized.snapshot()
+    assert [row['name'] for row in index.top(10)] == ['Aave']
+
+    respond(monkeypatch, requests.ConnectionError("connection refused"))
+    assert memoized.refresh() is None
+    value, still_computed_at = memoized.snapshot()
+    assert [row['name'] for row in value.top(10)] == ['Aave']
+    assert still_computed_at == computed_at
+
+
+def test_failed_yield_download_keeps_the_previous_index_and_its_time(shared_cache, monkeypatch):
+    memoized = DefiLlamaService.get_yield_index
+    pools = [{'project': 'aave-v3', 'symbol': 'USDC', 'apy': 4.0, 'tvlUsd': 1e6, 'stablecoin': True}]
+    respond(monkeypatch, Reply(200, {}, pools))
+    index, computed_at = memoized.snapshot()
+    assert len(index) == 1
+
+    respond(monkeypatch, Reply(502, {}, None))
+    assert memoized.refresh() is None
+    value, still_computed_at = memoized.snapshot()
+    assert len(value) == 1
+    assert still_computed_at == computed_at
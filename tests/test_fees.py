@@ -0,0 +1,35 @@
+import asyncio
+import requests
+from datetime import datetime
+from app.services import http_client
+from app.services.fees import FeesService
+from app.services.http_client import Reply
+
+
+def day_fees(value):
+    return Reply(200, {}, [{'metadata': {'name': 'Ethereum'}, 'value': value}])
+
+
+def today_only(request):
+    if datetime.now().strftime('%Y-%m-%d') not in request.url:
+        raise requests.ConnectionError("connection reset")
+    return day_fees(1000.0)
+
+
+def test_yesterday_failing_keeps_todays_revenue(monkeypatch):
+    monkeypatch.setattr(http_client.http, 'fetch', today_only)
+    assert FeesService.fetch_cryptostats_revenue() == {'current': 365000.0, 'change_24h': 0}
+
+
+def test_yesterday_failing_keeps_todays_revenue_async(monkeypatch):
+    async def fetch(request):
+        return today_only(request)
+    monkeypatch.setattr(http_client.async_http, 'fetch', fetch)
+    assert asyncio.run(FeesService.fetch_cryptostats_revenue_async()) == {'current': 365000.0, 'change_24h': 0}
+
+
+def test_change_is_against_yesterday(monkeypatch):
+    def fetch(request):
+        return day_fees(1000.0) if datetime.now().strftime('%Y-%m-%d') in request.url else day_fees(800.0)
+    monkeypatch.setattr(http_client.http, 'fetch', fetch)
+    assert FeesService.fetch_cryptostats_revenue() == {'current': 365000.0, 'change_24h': 25.0}
@@ -0,0 +1,85 @@
+import asyncio
+import time
+import pytest
+from app.services.hedging import HedgedSources, SourcesFailed
+
+
+def source(value, delay=0):
+    def fetch():
+        time.sleep(delay)
+        if isinstance(value, Exception):
+            raise value
+        return value
+    return fetch
+
+
+def hedged(sources, **kwargs):
+    return HedgedSources('test', sources, default_delay=0.1, **kwargs)
+
+
+def test_order_ranks_by_expected_time_to_a_valid_answer():
+    sources = hedged({name: source(1) for name in ['primary', 'backup', 'third']})
+    assert sources.order() == ['primary', 'backup', 'third']
+
+    for _ in range(5):
+        sources.stats['primary'].record(0.5, ok=True)
+        sources.stats['backup'].record(0.2, ok=True)
+        sources.stats['third'].record(0.1, ok=False)
+    assert sources.order() == ['backup', 'primary', 'third']
+
+    # With two calls in three failing, backup is slower than primary in expectation
+    for _ in range(10):
+        sources.stats['backup'].record(0.2, ok=False)
+    assert sources.order() == ['primary', 'backup', 'third']
+
+
+def test_samples_age_out():
+    sources = hedged({'primary': source(1), 'backup': source(2)}, max_age=0.1)
+    sources.stats['primary'].record(1.0, ok=False)
+    assert sources.order() == ['backup', 'primary']
+    time.sleep(0.15)
+    assert sources.order() == ['primary', 'backup']
+
+
+def test_slow_source_is_raced_by_the_next():
+    sources = hedged({'primary': source('slow', delay=0.5), 'backup': source('fast')})
+    started = time.monotonic()
+    assert sources.fetch() == 'fast'
+    assert time.monotonic() - started < 0.4
+
+
+def test_failed_or_invalid_source_hands_over_at_once():
+    sources = hedged(
+        {'primary': source(ConnectionError("down")), 'invalid': source(0), 'backup': source(3, delay=0.01)},
+        is_valid=lambda value: value > 0
+    )
+    started = time.monotonic()
+    assert sources.fetch() == 3
+    assert time.monotonic() - started < 0.1
+
+
+def test_every_source_failing_raises():
+    sources = hedged({'primary': source(ConnectionError("down")), 'backup': source(ValueError("bad"))})
+    with pytest.raises(SourcesFailed, match='primary: down; backup: bad'):
+        sources.fetch()
+
+
+def test_async_sources_race_too():
+    async def slow():
+        await asyncio.sleep(0.5)
+        return 'slow'
+
+    async def fast():
+        return 'fast'
+
+    sources = hedged({'primary': source('slow'), 'backup': source('fast')},
+                     async_sources={'primary': slow, 'backup': fast})
+
+    async def main():
+        started = time.monotonic()
+        value = await sources.fetch_async()
+        return value, time.monotonic() - started
+
+    value, elapsed = asyncio.run(main())
+    assert value == 'fast'
+    assert elapsed < 0.4
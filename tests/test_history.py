@@ -0,0 +1,73 @@
+import time
+import pytest
+from app import app, routes, timeseries
+from app.services.history import HistoryService
+from app.services.rollups import COMPONENTS, RollupLayer
+from app.timeseries import TimeSeriesStore
+
+HOUR = 3600
+
+
+class StubSource:
+    refresh_interval = 3600
+
+    def __init__(self, value, fail=False):
+        self.value = value
+        self.fail = fail
+        self.calls = 0
+
+    def fetch(self, since):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("upstream down")
+        now = int(time.time())
+        return [(ts, self.value) for ts in range(now - 48 * HOUR, now, HOUR)]
+
+
+@pytest.fixture
+def stub_history(shared_cache, tmp_path, monkeypatch):
+    def install(failing=()):
+        sources = {name: StubSource(10.0, fail=name in failing) for name in COMPONENTS}
+        history = HistoryService(
+            TimeSeriesStore(str(tmp_path / 'history.sqlite3')),
+            sources,
+            {name: [name] for name in COMPONENTS}
+        )
+        monkeypatch.setattr(routes, 'history', history)
+        monkeypatch.setattr(routes, 'rollups', RollupLayer(history))
+        return sources
+    return install
+
+
+def test_cold_store_is_filled_before_answering(stub_history):
+    sources = stub_history()
+
+    response = app.test_client().get('/api/gdp/historical/24h')
+    assert response.status_code == 200
+    assert all(source.calls == 1 for source in sources.values())
+    assert response.get_json()['values'][-1] == 60.0
+    assert response.headers['Cache-Control'].startswith('public, max-age=')
+
+
+def test_incomplete_store_is_not_cached_downstream(stub_history):
+    stub_history(failing={'fees'})
+
+    response = app.test_client().get('/api/gdp/historical/24h')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-store'
+    assert response.get_json()['values'][-1] is None
+
+
+def test_changes_are_seen_whatever_the_writers_clocks_say(tmp_path, monkeypatch):
+    store = TimeSeriesStore(str(tmp_path / 'history.sqlite3'))
+    store.append('fees', [(1000, 1.0)])
+    version, changed_from = store.changes_since(None)
+    assert changed_from == 1000
+
+    # A sync that started first but commits last carries an older clock
+    monkeypatch.setattr(timeseries.time, 'time', lambda: 0)
+    store.append('mev', [(500, 2.0), (900, 2.0)])
+    version, changed_from = store.changes_since(version)
+    assert changed_from == 500
+
+    assert store.changes_since(version) == (version, None)
@@ -0,0 +1,10 @@
+import asyncio
+import pytest
+from app.services import http_client
+
+
+def test_async_client_without_httpx_says_so(monkeypatch):
+    monkeypatch.setattr(http_client, 'httpx', None)
+
+    with pytest.raises(RuntimeError, match='no httpx module found'):
+        asyncio.run(http_client.async_http.get('https://api.llama.fi/protocols'))
@@ -0,0 +1,44 @@
+import asyncio
+import json
+import pytest
+from app.services.json_stream import JSONArrayStream, aiter_json_array, iter_json_array
+
+POOLS = [
+    {'pool': 'a', 'symbol': 'USDC', 'apy': 4.5, 'chain': 'Ethereum'},
+    {'pool': 'b', 'symbol': 'stETH', 'apy': 3.1, 'chain': 'Ethereum', 'note': 'naïve ünïcode €'},
+    {'pool': 'c', 'symbol': 'DAI', 'apy': None, 'chain': 'Arbitrum', 'tags': [1, [2, {'x': ']'}]]}
+]
+BODY = json.dumps({'status': 'success', 'data': POOLS, 'after': [0]}, ensure_ascii=False).encode()
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 3, 7, 64, len(BODY)])
+def test_elements_split_across_chunks_are_decoded_whole(size):
+    # Small sizes split the key, elements and multi-byte characters
+    assert list(iter_json_array(chunked(BODY, size), 'data')) == POOLS
+
+
+def test_async_iteration_matches():
+    async def chunks():
+        for chunk in chunked(BODY, 5):
+            yield chunk
+
+    async def collect():
+        return [item async for item in aiter_json_array(chunks(), 'data')]
+
+    assert asyncio.run(collect()) == POOLS
+
+
+def test_stops_reading_at_the_end_of_the_array():
+    stream = JSONArrayStream('data')
+    assert stream.feed(b'{"data": [1, 2], "rest": ') == [1, 2]
+    assert stream.done
+
+
+@pytest.mark.parametrize('body', [b'{"other": []}', b'{"data": [1, 2', b'{"data": [1, {"a": '])
+def test_missing_or_truncated_arrays_raise(body):
+    with pytest.raises(ValueError):
+        list(iter_json_array([body], 'data'))
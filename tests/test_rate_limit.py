@@ -0,0 +1,43 @@
+import threading
+import time
+import pytest
+from app.services.rate_limit import BACKFILL, LIVE, REFRESH, RateLimited, TokenBucket
+
+
+def test_waiters_are_served_by_priority_then_arrival():
+    bucket = TokenBucket(rate=10, burst=1)
+    bucket.acquire()
+
+    served = []
+
+    def call(name, level):
+        bucket.acquire(level)
+        served.append(name)
+
+    threads = []
+    for name, level in [('backfill', BACKFILL), ('refresh', REFRESH), ('live', LIVE), ('live 2', LIVE)]:
+        thread = threading.Thread(target=call, args=(name, level))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+
+    assert served == ['live', 'live 2', 'refresh', 'backfill']
+
+
+def test_a_call_gives_up_past_its_max_wait():
+    bucket = TokenBucket(rate=0.5, burst=1)
+    bucket.acquire()
+
+    with pytest.raises(RateLimited):
+        bucket.acquire(LIVE, max_wait=0.1)
+    # The caller that gave up does not hold up the queue
+    assert not bucket._waiters
+
+
+def test_pause_holds_back_every_call():
+    bucket = TokenBucket()
+    bucket.pause(0.2)
+
+    assert bucket.acquire() >= 0.15
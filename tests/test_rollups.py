@@ -0,0 +1,37 @@
+import numpy as np
+from app.services.rollups import COMPONENTS, RollupLayer
+
+HOUR = 3600
+START = 1704067200  # 2024-01-01, in the past so no bucket is clipped to now
+
+
+class StubHistory:
+    """Hourly series for every component; one protocol token starts late."""
+
+    policies = {}
+
+    def __init__(self, late_start):
+        self.components = {component: [component] for component in COMPONENTS}
+        self.components['protocols'] = ['coin:uniswap', 'coin:aave']
+        self.late_start = late_start
+
+    def load(self, start, end):
+        ts = np.arange(START - 3 * 24 * HOUR, START + 48 * HOUR, HOUR)
+        series = {name: (ts, np.full(len(ts), 10.0)) for name in COMPONENTS if name != 'protocols'}
+        series['coin:uniswap'] = (ts, np.full(len(ts), 1.0))
+        late = ts >= self.late_start
+        series['coin:aave'] = (ts[late], np.full(late.sum(), 2.0))
+        return series
+
+
+def test_missing_component_leaves_a_gap_instead_of_a_smaller_gdp():
+    history = StubHistory(late_start=START + 12 * HOUR)
+    frame = RollupLayer(history)._build(HOUR, START, START + 23 * HOUR)
+
+    before = frame.index < np.datetime64(START + 12 * HOUR, 's')
+    assert frame.loc[before, 'protocols'].isna().all()
+    assert frame.loc[before, 'gdp'].isna().all()
+
+    after = ~before
+    assert (frame.loc[after, 'protocols'] == 3.0).all()
+    assert (frame.loc[after, 'gdp'] == 5 * 10.0 + 3.0).all()
@@ -0,0 +1,38 @@
+import pytest
+from app import app
+from app.services.defillama import DefiLlamaService
+from app.singleflight import StillComputing
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.mark.parametrize('query, error', [
+    ('limit=abc', "limit must be an integer, got 'abc'"),
+    ('offset=1.5', "offset must be an integer, got '1.5'"),
+    ('min_tvl=lots', "min_tvl must be a number, got 'lots'"),
+    ('limit=0', 'limit must be 1-100 and offset non-negative'),
+    ('sort=name', 'sort must be one of: apy, tvl')
+])
+def test_invalid_yield_parameters_are_named(client, query, error):
+    response = client.get(f'/api/yields?{query}')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
+
+
+def test_invalid_protocol_filters_are_named(client):
+    response = client.get('/api/yields/protocols?min_tvl=1e')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': "min_tvl must be a number, got '1e'"}
+
+
+def test_still_computing_is_a_503_to_retry(client, monkeypatch):
+    def snapshot():
+        raise StillComputing("DefiLlamaService.get_protocol_index is still being computed")
+    monkeypatch.setattr(DefiLlamaService.get_protocol_index, 'snapshot', snapshot)
+
+    response = client.get('/api/protocols')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+from app.scheduler import LeaderLock
+
+HOLD = """
+import sys
+from app.scheduler import LeaderLock
+lock = LeaderLock(sys.argv[1])
+assert lock.acquire()
+print('held', flush=True)
+sys.stdin.read()
+"""
+
+
+def test_one_holder_at_a_time(tmp_path):
+    path = str(tmp_path / 'scheduler.lock')
+    leader, follower = LeaderLock(path), LeaderLock(path)
+
+    assert leader.acquire()
+    assert leader.acquire()
+    assert not follower.acquire()
+    assert not follower.held
+
+
+def test_lock_is_taken_over_when_the_leader_exits(tmp_path):
+    path = str(tmp_path / 'scheduler.lock')
+    leader = subprocess.Popen(
+        [sys.executable, '-c', HOLD, path], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        assert leader.stdout.readline() == 'held\n'
+        follower = LeaderLock(path)
+        assert not follower.acquire()
+    finally:
+        leader.communicate('')
+
+    assert follower.acquire()
+    with open(path) as f:
+        assert f.read() == str(os.getpid())
@@ -0,0 +1,44 @@
+import json
+import numpy as np
+import pytest
+from flask import request
+from app import app
+from app.serialization import encode_columns, negotiate
+
+LABELS = ['2024-01-01 00:00', '2024-01-01 01:00', '2024-01-01 02:00']
+COLUMNS = {
+    'values': np.array([1.5, np.nan, 3.25]),
+    'fees': np.array([0.5, np.nan, 1.0])
+}
+
+
+def test_msgpack_columns_are_raw_little_endian_floats():
+    msgpack = pytest.importorskip('msgpack')
+    payload = msgpack.unpackb(encode_columns(LABELS, COLUMNS, 'msgpack'))
+
+    assert payload['labels'] == LABELS
+    assert payload['dtype'] == '<f8'
+    values = np.frombuffer(payload['values'], dtype='<f8')
+    np.testing.assert_array_equal(values, COLUMNS['values'])
+    np.testing.assert_array_equal(np.frombuffer(payload['components']['fees'], dtype='<f8'), COLUMNS['fees'])
+
+
+def test_json_columns_write_gaps_as_null():
+    payload = json.loads(encode_columns(LABELS, COLUMNS))
+    assert payload == {
+        'labels': LABELS,
+        'values': [1.5, None, 3.25],
+        'components': {'fees': [0.5, None, 1.0]}
+    }
+
+
+@pytest.mark.parametrize('query, accept, fmt', [
+    ('', 'application/json', 'json'),
+    ('', 'application/x-msgpack', 'msgpack'),
+    ('?format=json', 'application/x-msgpack', 'json'),
+    ('?format=msgpack', '*/*', 'msgpack')
+])
+def test_format_is_negotiated(query, accept, fmt):
+    pytest.importorskip('msgpack')
+    with app.test_request_context('/' + query, headers={'Accept': accept}):
+        assert negotiate(request) == fmt
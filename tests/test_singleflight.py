@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+from app import cache
+import pytest
+from app.singleflight import StillComputing, singleflight
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def test_miss_computes_and_hit_reuses(shared_cache):
+    calls = []
+
+    @singleflight(timeout=60)
+    def answer(n):
+        calls.append(n)
+        return n * 2
+
+    assert answer(21) == 42
+    value, computed_at = answer.snapshot(21)
+    assert (value, calls) == (42, [21])
+    assert computed_at <= time.time()
+
+    # Arguments are part of the key
+    assert answer(1) == 2
+    assert calls == [21, 1]
+
+
+def test_stale_entry_is_served_while_one_refresh_runs(shared_cache):
+    versions = iter(['first', 'second', 'third'])
+    calls = []
+
+    @singleflight(timeout=0.2, stale_timeout=30)
+    def current():
+        calls.append(1)
+        if len(calls) > 1:
+            time.sleep(0.2)
+        return next(versions)
+
+    assert current() == 'first'
+    time.sleep(0.3)
+
+    # Past its timeout the entry is still answered at once
+    assert current() == 'first'
+    assert current() == 'first'
+    wait_until(lambda: current.peek() == 'second')
+    assert len(calls) == 2
+
+
+def test_concurrent_misses_compute_once(shared_cache):
+    calls = []
+
+    @singleflight(timeout=60)
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(slow())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(results) == 8
+    assert len({id(result) for result in results}) == 1
+
+
+def test_waits_for_another_process_holding_the_lock(shared_cache):
+    calls = []
+
+    @singleflight(timeout=60)
+    def value():
+        calls.append(1)
+        return 'ours'
+
+    @singleflight(timeout=60, shares=value)
+    def other_process():
+        return 'theirs'
+
+    lock_key = f"{value.make_cache_key()}:lock"
+    assert cache.add(lock_key, 1, timeout=30)
+
+    def finish():
+        time.sleep(0.2)
+        other_process.refresh()
+        cache.delete(lock_key)
+
+    threading.Thread(target=finish).start()
+    assert value() == 'theirs'
+    assert calls == []
+
+
+def test_gives_up_waiting_without_releasing_another_process_lock(shared_cache):
+    @singleflight(timeout=60, lock_timeout=0.2)
+    def value():
+        return 'ours'
+
+    lock_key = f"{value.make_cache_key()}:lock"
+    assert cache.add(lock_key, 1, timeout=30)
+
+    assert value() == 'ours'
+    assert cache.has(lock_key)
+
+
+def test_follower_past_lock_timeout_gets_still_computing(shared_cache):
+    @singleflight(timeout=60, lock_timeout=0.1)
+    def slow():
+        time.sleep(0.4)
+        return 'done'
+
+    leader = threading.Thread(target=slow)
+    leader.start()
+    time.sleep(0.05)
+    with pytest.raises(StillComputing):
+        slow()
+    leader.join()
+    assert slow() == 'done'
+
+
+def test_rejected_values_are_returned_but_not_cached(shared_cache):
+    calls = []
+
+    @singleflight(timeout=60, should_cache=lambda value: value > 0)
+    def balance():
+        calls.append(1)
+        return 0
+
+    assert balance.snapshot() == (0, None)
+    assert balance() == 0
+    assert len(calls) == 2
+    assert balance.peek() is None
+
+
+def test_async_variant_shares_the_sync_entries(shared_cache):
+    @singleflight(timeout=60)
+    def price():
+        return 3000
+
+    @singleflight(timeout=60, shares=price)
+    async def price_async():
+        return -1
+
+    calls = []
+
+    @singleflight(timeout=60)
+    async def total():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return 7
+
+    async def main():
+        cached = await price_async()
+        results = await asyncio.gather(*(total() for _ in range(5)))
+        return cached, results
+
+    assert price() == 3000
+    assert asyncio.run(main()) == (3000, [7] * 5)
+    assert len(calls) == 1
@@ -0,0 +1,49 @@
+import os
+import pytest
+from app.snapshots import SnapshotStore
+
+
+def test_workers_sharing_the_file_do_not_roll_each_other_back(tmp_path):
+    path = str(tmp_path / 'snapshots.json')
+    first, second = SnapshotStore(path), SnapshotStore(path)
+
+    first.record('fees', 1.0, 100)
+    second.record('fees', 2.0, 200)
+    first.record('mev', 3.0, 150)
+
+    stored = SnapshotStore(path)
+    assert stored.get('fees') == {'value': 2.0, 'updated_at': 200}
+    assert stored.get('mev') == {'value': 3.0, 'updated_at': 150}
+
+
+def test_values_no_newer_than_stored_ones_are_not_written(tmp_path, monkeypatch):
+    store = SnapshotStore(str(tmp_path / 'snapshots.json'))
+    store.record('fees', 1.0, 100)
+
+    writes = []
+    monkeypatch.setattr(store, '_write', writes.append)
+    store.record('fees', 1.0, 100)
+    store.record('fees', 0.5, 50)
+    assert writes == []
+    assert store.get('fees') == {'value': 1.0, 'updated_at': 100}
+
+
+def test_a_failed_write_leaves_the_previous_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'snapshots.json')
+    store = SnapshotStore(path)
+    store.record('fees', 1.0, 100)
+
+    def broken_fsync(fd):
+        raise OSError("disk full")
+    monkeypatch.setattr(os, 'fsync', broken_fsync)
+    store.record('fees', 2.0, 200)
+
+    assert SnapshotStore(path).get('fees') == {'value': 1.0, 'updated_at': 100}
+    assert os.listdir(tmp_path) == ['snapshots.json']
+
+
+@pytest.mark.parametrize('content', [b'', b'{"fees": ', b'[]'])
+def test_unreadable_files_start_empty(tmp_path, content):
+    path = tmp_path / 'snapshots.json'
+    path.write_bytes(content)
+    assert SnapshotStore(str(path)).names() == []
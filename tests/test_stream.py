@@ -0,0 +1,52 @@
+import asyncio
+from app.stream import Broadcaster
+
+
+def failing_source():
+    raise RuntimeError("upstream down")
+
+
+async def consume(events, chunks):
+    async for chunk in events:
+        chunks.append(chunk)
+
+
+def test_waits_quietly_until_the_first_publish():
+    broadcaster = Broadcaster(failing_source, interval=60, keepalive=0.1)
+
+    async def main():
+        chunks = []
+        reader = asyncio.create_task(consume(broadcaster.aevents(), chunks))
+        await asyncio.sleep(0.35)
+        idle = list(chunks)
+        broadcaster.publish({'gdp': {'total': 1}})
+        await asyncio.sleep(0.05)
+        reader.cancel()
+        return idle, chunks[len(idle):]
+
+    idle, published = asyncio.run(main())
+    assert idle[0].startswith(b'retry:')
+    # Nothing published yet: keepalives only, no busy loop
+    assert 1 <= len(idle[1:]) <= 4
+    assert all(chunk.startswith(b':') for chunk in idle[1:])
+    assert b'event: snapshot' in published[0]
+
+
+def test_reconnecting_client_gets_only_the_changes():
+    broadcaster = Broadcaster(failing_source, interval=60, keepalive=60)
+    broadcaster.publish({'gdp': {'total': 1, 'tvl': 2}})
+    event_id = f"{broadcaster._epoch}.{broadcaster.version}"
+    broadcaster.publish({'gdp': {'total': 3, 'tvl': 2}})
+
+    async def main():
+        events = broadcaster.aevents(event_id)
+        try:
+            await events.__anext__()
+            return await events.__anext__()
+        finally:
+            await events.aclose()
+
+    chunk = asyncio.run(main())
+    assert b'event: delta' in chunk
+    assert b'"gdp.total":3' in chunk
+    assert b'gdp.tvl' not in chunk
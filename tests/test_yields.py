@@ -0,0 +1,59 @@
+import pytest
+from app.services.yields import PoolIndex
+
+POOLS = [
+    {'project': 'aave-v3', 'symbol': 'USDC', 'apy': 4.0, 'tvlUsd': 900e6, 'stablecoin': True},
+    {'project': 'aave-v3', 'symbol': 'WETH', 'apy': 2.0, 'tvlUsd': 1500e6, 'stablecoin': False},
+    {'project': 'curve', 'symbol': 'DAI-USDC', 'apy': 9.0, 'tvlUsd': 5e6, 'stablecoin': True},
+    {'project': 'curve', 'symbol': 'ETH-STETH', 'apy': 4.0, 'tvlUsd': 300e6, 'stablecoin': False},
+    {'project': 'pendle', 'symbol': 'PT', 'apy': 25.0, 'tvlUsd': None, 'stablecoin': False}
+]
+
+
+def symbols(page):
+    return [row['pool'] for row in page]
+
+
+@pytest.fixture(params=[2, 100], ids=['ranked past the page', 'ranked in full'])
+def index(request):
+    return PoolIndex(POOLS, ranking_size=request.param)
+
+
+def test_query_sorts_pages_and_counts(index):
+    total, page = index.query(limit=3)
+    assert (total, symbols(page)) == (5, ['PT', 'DAI-USDC', 'USDC'])
+    # Equal APYs keep their upstream order
+    assert symbols(index.query(offset=2, limit=2)[1]) == ['USDC', 'ETH-STETH']
+    assert symbols(index.query(sort='tvl', limit=2)[1]) == ['WETH', 'USDC']
+    assert index.query(offset=10)[1] == []
+
+
+def test_query_filters(index):
+    total, page = index.query(stablecoin=True)
+    assert (total, symbols(page)) == (2, ['DAI-USDC', 'USDC'])
+    total, page = index.query(min_tvl=100e6, sort='tvl')
+    assert (total, symbols(page)) == (3, ['WETH', 'USDC', 'ETH-STETH'])
+    total, page = index.query(project='curve', stablecoin=True)
+    assert (total, symbols(page)) == (1, ['DAI-USDC'])
+    assert index.query(project='unknown') == (0, [])
+
+
+def test_rows_carry_every_field(index):
+    assert index.query(limit=1)[1] == [
+        {'pool': 'PT', 'protocol': 'pendle', 'apy': 25.0, 'tvl': 0.0, 'stablecoin': False}
+    ]
+
+
+def test_aggregates_by_project(index):
+    rows = index.aggregates()
+    assert [row['protocol'] for row in rows] == ['aave-v3', 'curve', 'pendle']
+    aave = rows[0]
+    assert aave['pools'] == 2
+    assert aave['tvl'] == 2400e6
+    assert aave['apy'] == pytest.approx((4.0 * 900 + 2.0 * 1500) / 2400)
+    assert aave['max_apy'] == 4.0
+    # A project without TVL has no weighted APY
+    assert rows[2]['apy'] == 0.0
+
+    stable = index.aggregates(stablecoin=True)
+    assert [(row['protocol'], row['pools']) for row in stable] == [('aave-v3', 1), ('curve', 1)]